@@ -1,45 +1,56 @@
 """Anomaly detection using Isolation Forest on financial transaction data."""
-import sqlite3
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
-from pathlib import Path
 
-DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+import settings
+from db_pool import get_pool
+from model_store import ModelStore
+from feature_store import FEATURE_COLUMNS, ensure_feature_store, load_features
+from invoice_index import flagged_duplicates, flagged_splits
+from columnar import get_engine
+from split_windows import supplier_days, window_splits
+
+DB_PATH = settings.DB_PATH
+
+# (feature, quantile, reason) - a flagged supplier above the quantile gets the reason
+REASON_RULES = [
+    ('txn_count', 0.95, 'Unusually high transaction frequency'),
+    ('total_amount', 0.95, 'Exceptionally large total spend'),
+    ('avg_amount', 0.95, 'High average transaction value'),
+    ('dept_count', 0.90, 'Transactions across many departments'),
+]
 
 
 def get_connection():
-    return sqlite3.connect(str(DB_PATH))
+    """Borrow a pooled read-only connection (use as a context manager)."""
+    return get_pool(DB_PATH).connection()
 
 
-def detect_transaction_anomalies(top_n=50):
-    """Run Isolation Forest on transactions to flag suspicious patterns."""
-    conn = get_connection()
-
-    # Feature engineering: aggregate by supplier
-    df = pd.read_sql("""
-        SELECT supplier_id,
-               COUNT(*) as txn_count,
-               SUM(amount) as total_amount,
-               AVG(amount) as avg_amount,
-               MAX(amount) as max_amount,
-               MIN(amount) as min_amount,
-               COUNT(DISTINCT department_id) as dept_count,
-               COUNT(DISTINCT scoa_code) as scoa_variety
-        FROM transactions
-        WHERE supplier_id IS NOT NULL
-        GROUP BY supplier_id
-    """, conn)
+def fit_supplier_anomalies():
+    """Fit the scaler and Isolation Forest on per-supplier features.
 
-    if df.empty:
-        conn.close()
-        return []
+    Returns (scaler, model, anomalies) where anomalies lists every flagged
+    supplier, most anomalous first.
+    """
+    # Feature engineering: per-supplier aggregates, folded in incrementally
+    ensure_feature_store(DB_PATH)
+    with get_connection() as conn:
+        df = load_features(conn)
 
-    features = df[['txn_count', 'total_amount', 'avg_amount', 'max_amount',
-                    'min_amount', 'dept_count', 'scoa_variety']].values
+        if df.empty:
+            return None, None, []
 
-    # Normalize
+        supplier_names = pd.read_sql(
+            "SELECT id as supplier_id, supplier_name FROM suppliers", conn
+        )
+
+    features = df[FEATURE_COLUMNS].values
+
+    # scikit-learn takes about a second to import; only the first fit pays for it
+    from sklearn.ensemble import IsolationForest
     from sklearn.preprocessing import StandardScaler
+
+    # Normalize
     scaler = StandardScaler()
     features_scaled = scaler.fit_transform(features)
 
@@ -53,9 +64,6 @@ def detect_transaction_anomalies(top_n=50):
     anomalies = anomalies.sort_values('anomaly_raw_score')
 
     # Enrich with supplier names
-    supplier_names = pd.read_sql(
-        "SELECT id as supplier_id, supplier_name FROM suppliers", conn
-    )
     anomalies = anomalies.merge(supplier_names, on='supplier_id', how='left')
 
     # Classify severity
@@ -65,39 +73,42 @@ def detect_transaction_anomalies(top_n=50):
         labels=['Critical', 'High', 'Medium']
     )
 
-    # Determine reason
-    reasons = []
-    for _, row in anomalies.iterrows():
-        r = []
-        if row['txn_count'] > df['txn_count'].quantile(0.95):
-            r.append('Unusually high transaction frequency')
-        if row['total_amount'] > df['total_amount'].quantile(0.95):
-            r.append('Exceptionally large total spend')
-        if row['avg_amount'] > df['avg_amount'].quantile(0.95):
-            r.append('High average transaction value')
-        if row['dept_count'] > df['dept_count'].quantile(0.90):
-            r.append('Transactions across many departments')
-        if not r:
-            r.append('Unusual spending pattern detected')
-        reasons.append('; '.join(r))
-    anomalies['reason'] = reasons
-
-    conn.close()
-
-    result = anomalies.head(top_n).to_dict('records')
+    # Determine reason (thresholds computed once per fit, labels built column-wise)
+    reasons = np.full(len(anomalies), '', dtype=object)
+    for col, q, label in REASON_RULES:
+        hit = anomalies[col].to_numpy() > df[col].quantile(q)
+        reasons = np.where(hit, np.where(reasons == '', label, reasons + '; ' + label), reasons)
+    anomalies['reason'] = np.where(reasons == '', 'Unusual spending pattern detected', reasons)
+
+    result = anomalies.to_dict('records')
     for row in result:
         row['txn_count'] = int(row['txn_count'])
         row['supplier_id'] = int(row['supplier_id'])
         row['dept_count'] = int(row['dept_count'])
         row['scoa_variety'] = int(row['scoa_variety'])
         row['severity'] = str(row['severity'])
-    return result
+    return scaler, model, result
+
+
+def detect_transaction_anomalies(top_n=50):
+    """Run Isolation Forest on transactions to flag suspicious patterns."""
+    return fit_supplier_anomalies()[2][:top_n]
+
+
+# Fitted model + scored suppliers, persisted per data version and refit in the
+# background when transactions change (see model_store.py).
+supplier_model_store = ModelStore("supplier_anomalies", fit_supplier_anomalies, DB_PATH)
+
+
+def cached_transaction_anomalies(top_n=50):
+    """Supplier anomalies served from the model store instead of refitting."""
+    return supplier_model_store.get()["anomalies"][:top_n]
 
 
 def detect_contract_anomalies():
     """Find contracts with utilisation > 100%."""
-    conn = get_connection()
-    df = pd.read_sql("""
+    with get_connection() as conn:
+        df = pd.read_sql("""
         SELECT c.id, c.contract_number, c.description,
                s.supplier_name, d.name as department_name,
                c.contract_value, c.spend_to_date,
@@ -109,52 +120,74 @@ def detect_contract_anomalies():
         WHERE c.spend_to_date > c.contract_value
         ORDER BY utilisation_pct DESC
     """, conn)
-    conn.close()
     return df.to_dict('records')
 
 
-def detect_invoice_anomalies():
-    """Detect duplicate and split invoices."""
-    conn = get_connection()
-
-    # 1. Duplicate Invoices (Same supplier, date, amount, description)
-    duplicates = pd.read_sql("""
-        SELECT supplier_id, transaction_date, amount, description, COUNT(*) as occurrence_count,
-               GROUP_CONCAT(id) as transaction_ids
-        FROM transactions
-        GROUP BY supplier_id, transaction_date, amount, description
-        HAVING occurrence_count > 1
-    """, conn)
+def window_split_frame(window_days, **band):
+    """Rolling-window splits shaped like flagged_splits (transaction_date = last day).
 
-    # Enrich duplicates
-    if not duplicates.empty:
-        supplier_names = pd.read_sql("SELECT id as supplier_id, supplier_name FROM suppliers", conn)
-        duplicates = duplicates.merge(supplier_names, on='supplier_id', how='left')
-        duplicates['type'] = 'Duplicate Invoice'
-        duplicates['severity'] = 'High'
-        duplicates['reason'] = duplicates['occurrence_count'].apply(lambda x: f"Found {x} identical transactions")
+    Only the columnar engine's own supplier-days are used when it is enabled;
+    otherwise they are read from the invoice index, without loading the engine.
+    """
+    if settings.ANALYTICS_ENGINE == "columnar":
+        engine = get_engine(DB_PATH)
+        days = engine.supplier_days()
+        names = {s: row['supplier_name'] for s, row in engine.supplier_rows.items()}
     else:
-        duplicates = pd.DataFrame(columns=['supplier_name', 'transaction_date', 'amount', 'type', 'severity', 'reason'])
-
-    # 2. Split Invoices (Multiple transactions to same supplier on same day summing near R500k threshold)
-    splits = pd.read_sql("""
-        SELECT supplier_id, transaction_date, SUM(amount) as total_daily_amount, COUNT(*) as txn_count,
-               GROUP_CONCAT(id) as transaction_ids
-        FROM transactions
-        GROUP BY supplier_id, transaction_date
-        HAVING txn_count > 1 AND total_daily_amount BETWEEN 450000 AND 500000
-    """, conn)
+        with get_connection() as conn:
+            days = supplier_days(conn)
+            names = dict(conn.execute("SELECT id, supplier_name FROM suppliers"))
+    w = window_splits(days, window_days, **band)
+    to_date = lambda d: np.datetime_as_string(d.astype('datetime64[D]'))
+    return pd.DataFrame({
+        'supplier_id': w.supplier,
+        'window_start': to_date(w.first_day),
+        'transaction_date': to_date(w.last_day),
+        'total_daily_amount': w.total,
+        'txn_count': w.txn_count,
+        'supplier_name': [names.get(int(s)) for s in w.supplier],
+    })
 
-    if not splits.empty:
-        supplier_names = pd.read_sql("SELECT id as supplier_id, supplier_name FROM suppliers", conn)
-        splits = splits.merge(supplier_names, on='supplier_id', how='left')
-        splits['type'] = 'Potential Split'
-        splits['severity'] = 'Critical'
-        splits['reason'] = splits.apply(lambda r: f"Total R{r['total_daily_amount']:,.0f} across {r['txn_count']} transactions (Near R500k threshold)", axis=1)
-    else:
-        splits = pd.DataFrame(columns=['supplier_name', 'transaction_date', 'total_daily_amount', 'type', 'severity', 'reason'])
 
-    conn.close()
+def _split_reason(r, high):
+    reason = f"Total R{r['total_daily_amount']:,.0f} across {r['txn_count']} transactions"
+    if r.get('window_start', r['transaction_date']) != r['transaction_date']:
+        reason += f" from {r['window_start']} to {r['transaction_date']}"
+    return reason + f" (Near R{high / 1000:,.0f}k threshold)"
+
+
+def detect_invoice_anomalies(split_window_days=None, low=None, high=None, min_count=None):
+    """Detect duplicate and split invoices (read from the maintained invoice index).
+
+    With split_window_days, splits are found over rolling windows of that many
+    days (split_windows.py) instead of single days. A split is at least
+    min_count transactions whose total falls in [low, high]; each defaults to
+    its GPG_SPLIT_* setting.
+    """
+    band = {"low": settings.SPLIT_LOW if low is None else low,
+            "high": settings.SPLIT_HIGH if high is None else high,
+            "min_count": settings.SPLIT_MIN_COUNT if min_count is None else min_count}
+    with get_connection() as conn:
+        # 1. Duplicate Invoices (Same supplier, date, amount, description)
+        duplicates = flagged_duplicates(conn)
+
+        if not duplicates.empty:
+            duplicates['type'] = 'Duplicate Invoice'
+            duplicates['severity'] = 'High'
+            duplicates['reason'] = duplicates['occurrence_count'].apply(lambda x: f"Found {x} identical transactions")
+        else:
+            duplicates = pd.DataFrame(columns=['supplier_name', 'transaction_date', 'amount', 'type', 'severity', 'reason'])
+
+        # 2. Split Invoices (Multiple transactions to same supplier on same day summing near R500k threshold)
+        splits = (flagged_splits(conn, **band) if split_window_days is None
+                  else window_split_frame(split_window_days, **band))
+
+        if not splits.empty:
+            splits['type'] = 'Potential Split'
+            splits['severity'] = 'Critical'
+            splits['reason'] = splits.apply(_split_reason, axis=1, high=band['high'])
+        else:
+            splits = pd.DataFrame(columns=['supplier_name', 'transaction_date', 'total_daily_amount', 'type', 'severity', 'reason'])
 
     # Combine
     combined = pd.concat([
@@ -0,0 +1,97 @@
+"""Database bootstrap in the background, with readiness and timings.
+
+Generating a missing database and bringing the derived tables up to date
+(migrations, rollups, feature store, indexes) used to run while main.py was
+imported, so uvicorn bound its port only after all of it. Bootstrap runs the
+same steps in order on a thread started from the app's lifespan;
+StartupGateMiddleware answers 503 + Retry-After for the data endpoints until it
+has finished, and /api/ready reports its state and how long each step took.
+GPG_STARTUP_MODE=blocking runs the steps during import instead, as before.
+"""
+import json
+import threading
+import time
+
+import settings
+
+# Served while bootstrapping: liveness, readiness and process metrics
+UNGATED = ("/api/health", "/api/ready", "/api/debug-db", "/api/metrics")
+
+
+class Bootstrap:
+    """Named steps run once, in order; state is pending -> running -> ready | failed."""
+
+    def __init__(self, steps=()):
+        self.steps = list(steps)
+        self.state = "pending"
+        self.error = None
+        self.timings = {}
+        self.import_seconds = None
+        self._done = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def add(self, name, fn):
+        self.steps.append((name, fn))
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def run(self):
+        start = time.perf_counter()
+        self.state = "running"
+        try:
+            for name, fn in self.steps:
+                step = time.perf_counter()
+                fn()
+                self.timings[name] = round(time.perf_counter() - step, 3)
+            self.state = "ready"
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            self.state = "failed"
+        self.timings["total"] = round(time.perf_counter() - start, 3)
+        print(f"[DEBUG] Bootstrap {self.state} in {self.timings['total']}s: "
+              + ", ".join(f"{k} {v}s" for k, v in self.timings.items() if k != "total"))
+        self._done.set()
+
+    def start(self):
+        """Run the steps on a daemon thread (once)."""
+        with self._lock:
+            if self._thread is None and self.state == "pending":
+                self._thread = threading.Thread(target=self.run, name="bootstrap", daemon=True)
+                self._thread.start()
+
+    def wait(self, timeout=None):
+        """Block until bootstrap has finished; True if it succeeded."""
+        self._done.wait(timeout)
+        return self.ready
+
+    def status(self):
+        return {"ready": self.ready, "state": self.state, "error": self.error,
+                "mode": settings.STARTUP_MODE, "import_seconds": self.import_seconds,
+                "bootstrap_seconds": self.timings.get("total"),
+                "steps": {k: v for k, v in self.timings.items() if k != "total"}}
+
+
+class StartupGateMiddleware:
+    """ASGI middleware answering 503 for /api requests until bootstrap is ready."""
+
+    def __init__(self, app, bootstrap, prefix="/api/", ungated=UNGATED):
+        self.app = app
+        self.bootstrap = bootstrap
+        self.prefix = prefix
+        self.ungated = tuple(ungated)
+
+    async def __call__(self, scope, receive, send):
+        if (self.bootstrap.ready or scope["type"] != "http" or not scope["path"].startswith(self.prefix)
+                or scope["path"].startswith(self.ungated)):
+            return await self.app(scope, receive, send)
+        failed = self.bootstrap.state == "failed"
+        body = json.dumps({"detail": f"startup failed: {self.bootstrap.error}" if failed
+                           else "starting up, retry shortly"}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if not failed:
+            headers.append((b"retry-after", str(settings.READER_RETRY_AFTER).encode()))
+        await send({"type": "http.response.start", "status": 503, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,110 @@
+"""Column arrays shared by every worker process through memory-mapped files.
+
+Each uvicorn worker used to load the fact tables into its own ColumnarEngine,
+so the arrays were held once per worker. A ColumnCache is a directory of
+generations instead: one process (the first to take the build lock) writes
+every array as an uncompressed .npy file, plus manifest.json for the small
+non-numeric parts, into gen-<n>. The CURRENT file holds the generation counter
+n and is swapped with os.replace once a generation is complete, so readers see
+the old generation or the new one, never a partial one.
+
+Workers attach with np.load(mmap_mode='r'). The pages come from the OS page
+cache, one copy however many workers map them. Generations older than the
+newest `keep` are deleted. Mappings still open on a deleted generation stay
+valid until their last reader drops them (POSIX unlink semantics).
+"""
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:                 # Windows: builds are serialized per process only
+    fcntl = None
+
+CURRENT = "CURRENT"
+MANIFEST = "manifest.json"
+
+
+class ColumnCache:
+    def __init__(self, directory, keep=2):
+        self.directory = Path(directory)
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _path(self, number):
+        return self.directory / f"gen-{number:08d}"
+
+    def _generations(self):
+        return sorted(self.directory.glob("gen-" + "?" * 8))
+
+    def generation(self):
+        """Number of the live generation, 0 if none has been published."""
+        try:
+            return int((self.directory / CURRENT).read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    # ─── Readers ─────────────────────────────────────────────────────────────
+    def attach(self):
+        """The live generation as (number, arrays, meta), arrays mapped read-only; None if none."""
+        for _ in range(3):                      # CURRENT can move on between reading it and the files
+            number = self.generation()
+            if not number:
+                return None
+            path = self._path(number)
+            try:
+                manifest = json.loads((path / MANIFEST).read_text())
+                arrays = {name: np.asarray(np.load(path / f"{name}.npy", mmap_mode="r"))
+                          for name in manifest["arrays"]}
+            except FileNotFoundError:
+                continue
+            return SimpleNamespace(number=number, arrays=arrays, meta=manifest["meta"])
+        return None
+
+    # ─── Loader ──────────────────────────────────────────────────────────────
+    @contextmanager
+    def build_lock(self):
+        """Held while building a generation: across threads, and across processes where flock exists."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.directory / "build.lock", "w") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, arrays, meta):
+        """Write arrays (name -> numeric ndarray) and meta (JSON-able) as the next
+        generation and make it live; call under build_lock(). Returns its number."""
+        number = max([self.generation()] + [int(p.name[4:]) for p in self._generations()]) + 1
+        path = self._path(number)
+        tmp = path.with_name(path.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        for name, values in arrays.items():
+            np.save(tmp / f"{name}.npy", np.ascontiguousarray(values), allow_pickle=False)
+        (tmp / MANIFEST).write_text(json.dumps({"arrays": list(arrays), "meta": meta}))
+        os.replace(tmp, path)
+        pointer = self.directory / f"{CURRENT}.tmp"
+        pointer.write_text(str(number))
+        os.replace(pointer, self.directory / CURRENT)
+        for old in self._generations()[:-self.keep]:
+            shutil.rmtree(old, ignore_errors=True)
+        print(f"[DEBUG] Column cache generation {number} published to {self.directory}")
+        return number
+
+    def status(self):
+        number = self.generation()
+        path = self._path(number)
+        files = list(path.glob("*.npy")) if number else []
+        return {"directory": str(self.directory), "generation": number, "arrays": len(files),
+                "bytes": sum(f.stat().st_size for f in files)}
@@ -0,0 +1,394 @@
+"""In-memory columnar analytics engine.
+
+Loads `transactions` and `purchase_orders` once into compact typed NumPy columns
+(dictionary-encoded months, SCOA codes and commodities) and answers the fact-table
+group-bys behind /api/overview, /api/maverick and /api/suppliers with bincount
+kernels. Each `*_facts` method returns exactly what the matching SQL path in
+main.py returns, so the endpoints assemble identical payloads from either engine.
+
+Enable with GPG_ANALYTICS_ENGINE=columnar. The arrays live in a shared column
+cache (column_cache.py) that every worker process maps, unless
+GPG_COLUMN_CACHE=process; `python columnar.py build` is the loader that
+publishes a generation, run by the first worker to find it missing or stale
+or ahead of starting the workers.
+"""
+import argparse
+import json
+import math
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import settings
+from column_cache import ColumnCache
+from db_pool import get_pool
+from migrations import update_count
+
+
+def _encode(values):
+    """Dictionary-encode a column: (codes in the smallest int dtype, sorted uniques)."""
+    codes, uniques = pd.factorize(pd.Series(values).fillna(''), sort=True)
+    dtype = np.int8 if len(uniques) <= 127 else np.int16 if len(uniques) <= 32767 else np.int32
+    return codes.astype(dtype), np.asarray(uniques, dtype=object)
+
+
+def sql_round(x, n=1):
+    """ROUND(x, n) exactly as SQLite's printf-based implementation computes it."""
+    if x is None:
+        return None
+    v = np.longdouble(abs(x))
+    rounding = np.longdouble(0.5 * 10.0 ** -n)
+    ex = math.frexp(abs(x))[1] - 1 if x else -1023
+    if n + int(ex / 3) < 15:
+        rounding += v * np.longdouble(3e-16)
+    scale = np.longdouble(10) ** n
+    v = float(np.floor((v + rounding) * scale)) / float(scale)
+    return v if x >= 0 else -v
+
+
+def _ranked(keys, values, descending=True):
+    """Indices of keys ordered by value (desc), ties in key order, like GROUP BY + ORDER BY."""
+    order = np.argsort(keys, kind='stable')
+    return order[np.argsort(-values[order] if descending else values[order], kind='stable')]
+
+
+# numeric arrays of an engine, by table namespace; what a shared column cache holds
+ARRAYS = {
+    "txn": ("dept", "supplier", "amount", "month", "day", "scoa"),
+    "po": ("id", "dept", "supplier", "value", "month", "commodity", "maverick", "joinable"),
+    "supplier_days": ("supplier", "day", "count", "total"),
+}
+# their dictionaries (object arrays, kept in the manifest)
+LABELS = {"txn": ("months", "scoa_desc"), "po": ("months", "commodities")}
+
+
+class ColumnarEngine:
+    def __init__(self, db_path, generation=None):
+        self.db_path = db_path
+        self.generation = None          # column cache generation the arrays are mapped from
+        self._supplier_days = None
+        if generation is None:
+            self.load()
+        else:
+            self._attach(generation)
+
+    # ─── Loading ─────────────────────────────────────────────────────────────
+    @staticmethod
+    def signature(conn):
+        """Cheap change marker: max ids of both fact tables and their in-place update counts."""
+        return conn.execute(
+            "SELECT (SELECT IFNULL(MAX(id),0) FROM transactions), (SELECT IFNULL(MAX(id),0) FROM purchase_orders)"
+        ).fetchone() + (update_count(conn, "transactions"), update_count(conn, "purchase_orders"))
+
+    def load(self):
+        with get_pool(self.db_path).connection() as conn:
+            self.version = self.signature(conn)
+            txn = pd.read_sql("""
+                SELECT department_id, supplier_id, amount, substr(transaction_date,1,7) as month,
+                       CAST(julianday(transaction_date) - 2440587.5 AS INTEGER) as day,
+                       scoa_code, scoa_description
+                FROM transactions""", conn)
+            po = pd.read_sql("""
+                SELECT id, department_id, supplier_id, total_value, substr(po_date,1,7) as month,
+                       commodity_description, contract_id IS NULL as is_maverick
+                FROM purchase_orders""", conn)
+            self.departments = pd.read_sql("SELECT id, name FROM departments", conn)
+            self.suppliers = pd.read_sql(
+                "SELECT id, supplier_name, bbbee_level, tax_compliant, province FROM suppliers", conn)
+
+        t = SimpleNamespace()
+        t.dept = txn['department_id'].fillna(0).to_numpy(np.int16)
+        t.supplier = txn['supplier_id'].fillna(0).to_numpy(np.int32)
+        t.amount = txn['amount'].fillna(0).to_numpy(np.float64)
+        t.month, t.months = _encode(txn['month'])
+        t.day = txn['day'].fillna(-1).to_numpy(np.int32)      # days since 1970-01-01, -1 = no date
+        t.scoa, scoa_codes = _encode(txn['scoa_code'])
+        # description per code (the rollups keep MAX(scoa_description) too)
+        desc = txn.assign(code=t.scoa).groupby('code')['scoa_description'].max()
+        t.scoa_desc = desc.reindex(range(len(scoa_codes))).fillna('').to_numpy(object)
+        self.txn = t
+
+        p = SimpleNamespace()
+        p.id = po['id'].to_numpy(np.int64)
+        p.dept = po['department_id'].fillna(0).to_numpy(np.int16)
+        p.supplier = po['supplier_id'].fillna(0).to_numpy(np.int32)
+        p.value = po['total_value'].fillna(0).to_numpy(np.float64)
+        p.month, p.months = _encode(po['month'])
+        p.commodity, p.commodities = _encode(po['commodity_description'])
+        p.maverick = po['is_maverick'].to_numpy(bool)
+        self.po = p
+        self._index()
+        # rows that survive the inner joins on suppliers/departments in the PO listing
+        p.joinable = np.isin(p.supplier, self.supplier_ids) & np.isin(p.dept, self.dept_ids)
+
+    def _index(self):
+        """Dimension lookups over departments/suppliers, rebuilt per process."""
+        t, p = self.txn, self.po
+        self.dept_ids = self.departments['id'].to_numpy(np.int64)
+        self.supplier_ids = self.suppliers['id'].to_numpy(np.int64)
+        self.n_dept = int(max(t.dept.max(initial=0), p.dept.max(initial=0),
+                              self.departments['id'].max() if len(self.departments) else 0)) + 1
+        self.n_supplier = int(max(t.supplier.max(initial=0),
+                                  self.suppliers['id'].max() if len(self.suppliers) else 0)) + 1
+        self.dept_names = dict(zip(self.departments['id'], self.departments['name']))
+        self.supplier_rows = {r['id']: r for r in self.suppliers.to_dict('records')}
+
+    # ─── Shared column cache ─────────────────────────────────────────────────
+    def export(self):
+        """(arrays, meta) for ColumnCache.publish: every numeric column, the
+        supplier-days aggregate and the dictionaries and dimension rows."""
+        self.supplier_days()
+        spaces = {"txn": self.txn, "po": self.po, "supplier_days": self._supplier_days}
+        arrays = {f"{space}.{name}": getattr(spaces[space], name)
+                  for space, names in ARRAYS.items() for name in names}
+        meta = {"version": list(self.version),
+                "labels": {f"{space}.{name}": getattr(spaces[space], name).tolist()
+                           for space, names in LABELS.items() for name in names},
+                "departments": self.departments.to_dict('split', index=False),
+                "suppliers": self.suppliers.to_dict('split', index=False)}
+        return arrays, meta
+
+    def _attach(self, generation):
+        """Take the columns from a ColumnCache generation; the arrays stay mapped, not copied."""
+        meta = generation.meta
+        self.generation = generation.number
+        self.version = tuple(meta["version"])
+        spaces = {space: SimpleNamespace() for space in ARRAYS}
+        for space, names in ARRAYS.items():
+            for name in names:
+                setattr(spaces[space], name, generation.arrays[f"{space}.{name}"])
+        for space, names in LABELS.items():
+            for name in names:
+                setattr(spaces[space], name, np.array(meta["labels"][f"{space}.{name}"], dtype=object))
+        self.txn, self.po, self._supplier_days = spaces["txn"], spaces["po"], spaces["supplier_days"]
+        self.departments = pd.DataFrame(meta["departments"]["data"], columns=meta["departments"]["columns"])
+        self.suppliers = pd.DataFrame(meta["suppliers"]["data"], columns=meta["suppliers"]["columns"])
+        self._index()
+
+    @staticmethod
+    def _known(ids, dimension_ids):
+        """Keep group keys present in the dimension table (the SQL inner join)."""
+        return ids[np.isin(ids, dimension_ids)]
+
+    def _select(self, table, department_id):
+        return table.dept == department_id if department_id else slice(None)
+
+    # ─── Overview ────────────────────────────────────────────────────────────
+    def overview_facts(self, department_id=None):
+        t, p = self.txn, self.po
+        sel = self._select(t, department_id)
+        amount, month, scoa = t.amount[sel], t.month[sel], t.scoa[sel]
+
+        facts = {
+            "total_spend": float(amount.sum()) if amount.size else 0,
+            "total_transactions": int(amount.size),
+            "total_purchase_orders": int(np.count_nonzero(p.dept == department_id)) if department_id else int(p.dept.size),
+        }
+
+        counts = np.bincount(month, minlength=len(t.months))
+        totals = np.bincount(month, weights=amount, minlength=len(t.months))
+        facts["monthly_trend"] = [
+            {"month": t.months[i], "total": float(totals[i]), "txn_count": int(counts[i])}
+            for i in np.flatnonzero(counts)]
+
+        facts["department_spend"] = []
+        if not department_id:
+            counts = np.bincount(t.dept, minlength=self.n_dept)
+            totals = np.bincount(t.dept, weights=t.amount, minlength=self.n_dept)
+            ids = self._known(np.flatnonzero(counts), self.dept_ids)
+            names = np.array([self.dept_names[i] for i in ids], dtype=object)
+            facts["department_spend"] = [
+                {"department": names[k], "total_spend": float(totals[ids[k]]), "txn_count": int(counts[ids[k]])}
+                for k in _ranked(names, totals[ids])]
+
+        code_totals = np.bincount(scoa, weights=amount, minlength=len(t.scoa_desc))
+        code_counts = np.bincount(scoa, minlength=len(t.scoa_desc))
+        by_desc = {}
+        for code in np.flatnonzero(code_counts):
+            by_desc[t.scoa_desc[code]] = by_desc.get(t.scoa_desc[code], 0.0) + code_totals[code]
+        names = np.array(list(by_desc), dtype=object)
+        values = np.array(list(by_desc.values()), dtype=np.float64)
+        facts["scoa_spend"] = [{"category": names[k], "total": float(values[k])}
+                               for k in _ranked(names, values)]
+
+        facts["supplier_concentration"] = []
+        if not department_id:
+            facts["supplier_concentration"] = [
+                {"id": r["id"], "supplier_name": r["supplier_name"],
+                 "total_spend": r["total_spend"], "txn_count": r["txn_count"]}
+                for r in self._supplier_totals(slice(None), limit=20)]
+        return facts
+
+    # ─── Suppliers ───────────────────────────────────────────────────────────
+    def _supplier_totals(self, sel, limit):
+        t = self.txn
+        supplier, dept = t.supplier[sel], t.dept[sel]
+        counts = np.bincount(supplier, minlength=self.n_supplier)
+        totals = np.bincount(supplier, weights=t.amount[sel], minlength=self.n_supplier)
+        pairs = np.unique(supplier.astype(np.int64) * self.n_dept + dept)
+        dept_counts = np.bincount(pairs // self.n_dept, minlength=self.n_supplier)
+        ids = self._known(np.flatnonzero(counts), self.supplier_ids)
+        rows = []
+        for k in _ranked(ids, totals[ids])[:limit]:
+            sid = int(ids[k])
+            rows.append({**self.supplier_rows[sid], "txn_count": int(counts[sid]),
+                         "total_spend": float(totals[sid]), "dept_count": int(dept_counts[sid])})
+        return rows
+
+    def supplier_facts(self, department_id=None):
+        return {"top_suppliers": self._supplier_totals(self._select(self.txn, department_id), limit=50)}
+
+    # ─── Maverick ────────────────────────────────────────────────────────────
+    def maverick_facts(self, department_id=None):
+        p = self.po
+        sel = self._select(p, department_id)
+        mav, value, month = p.maverick[sel], p.value[sel], p.month[sel]
+        facts = {}
+
+        facts["by_department"] = []
+        if not department_id:
+            total = np.bincount(p.dept, minlength=self.n_dept)
+            mav_n = np.bincount(p.dept[p.maverick], minlength=self.n_dept)
+            mav_v = np.bincount(p.dept, weights=np.where(p.maverick, p.value, 0.0), minlength=self.n_dept)
+            tot_v = np.bincount(p.dept, weights=p.value, minlength=self.n_dept)
+            ids = self._known(np.flatnonzero(total), self.dept_ids)
+            names = np.array([self.dept_names[i] for i in ids], dtype=object)
+            pct = np.array([sql_round(mav_n[i] * 100.0 / total[i]) for i in ids], dtype=np.float64)
+            facts["by_department"] = [
+                {"department": names[k], "total_pos": int(total[ids[k]]), "maverick_pos": int(mav_n[ids[k]]),
+                 "maverick_pct": float(pct[k]), "maverick_value": float(mav_v[ids[k]]),
+                 "total_value": float(tot_v[ids[k]])}
+                for k in _ranked(names, pct)]
+
+        total = np.bincount(month, minlength=len(p.months))
+        mav_n = np.bincount(month[mav], minlength=len(p.months))
+        facts["monthly_trend"] = [
+            {"month": p.months[i], "total_pos": int(total[i]), "maverick_pos": int(mav_n[i]),
+             "maverick_pct": sql_round(mav_n[i] * 100.0 / total[i])}
+            for i in np.flatnonzero(total)]
+
+        n, m = int(mav.size), int(np.count_nonzero(mav))
+        facts["overall_maverick_pct"] = float(sql_round(m * 100.0 / n) if n else 0)
+        facts["total_maverick_value"] = float(value[mav].sum()) if n else 0.0
+
+        commodity = p.commodity[sel][mav]
+        counts = np.bincount(commodity, minlength=len(p.commodities))
+        values = np.bincount(commodity, weights=value[mav], minlength=len(p.commodities))
+        ids = np.flatnonzero(counts)
+        facts["by_category"] = [
+            {"category": p.commodities[i], "count": int(counts[i]), "value": float(values[i])}
+            for i in ids[_ranked(p.commodities[ids], values[ids])][:10]]
+
+        candidates = np.flatnonzero(p.maverick & p.joinable & (p.dept == department_id if department_id else True))
+        top = candidates[np.argsort(-p.value[candidates], kind='stable')[:100]]
+        facts["maverick_pos"] = self._po_details(p.id[top].tolist())
+        return facts
+
+    # ─── Supplier-days (split detection) ─────────────────────────────────────
+    def supplier_days(self):
+        """Count and total per (supplier, day), sorted by supplier then day; cached per load.
+
+        Supplier 0 collects transactions without a supplier, as the NULL group of
+        the SQL GROUP BY does; undated transactions are left out.
+        """
+        if self._supplier_days is None:
+            t = self.txn
+            dated = t.day >= 0
+            key = (t.supplier[dated].astype(np.int64) << 32) | t.day[dated]
+            keys, inverse = np.unique(key, return_inverse=True)
+            self._supplier_days = SimpleNamespace(
+                supplier=(keys >> 32).astype(np.int32),
+                day=(keys & 0xFFFFFFFF).astype(np.int32),
+                count=np.bincount(inverse, minlength=len(keys)),
+                total=np.bincount(inverse, weights=t.amount[dated], minlength=len(keys)))
+        return self._supplier_days
+
+    def _po_details(self, ids):
+        if not ids:
+            return []
+        with get_pool(self.db_path).connection() as conn:
+            df = pd.read_sql(f"""
+                SELECT po.id, po.po_number, po.po_date, po.total_value,
+                       s.supplier_name, d.name as department,
+                       po.commodity_description as category,
+                       CASE
+                           WHEN po.total_value > 500000 THEN 'Value exceeds threshold'
+                           ELSE 'No approved contract'
+                       END as reason
+                FROM purchase_orders po
+                JOIN suppliers s ON po.supplier_id = s.id
+                JOIN departments d ON po.department_id = d.id
+                WHERE po.id IN ({",".join("?" * len(ids))})
+            """, conn, params=ids)
+        rows = {r.pop('id'): r for r in df.to_dict('records')}
+        return [rows[i] for i in ids if i in rows]
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def column_cache(db_path):
+    return ColumnCache(settings.COLUMN_CACHE_DIR / Path(db_path).stem, keep=settings.COLUMN_CACHE_KEEP)
+
+
+def _stale(generation, version):
+    return generation is None or tuple(generation.meta["version"]) != tuple(version)
+
+
+def shared_engine(db_path, version):
+    """Engine mapped from the shared column cache. A missing or stale generation
+    is published by a short-lived loader process (`columnar.py build`), so no
+    worker keeps the memory the load churns through; concurrent loaders queue
+    on the build lock and all but the first find the generation current."""
+    cache = column_cache(db_path)
+    generation = cache.attach()
+    if _stale(generation, version):
+        subprocess.run([sys.executable, str(Path(__file__).resolve()), "build", "--db", str(db_path)],
+                       check=True)
+        generation = cache.attach()
+    return ColumnarEngine(db_path, generation)
+
+
+def get_engine(db_path):
+    """Process-wide engine for db_path, reloaded when new fact rows are appended
+    and, with the shared cache, re-attached when another process swaps in a new
+    generation."""
+    with _engines_lock:
+        engine = _engines.get(db_path)
+        with get_pool(db_path).connection() as conn:
+            version = ColumnarEngine.signature(conn)
+        shared = settings.COLUMN_CACHE == "shared"
+        if (engine is not None and engine.version == version
+                and (not shared or engine.generation == column_cache(db_path).generation())):
+            return engine
+        engine = _engines[db_path] = shared_engine(db_path, version) if shared else ColumnarEngine(db_path)
+        return engine
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Shared column cache of the columnar engine.")
+    parser.add_argument("command", choices=["build", "status"])
+    parser.add_argument("--db", default=str(settings.DB_PATH), help="SQLite database path")
+    parser.add_argument("--force", action="store_true", help="build: publish even if the live generation is current")
+    args = parser.parse_args(argv)
+
+    cache = column_cache(args.db)
+    if args.command == "build":
+        with cache.build_lock():
+            with get_pool(args.db).connection() as conn:
+                version = ColumnarEngine.signature(conn)
+            if args.force or _stale(cache.attach(), version):
+                cache.publish(*ColumnarEngine(args.db).export())
+        return 0
+    print(json.dumps(cache.status(), indent=1))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
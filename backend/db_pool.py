@@ -0,0 +1,156 @@
+"""Pool of long-lived, read-only SQLite connections shared by the API and anomaly detection."""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import settings
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the pool timeout."""
+
+
+class _Pooled:
+    __slots__ = ("conn", "created", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = self.last_used = time.monotonic()
+
+
+class ConnectionPool:
+    """Bounded pool of read-only connections with thread affinity.
+
+    A thread that already holds a connection gets the same one back on nested
+    `connection()` calls, so helpers can borrow freely without deadlocking the
+    pool. Idle connections are reused LIFO to keep the hottest page cache busy.
+    """
+
+    def __init__(self, db_path, size=None, timeout=None, max_lifetime=None,
+                 health_check_interval=None, mmap_size=None, cache_size_kb=None):
+        self.db_path = Path(db_path).resolve()
+        self.size = size or settings.DB_POOL_SIZE
+        self.timeout = timeout if timeout is not None else settings.DB_POOL_TIMEOUT
+        self.max_lifetime = max_lifetime if max_lifetime is not None else settings.DB_POOL_MAX_LIFETIME
+        self.health_check_interval = (health_check_interval if health_check_interval is not None
+                                      else settings.DB_POOL_HEALTH_CHECK_INTERVAL)
+        self.mmap_size = mmap_size if mmap_size is not None else settings.DB_MMAP_SIZE
+        self.cache_size_kb = cache_size_kb if cache_size_kb is not None else settings.DB_CACHE_SIZE_KB
+
+        self.trace_callback = None     # sqlite3 trace callback for connections opened from now on
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open_count = 0
+        self._stats = {"opened": 0, "recycled": 0, "failed_checks": 0, "timeouts": 0}
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+    def _open(self):
+        conn = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA query_only = ON")
+        if self.trace_callback is not None:
+            conn.set_trace_callback(self.trace_callback)
+        with self._lock:
+            self._open_count += 1
+            self._stats["opened"] += 1
+        return _Pooled(conn)
+
+    def _discard(self, pooled):
+        try:
+            pooled.conn.close()
+        finally:
+            with self._lock:
+                self._open_count -= 1
+
+    def _usable(self, pooled):
+        now = time.monotonic()
+        if now - pooled.created > self.max_lifetime:
+            self._stats["recycled"] += 1
+            return False
+        if now - pooled.last_used > self.health_check_interval:
+            try:
+                pooled.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                self._stats["failed_checks"] += 1
+                return False
+        return True
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            self._stats["timeouts"] += 1
+            raise PoolTimeout(f"no SQLite connection free after {self.timeout}s")
+        try:
+            while True:
+                try:
+                    pooled = self._idle.get_nowait()
+                except queue.Empty:
+                    return self._open()
+                if self._usable(pooled):
+                    return pooled
+                self._discard(pooled)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkin(self, pooled):
+        pooled.last_used = time.monotonic()
+        pooled.conn.row_factory = None
+        if pooled.conn.in_transaction:
+            pooled.conn.rollback()
+        self._idle.put(pooled)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the with-block."""
+        held = getattr(self._local, "held", None)
+        if held is not None:
+            yield held.conn
+            return
+
+        pooled = self._checkout()
+        self._local.held = pooled
+        try:
+            yield pooled.conn
+        finally:
+            self._local.held = None
+            self._checkin(pooled)
+
+    def close(self):
+        """Close every idle connection (borrowed ones are unaffected)."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {"size": self.size, "open": self._open_count, "idle": self._idle.qsize(), **self._stats}
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=None):
+    """Return the process-wide pool for db_path (defaults to settings.DB_PATH)."""
+    key = Path(db_path or settings.DB_PATH).resolve()
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(key)
+        return _pools[key]
+
+
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
@@ -0,0 +1,135 @@
+"""Single-scan planner for the overview and maverick facts.
+
+The per-statement SQL facts (kept as the reference in
+benchmarks/bench_page_reads.py) answer each aggregate with its own statement,
+so one request reads the same rollup table four or five times with the same
+department filter. Here each endpoint reads every table it needs once, as its finest
+grouping, and derives the KPIs, per-month, per-department and per-category
+groupings in pandas (grouping-set style). Orders and ROUND() follow SQLite, so
+payloads match the per-statement path up to float summation order.
+"""
+import pandas as pd
+
+from columnar import sql_round
+from response_format import rows
+
+
+def _scan(query, table, columns, department_id):
+    where, params = ("WHERE department_id = ?", [department_id]) if department_id else ("", None)
+    return query(f"SELECT {', '.join(columns)} FROM {table} {where}", params)
+
+
+def _group(df, by, sums):
+    """SUM(sums) ... GROUP BY by, in key order."""
+    return df.groupby(by, sort=True, dropna=False)[sums].sum().reset_index()
+
+
+def _order_desc(df, column):
+    """ORDER BY column DESC after a GROUP BY (ties stay in key order)."""
+    return df.sort_values(column, ascending=False, kind='stable')
+
+
+def _by_department_name(query, grouped, sums):
+    """Join department names (inner join) and regroup by name, like GROUP BY d.name."""
+    names = query("SELECT id as department_id, name as department FROM departments")
+    return _group(grouped.merge(names, on='department_id'), 'department', sums)
+
+
+def _pct(part, whole):
+    return [sql_round(p * 100.0 / w) if w else None for p, w in zip(part, whole)]
+
+
+# ─── Overview ────────────────────────────────────────────────────────────────
+def overview_facts(query, department_id):
+    spend = _scan(query, "spend_by_dept_month_scoa",
+                  ["department_id", "month", "scoa_description", "txn_count", "total_amount"], department_id)
+    facts = {
+        "total_spend": float(spend['total_amount'].sum()) if len(spend) else 0,
+        "total_transactions": int(spend['txn_count'].sum()) if len(spend) else 0,
+        "total_purchase_orders": int(_scan(query, "po_by_dept_month_commodity", ["SUM(po_count)"],
+                                           department_id).iloc[0, 0] or 0),
+    }
+
+    monthly = _group(spend, 'month', ['total_amount', 'txn_count'])
+    facts["monthly_trend"] = monthly.rename(columns={'total_amount': 'total'})[
+        ['month', 'total', 'txn_count']].to_dict('records')
+
+    facts["department_spend"] = []
+    if not department_id:
+        by_dept = _by_department_name(query, _group(spend, 'department_id', ['total_amount', 'txn_count']),
+                                      ['total_amount', 'txn_count'])
+        facts["department_spend"] = rows(_order_desc(
+            by_dept.rename(columns={'total_amount': 'total_spend'}), 'total_spend')[
+            ['department', 'total_spend', 'txn_count']])
+
+    scoa = _group(spend, 'scoa_description', ['total_amount'])
+    facts["scoa_spend"] = rows(_order_desc(
+        scoa.rename(columns={'scoa_description': 'category', 'total_amount': 'total'}), 'total')[
+        ['category', 'total']])
+
+    facts["supplier_concentration"] = []
+    if not department_id:
+        facts["supplier_concentration"] = query("""
+            SELECT s.id, s.supplier_name, SUM(r.total_amount) as total_spend, SUM(r.txn_count) as txn_count
+            FROM spend_by_dept_supplier r JOIN suppliers s ON r.supplier_id = s.id
+            GROUP BY s.id, s.supplier_name ORDER BY total_spend DESC LIMIT 20
+        """).to_dict('records')
+    return facts
+
+
+# ─── Maverick ────────────────────────────────────────────────────────────────
+def maverick_facts(query, department_id):
+    po = _scan(query, "po_by_dept_month_commodity",
+               ["department_id", "month", "commodity_description", "is_maverick", "po_count", "total_value"],
+               department_id)
+    mav = po['is_maverick'] == 1
+    po = po.assign(maverick_pos=po['po_count'].where(mav, 0),
+                   maverick_value=po['total_value'].where(mav, 0.0))
+    sums = ['po_count', 'maverick_pos', 'maverick_value', 'total_value']
+
+    by_dept = []
+    if not department_id:
+        d = _by_department_name(query, _group(po, 'department_id', sums), sums)
+        d['maverick_pct'] = _pct(d['maverick_pos'], d['po_count'])
+        by_dept = rows(_order_desc(d.rename(columns={'po_count': 'total_pos'}), 'maverick_pct')[
+            ['department', 'total_pos', 'maverick_pos', 'maverick_pct', 'maverick_value',
+             'total_value']])
+
+    m = _group(po, 'month', ['po_count', 'maverick_pos'])
+    m['maverick_pct'] = _pct(m['maverick_pos'], m['po_count'])
+    monthly = rows(m.rename(columns={'po_count': 'total_pos'})[
+        ['month', 'total_pos', 'maverick_pos', 'maverick_pct']])
+
+    total, mav_total = int(po['po_count'].sum()), int(po['maverick_pos'].sum())
+    categories = _group(po[mav], 'commodity_description', ['po_count', 'total_value'])
+    by_category = rows(_order_desc(
+        categories.rename(columns={'commodity_description': 'category', 'po_count': 'count',
+                                   'total_value': 'value'}), 'value')[
+        ['category', 'count', 'value']].head(10))
+
+    pos_where, pos_params = "WHERE po.contract_id IS NULL", []
+    if department_id:
+        pos_where += " AND po.department_id = ?"
+        pos_params.append(department_id)
+    maverick_pos = rows(query(f"""
+        SELECT po.po_number, po.po_date, po.total_value,
+               s.supplier_name, d.name as department,
+               po.commodity_description as category,
+               CASE
+                   WHEN po.total_value > 500000 THEN 'Value exceeds threshold'
+                   ELSE 'No approved contract'
+               END as reason
+        FROM purchase_orders po
+        JOIN suppliers s ON po.supplier_id = s.id
+        JOIN departments d ON po.department_id = d.id
+        {pos_where} ORDER BY po.total_value DESC LIMIT 100
+    """, pos_params))
+
+    return {
+        "overall_maverick_pct": float(sql_round(mav_total * 100.0 / total) if total else 0),
+        "total_maverick_value": float(po['maverick_value'].sum()) if total else 0.0,
+        "by_department": by_dept,
+        "monthly_trend": monthly,
+        "by_category": by_category,
+        "maverick_pos": maverick_pos,
+    }
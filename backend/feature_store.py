@@ -0,0 +1,221 @@
+"""Incremental per-supplier feature store for anomaly detection.
+
+Keeps one row per supplier with running count/sum/min/max of amounts and the
+distinct departments and SCOA codes seen as bitsets (BLOBs, little-endian), so
+new transactions are folded in by id watermark instead of re-running the full
+GROUP BY over history. `load_features` returns the same frame the original
+aggregation query produced.
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from migrations import update_count
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+CHUNK_ROWS = 100_000
+
+FEATURE_COLUMNS = ['txn_count', 'total_amount', 'avg_amount', 'max_amount',
+                   'min_amount', 'dept_count', 'scoa_variety']
+
+
+def create_feature_tables(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS supplier_features (
+            supplier_id INTEGER PRIMARY KEY, txn_count INTEGER NOT NULL,
+            total_amount REAL, max_amount REAL, min_amount REAL,
+            dept_bits BLOB NOT NULL, scoa_bits BLOB NOT NULL);
+
+        CREATE TABLE IF NOT EXISTS scoa_bit_index (
+            scoa_code TEXT PRIMARY KEY, bit INTEGER NOT NULL UNIQUE);
+
+        CREATE TABLE IF NOT EXISTS feature_store_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1), row_count INTEGER NOT NULL, max_id INTEGER NOT NULL,
+            updates INTEGER NOT NULL DEFAULT 0);
+    ''')
+
+
+def _to_blob(bits):
+    return bits.to_bytes(max(1, (bits.bit_length() + 7) // 8), 'little')
+
+
+def _from_blob(blob):
+    return int.from_bytes(blob, 'little')
+
+
+def _bitsets(pairs, bit_of):
+    """{supplier_id: int bitset} from a frame of (supplier_id, key) pairs."""
+    out = {}
+    for sid, key in pairs.itertuples(index=False):
+        if key is None or key != key:   # NULLs are not counted by COUNT(DISTINCT)
+            continue
+        out[sid] = out.get(sid, 0) | (1 << bit_of(key))
+    return out
+
+
+def _fold_chunk(conn, chunk, scoa_bits):
+    """Merge one chunk of transactions into supplier_features (no commit)."""
+    chunk = chunk[chunk['supplier_id'].notna()]
+    if chunk.empty:
+        return
+    chunk = chunk.astype({'supplier_id': np.int64})
+    for code in chunk['scoa_code'].dropna().unique():
+        if code not in scoa_bits:
+            scoa_bits[code] = len(scoa_bits)
+            conn.execute("INSERT INTO scoa_bit_index VALUES (?, ?)", (code, scoa_bits[code]))
+
+    g = chunk.groupby('supplier_id')['amount']
+    agg = pd.DataFrame({'n': g.size(), 's': g.sum(min_count=1), 'mx': g.max(), 'mn': g.min()})
+    depts = _bitsets(chunk[['supplier_id', 'department_id']].drop_duplicates(), int)
+    scoas = _bitsets(chunk[['supplier_id', 'scoa_code']].drop_duplicates(), scoa_bits.__getitem__)
+
+    ids = agg.index.tolist()
+    existing = {}
+    for i in range(0, len(ids), 500):
+        batch = ids[i:i + 500]
+        existing.update((r[0], r[1:]) for r in conn.execute(
+            f"SELECT * FROM supplier_features WHERE supplier_id IN ({','.join('?' * len(batch))})", batch))
+
+    rows = []
+    for sid, n, s, mx, mn in agg.itertuples():
+        s, mx, mn = (None if pd.isna(v) else float(v) for v in (s, mx, mn))
+        dbits, sbits = depts.get(sid, 0), scoas.get(sid, 0)
+        if sid in existing:
+            n0, s0, mx0, mn0, db0, sb0 = existing[sid]
+            n += n0
+            s = s0 if s is None else s if s0 is None else s0 + s
+            mx = max((v for v in (mx, mx0) if v is not None), default=None)
+            mn = min((v for v in (mn, mn0) if v is not None), default=None)
+            dbits |= _from_blob(db0)
+            sbits |= _from_blob(sb0)
+        rows.append((sid, int(n), s, mx, mn, _to_blob(dbits), _to_blob(sbits)))
+    conn.executemany("INSERT OR REPLACE INTO supplier_features VALUES (?,?,?,?,?,?,?)", rows)
+
+
+def fold_rows(conn, after_id, upto_id=None, row_count=None):
+    """Fold transactions with after_id < id (<= upto_id) into the store (no commit).
+
+    row_count/upto_id, when both known to the caller, are recorded as the new
+    watermark without re-counting the table.
+    """
+    scoa_bits = dict(conn.execute("SELECT scoa_code, bit FROM scoa_bit_index"))
+    last = after_id
+    while True:
+        chunk = pd.read_sql(
+            f"""SELECT id, supplier_id, department_id, scoa_code, amount FROM transactions
+                WHERE id > ? {"AND id <= ?" if upto_id is not None else ""} ORDER BY id LIMIT ?""",
+            conn, params=[last] + ([upto_id] if upto_id is not None else []) + [CHUNK_ROWS])
+        if chunk.empty:
+            break
+        _fold_chunk(conn, chunk, scoa_bits)
+        last = int(chunk['id'].iloc[-1])
+    if row_count is None or upto_id is None:
+        row_count, upto_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM transactions").fetchone()
+    conn.execute("INSERT OR REPLACE INTO feature_store_state (id, row_count, max_id, updates) VALUES (1, ?, ?, ?)",
+                 (row_count, upto_id, update_count(conn, "transactions")))
+
+
+def rebuild_features(conn):
+    create_feature_tables(conn)
+    conn.execute("DELETE FROM supplier_features")
+    conn.execute("DELETE FROM scoa_bit_index")
+    fold_rows(conn, 0)
+    conn.commit()
+
+
+def refresh_features(conn):
+    """Fold in appended transactions, or rebuild if rows were deleted or updated
+    in place (migration 4's update counter).
+
+    Returns 'fresh', 'appended' or 'rebuilt'.
+    """
+    create_feature_tables(conn)
+    count, max_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM transactions").fetchone()
+    updates = update_count(conn, "transactions")
+    state = conn.execute("SELECT row_count, max_id, updates FROM feature_store_state").fetchone()
+    if state == (count, max_id, updates):
+        return "fresh"
+    if state and state[2] == updates and max_id > state[1]:
+        new_rows = conn.execute("SELECT COUNT(*) FROM transactions WHERE id > ?", (state[1],)).fetchone()[0]
+        if state[0] + new_rows == count:
+            fold_rows(conn, state[1])
+            conn.commit()
+            return "appended"
+    rebuild_features(conn)
+    return "rebuilt"
+
+
+def ensure_feature_store(db_path=DB_PATH):
+    """Refresh the store in db_path (opens its own read-write connection)."""
+    try:
+        conn = sqlite3.connect(str(db_path))
+        action = refresh_features(conn)
+        conn.close()
+        print(f"[DEBUG] Supplier feature store: {action}")
+    except Exception as e:
+        print(f"[DEBUG] Supplier feature store refresh failed: {e}")
+
+
+def load_features(conn):
+    """Per-supplier feature frame, ordered by supplier_id like the GROUP BY it replaces."""
+    df = pd.read_sql("""
+        SELECT supplier_id, txn_count, total_amount, max_amount, min_amount, dept_bits, scoa_bits
+        FROM supplier_features ORDER BY supplier_id
+    """, conn)
+    df['avg_amount'] = df['total_amount'] / df['txn_count']
+    df['dept_count'] = [_from_blob(b).bit_count() for b in df.pop('dept_bits')]
+    df['scoa_variety'] = [_from_blob(b).bit_count() for b in df.pop('scoa_bits')]
+    return df[['supplier_id'] + FEATURE_COLUMNS]
+
+
+def check_features(conn, rel_tol=1e-9):
+    """Compare the store with a full GROUP BY over transactions; returns mismatches."""
+    create_feature_tables(conn)
+    raw = pd.read_sql("""
+        SELECT supplier_id, COUNT(*) as txn_count, SUM(amount) as total_amount,
+               AVG(amount) as avg_amount, MAX(amount) as max_amount, MIN(amount) as min_amount,
+               COUNT(DISTINCT department_id) as dept_count, COUNT(DISTINCT scoa_code) as scoa_variety
+        FROM transactions WHERE supplier_id IS NOT NULL GROUP BY supplier_id
+    """, conn).set_index('supplier_id')
+    stored = load_features(conn).set_index('supplier_id')
+    problems = []
+    if not raw.index.equals(stored.index):
+        problems.append(f"supplier sets differ: raw={len(raw)} store={len(stored)}")
+        return problems
+    for col in FEATURE_COLUMNS:
+        a, b = raw[col].to_numpy(float), stored[col].to_numpy(float)
+        bad = ~np.isclose(a, b, rtol=rel_tol, atol=1e-6, equal_nan=True)
+        for sid in raw.index[bad][:5]:
+            problems.append(f"supplier {sid} {col}: raw={raw.at[sid, col]} store={stored.at[sid, col]}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the supplier feature store.")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check"])
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    status = 0
+    if args.command == "rebuild":
+        rebuild_features(conn)
+        print("Feature store rebuilt.")
+    elif args.command == "refresh":
+        print(refresh_features(conn))
+    else:
+        problems = check_features(conn)
+        for p in problems:
+            print(f"  MISMATCH {p}")
+        print("Feature store consistent." if not problems else f"{len(problems)} mismatches.")
+        status = 1 if problems else 0
+    conn.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
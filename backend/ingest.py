@@ -0,0 +1,278 @@
+"""Streaming bulk ingestion of transactions and purchase orders.
+
+Rows arrive as NDJSON or CSV, are validated against the live table schema (as
+created by data/generate_data.create_tables, or its view over the fact table
+since migration 3, whose trigger codes the row) and inserted in batches, one write
+transaction per batch. The derived structures that track these tables (rollups,
+supplier feature store, invoice index, search index) are updated inside the same
+transaction from the id range the batch occupies, so readers never see raw rows without
+their aggregates and no full rebuild is needed. Memory use is bounded by the batch size.
+
+    python backend/ingest.py transactions extract.ndjson [--format csv] [--on-error skip]
+"""
+import argparse
+import codecs
+import csv
+import json
+import re
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import settings
+import migrations
+import rollups
+import feature_store
+import invoice_index
+import search_index
+
+INGEST_TABLES = ("transactions", "purchase_orders")
+
+# Columns the derived structures and endpoints rely on, beyond NOT NULL ones
+REQUIRED = {
+    "transactions": ("transaction_date", "department_id", "amount", "scoa_code", "scoa_description"),
+    "purchase_orders": ("po_number", "po_date", "department_id", "total_value", "commodity_description"),
+}
+# column -> dimension table its value must exist in
+REFERENCES = {
+    "department_id": "departments",
+    "supplier_id": "suppliers",
+    "contract_id": "contracts",
+}
+DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MAX_ERROR_SAMPLES = 20
+
+
+class IngestError(ValueError):
+    """A row failed validation (carries the 1-based row number)."""
+
+    def __init__(self, row_number, message):
+        super().__init__(f"row {row_number}: {message}")
+        self.row_number = row_number
+
+
+# ─── Parsing ─────────────────────────────────────────────────────────────────
+def iter_lines(chunks):
+    """Decode an iterable of byte chunks into text lines (newlines kept)."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def iter_records(chunks, fmt):
+    """Yield dicts from NDJSON or CSV byte chunks."""
+    lines = iter_lines(chunks)
+    if fmt == "csv":
+        yield from csv.DictReader(lines)
+        return
+    for line in lines:
+        if line.strip():
+            yield json.loads(line)
+
+
+def detect_format(content_type, fmt=None):
+    if fmt:
+        return fmt
+    return "csv" if content_type and "csv" in content_type else "ndjson"
+
+
+# ─── Validation ──────────────────────────────────────────────────────────────
+class TableSchema:
+    """Column types, defaults and constraints of one ingestible table."""
+
+    def __init__(self, conn, table):
+        if table not in INGEST_TABLES:
+            raise ValueError(f"ingest not supported for table '{table}'")
+        self.table = table
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        if not info:
+            raise ValueError(f"table '{table}' does not exist")
+        # Since migration 3 table is a view over its fact table: key, defaults and
+        # NOT NULL come from the fact table, and its generated columns (month, fiscal
+        # year/period from the date) are rejected in records, never written.
+        stored = {r[1]: r for r in conn.execute(f"PRAGMA table_xinfo({migrations.FACT_TABLES[table]})")}
+        self.derived = {name for name, r in stored.items() if r[6]}
+        info = [stored[r[1]][:6] if r[1] in stored else r for r in info if r[1] not in self.derived]
+        # (cid, name, type, notnull, dflt_value, pk)
+        self.columns = [r[1] for r in info if not r[5]]
+        self.types = {r[1]: r[2].upper() for r in info}
+        self.defaults = {r[1]: self._literal(r[4]) for r in info}
+        self.required = {r[1] for r in info if r[3] and not r[5]} | set(REQUIRED[table])
+        self.known_ids = {
+            col: {r[0] for r in conn.execute(f"SELECT id FROM {ref}")}
+            for col, ref in REFERENCES.items() if col in self.types
+        }
+        self.insert_sql = (f"INSERT INTO {table} ({','.join(self.columns)}) "
+                           f"VALUES ({','.join('?' * len(self.columns))})")
+
+    @staticmethod
+    def _literal(default):
+        if default is None:
+            return None
+        if default[:1] == default[-1:] == "'":
+            return default[1:-1]
+        return float(default) if "." in default else int(default)
+
+    def _coerce(self, col, value):
+        if value is None or value == "":
+            return None
+        kind = self.types[col]
+        if kind == "INTEGER":
+            if isinstance(value, float) and not value.is_integer():
+                raise ValueError(f"{col} must be an integer")
+            return int(value)
+        if kind == "REAL":
+            return float(value)
+        value = str(value)
+        if col.endswith("_date") and not DATE_RE.match(value):
+            raise ValueError(f"{col} must be YYYY-MM-DD")
+        return value
+
+    def row(self, record, row_number):
+        """Validated tuple in insert_sql column order."""
+        if not isinstance(record, dict):
+            raise IngestError(row_number, "expected an object")
+        generated = set(record) & self.derived
+        if generated:
+            raise IngestError(row_number, f"generated columns {sorted(generated)} are computed from the date, "
+                                          f"leave them out")
+        unknown = set(record) - set(self.columns)
+        if unknown:
+            raise IngestError(row_number, f"unknown columns {sorted(unknown)}")
+        values = []
+        for col in self.columns:
+            try:
+                value = self._coerce(col, record.get(col))
+            except (TypeError, ValueError) as e:
+                raise IngestError(row_number, str(e)) from None
+            if value is None:
+                if col in self.required:
+                    raise IngestError(row_number, f"{col} is required")
+                value = self.defaults[col]
+            if value is not None and col in self.known_ids and value not in self.known_ids[col]:
+                raise IngestError(row_number, f"{col}={value} does not exist in {REFERENCES[col]}")
+            values.append(value)
+        return tuple(values)
+
+
+# ─── Writing ─────────────────────────────────────────────────────────────────
+def _apply_batch(conn, schema, rows, state):
+    """Insert one batch and update derived structures in the same transaction."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        before = conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {schema.table}").fetchone()[0]
+        conn.executemany(schema.insert_sql, rows)
+        after = conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {schema.table}").fetchone()[0]
+        state["row_count"] += len(rows)
+        rollups.apply_rows(conn, schema.table, before, after, state["row_count"])
+        search_index.apply_rows(conn, schema.table, before, after, state["row_count"])
+        if schema.table == "transactions":
+            feature_store.fold_rows(conn, before, after, state["row_count"])
+            invoice_index.apply_rows(conn, before, after, state["row_count"])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def connect_writer(db_path):
+    conn = sqlite3.connect(str(db_path), isolation_level=None, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def ingest_records(table, records, db_path=None, batch_size=None, on_error="abort"):
+    """Validate and load an iterable of dicts into table; returns a report dict.
+
+    on_error='abort' stops at the first invalid row (rows before it are still
+    committed); 'skip' drops invalid rows and keeps going.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_ROWS
+    conn = connect_writer(db_path or settings.DB_PATH)
+    start = time.perf_counter()
+    report = {"table": table, "rows_inserted": 0, "rows_rejected": 0, "batches": 0, "errors": []}
+    try:
+        schema = TableSchema(conn, table)
+        # bring derived structures up to date first so batches can be appended
+        rollups.refresh_rollups(conn)
+        search_index.refresh_index(conn)
+        if table == "transactions":
+            feature_store.refresh_features(conn)
+            invoice_index.refresh_index(conn)
+        state = {"row_count": conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]}
+
+        batch = []
+        for n, record in enumerate(records, 1):
+            try:
+                batch.append(schema.row(record, n))
+            except IngestError as e:
+                report["rows_rejected"] += 1
+                if len(report["errors"]) < MAX_ERROR_SAMPLES:
+                    report["errors"].append(str(e))
+                if on_error != "skip":
+                    report["aborted"] = True
+                    break
+            if len(batch) >= batch_size:
+                _apply_batch(conn, schema, batch, state)
+                report["rows_inserted"] += len(batch)
+                report["batches"] += 1
+                batch = []
+        if batch:
+            _apply_batch(conn, schema, batch, state)
+            report["rows_inserted"] += len(batch)
+            report["batches"] += 1
+    except (json.JSONDecodeError, csv.Error, UnicodeDecodeError) as e:
+        report["aborted"] = True
+        report["errors"].append(f"unreadable input: {e}")
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - start
+    report["seconds"] = round(elapsed, 3)
+    report["rows_per_sec"] = round(report["rows_inserted"] / elapsed) if elapsed else 0
+    return report
+
+
+def ingest_stream(table, chunks, fmt="ndjson", **kwargs):
+    """ingest_records over an iterable of raw NDJSON/CSV byte chunks."""
+    return ingest_records(table, iter_records(chunks, fmt), **kwargs)
+
+
+def _file_chunks(f, size=1 << 16):
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream NDJSON/CSV rows into the database.")
+    parser.add_argument("table", choices=INGEST_TABLES)
+    parser.add_argument("path", help="input file, or - for stdin")
+    parser.add_argument("--format", choices=["ndjson", "csv"],
+                        help="defaults to csv for *.csv files, ndjson otherwise")
+    parser.add_argument("--db", default=str(settings.DB_PATH), help="SQLite database path")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_ROWS)
+    parser.add_argument("--on-error", choices=["abort", "skip"], default="abort")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    f = sys.stdin.buffer if args.path == "-" else open(args.path, "rb")
+    with f:
+        report = ingest_stream(args.table, _file_chunks(f), fmt, db_path=Path(args.db),
+                               batch_size=args.batch_size, on_error=args.on_error)
+    print(json.dumps(report, indent=2))
+    return 1 if report.get("aborted") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
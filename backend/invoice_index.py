@@ -0,0 +1,239 @@
+"""Maintained index behind duplicate and split-invoice detection.
+
+Two tables keyed by a 64-bit fingerprint:
+
+- invoice_fingerprints: one row per distinct (supplier_id, transaction_date,
+  amount, description) with its occurrence count; count > 1 is a duplicate.
+- supplier_daily_totals: running count/sum per (supplier_id, transaction_date);
+  more than one transaction summing to R450k-R500k is a potential split.
+
+New transactions are merged by id watermark (the same (after_id, upto_id] scheme
+as rollups.py), each row costing one keyed upsert per table, so flagged groups
+are read from two small partial indexes instead of grouping all of
+`transactions` per request. Fingerprints are computed by a Python SQL function
+registered on the writing connection only; readers never need it.
+"""
+import argparse
+import hashlib
+import sqlite3
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from migrations import update_count
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+
+SPLIT_MIN, SPLIT_MAX = 450000, 500000
+
+
+def fingerprint(*values):
+    """Stable signed 64-bit hash of a tuple of SQL values (NULL-aware)."""
+    digest = hashlib.blake2b(repr(values).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little', signed=True)
+
+
+def register_functions(conn):
+    conn.create_function("fingerprint", -1, fingerprint, deterministic=True)
+
+
+# ─── Schema ──────────────────────────────────────────────────────────────────
+def create_index_tables(conn):
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS invoice_fingerprints (
+            fingerprint INTEGER PRIMARY KEY, supplier_id INTEGER, transaction_date TEXT,
+            amount REAL, description TEXT, occurrence_count INTEGER NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_invoice_fingerprints_dup
+            ON invoice_fingerprints(supplier_id, transaction_date, amount, description)
+            WHERE occurrence_count > 1;
+
+        CREATE TABLE IF NOT EXISTS supplier_daily_totals (
+            day_key INTEGER PRIMARY KEY, supplier_id INTEGER, transaction_date TEXT,
+            txn_count INTEGER NOT NULL, total_amount REAL);
+        CREATE INDEX IF NOT EXISTS idx_supplier_daily_totals_split
+            ON supplier_daily_totals(supplier_id, transaction_date)
+            WHERE txn_count > 1 AND total_amount BETWEEN {SPLIT_MIN} AND {SPLIT_MAX};
+
+        CREATE TABLE IF NOT EXISTS invoice_index_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1), row_count INTEGER NOT NULL, max_id INTEGER NOT NULL,
+            updates INTEGER NOT NULL DEFAULT 0);
+    ''')
+
+
+# Both upserts aggregate transactions in (?, ?] first, so a batch touches each
+# key once; SUM stays NULL while every amount for the key is NULL, as in SQL.
+UPSERTS = [
+    '''INSERT INTO invoice_fingerprints
+       SELECT fingerprint(supplier_id, transaction_date, amount, description),
+              supplier_id, transaction_date, amount, description, COUNT(*)
+       FROM transactions WHERE id > ? AND id <= ?
+       GROUP BY supplier_id, transaction_date, amount, description
+       ON CONFLICT (fingerprint) DO UPDATE SET
+           occurrence_count = occurrence_count + excluded.occurrence_count''',
+    '''INSERT INTO supplier_daily_totals
+       SELECT fingerprint(supplier_id, transaction_date), supplier_id, transaction_date,
+              COUNT(*), SUM(amount)
+       FROM transactions WHERE id > ? AND id <= ?
+       GROUP BY supplier_id, transaction_date
+       ON CONFLICT (day_key) DO UPDATE SET
+           txn_count = txn_count + excluded.txn_count,
+           total_amount = CASE WHEN total_amount IS NULL THEN excluded.total_amount
+                               WHEN excluded.total_amount IS NULL THEN total_amount
+                               ELSE total_amount + excluded.total_amount END''',
+]
+
+
+# ─── Build / refresh ─────────────────────────────────────────────────────────
+def apply_rows(conn, after_id, upto_id, row_count=None):
+    """Merge transactions with after_id < id <= upto_id into the index (no commit)."""
+    register_functions(conn)
+    for sql in UPSERTS:
+        conn.execute(sql, (after_id, upto_id))
+    if row_count is None:
+        row_count, upto_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM transactions").fetchone()
+    conn.execute("INSERT OR REPLACE INTO invoice_index_state (id, row_count, max_id, updates) VALUES (1, ?, ?, ?)",
+                 (row_count, upto_id, update_count(conn, "transactions")))
+
+
+def rebuild_index(conn):
+    create_index_tables(conn)
+    conn.execute("DELETE FROM invoice_fingerprints")
+    conn.execute("DELETE FROM supplier_daily_totals")
+    apply_rows(conn, 0, conn.execute("SELECT IFNULL(MAX(id), 0) FROM transactions").fetchone()[0])
+    conn.commit()
+
+
+def refresh_index(conn):
+    """Merge appended transactions, or rebuild if rows were deleted or updated
+    in place (migration 4's update counter).
+
+    Returns 'fresh', 'appended' or 'rebuilt'.
+    """
+    create_index_tables(conn)
+    count, max_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM transactions").fetchone()
+    updates = update_count(conn, "transactions")
+    state = conn.execute("SELECT row_count, max_id, updates FROM invoice_index_state").fetchone()
+    if state == (count, max_id, updates):
+        return "fresh"
+    if state and state[2] == updates and max_id > state[1]:
+        new_rows = conn.execute("SELECT COUNT(*) FROM transactions WHERE id > ?", (state[1],)).fetchone()[0]
+        if state[0] + new_rows == count:
+            apply_rows(conn, state[1], max_id)
+            conn.commit()
+            return "appended"
+    rebuild_index(conn)
+    return "rebuilt"
+
+
+def ensure_invoice_index(db_path=DB_PATH):
+    """Refresh the index in db_path (opens its own read-write connection)."""
+    try:
+        conn = sqlite3.connect(str(db_path))
+        action = refresh_index(conn)
+        conn.close()
+        print(f"[DEBUG] Invoice index: {action}")
+    except Exception as e:
+        print(f"[DEBUG] Invoice index refresh failed: {e}")
+
+
+# ─── Reads ───────────────────────────────────────────────────────────────────
+def flagged_duplicates(conn):
+    """Duplicate groups in GROUP BY order, with supplier names."""
+    return pd.read_sql("""
+        SELECT f.supplier_id, f.transaction_date, f.amount, f.description,
+               f.occurrence_count, s.supplier_name
+        FROM invoice_fingerprints f LEFT JOIN suppliers s ON s.id = f.supplier_id
+        WHERE f.occurrence_count > 1
+        ORDER BY f.supplier_id, f.transaction_date, f.amount, f.description
+    """, conn)
+
+
+def flagged_splits(conn, low=SPLIT_MIN, high=SPLIT_MAX, min_count=2):
+    """Supplier-days of at least min_count transactions summing to [low, high],
+    with supplier names. The default band is written out literally, exactly
+    like the partial index's predicate, so the planner can use the index; any
+    other band is bound as parameters."""
+    if (low, high, min_count) == (SPLIT_MIN, SPLIT_MAX, 2):
+        band, params = f"t.txn_count > 1 AND t.total_amount BETWEEN {SPLIT_MIN} AND {SPLIT_MAX}", None
+    else:
+        band, params = "t.txn_count >= ? AND t.total_amount BETWEEN ? AND ?", (int(min_count), low, high)
+    return pd.read_sql(f"""
+        SELECT t.supplier_id, t.transaction_date, t.total_amount as total_daily_amount,
+               t.txn_count, s.supplier_name
+        FROM supplier_daily_totals t LEFT JOIN suppliers s ON s.id = t.supplier_id
+        WHERE {band}
+        ORDER BY t.supplier_id, t.transaction_date
+    """, conn, params=params)
+
+
+# ─── Consistency check ──────────────────────────────────────────────────────
+# The full-table scans the index replaces
+RAW_DUPLICATES = """
+    SELECT supplier_id, transaction_date, amount, description, COUNT(*) as occurrence_count
+    FROM transactions
+    GROUP BY supplier_id, transaction_date, amount, description
+    HAVING occurrence_count > 1
+"""
+RAW_SPLITS = f"""
+    SELECT supplier_id, transaction_date, SUM(amount) as total_daily_amount, COUNT(*) as txn_count
+    FROM transactions
+    GROUP BY supplier_id, transaction_date
+    HAVING txn_count > 1 AND total_daily_amount BETWEEN {SPLIT_MIN} AND {SPLIT_MAX}
+"""
+
+
+def check_index(conn, rel_tol=1e-9):
+    """Compare flagged groups with the raw GROUP BY queries; returns mismatches.
+
+    Daily sums may differ in the last bits (different addition order), so
+    amounts are compared with a tolerance; a total sitting exactly on a
+    threshold could flip either way and would show up here.
+    """
+    create_index_tables(conn)
+    problems = []
+    for name, raw_sql, flagged, keys, values in [
+        ("duplicates", RAW_DUPLICATES, flagged_duplicates,
+         ['supplier_id', 'transaction_date', 'amount', 'description'], ['occurrence_count']),
+        ("splits", RAW_SPLITS, flagged_splits,
+         ['supplier_id', 'transaction_date'], ['txn_count', 'total_daily_amount']),
+    ]:
+        raw = pd.read_sql(raw_sql, conn)
+        stored = flagged(conn)[raw.columns]
+        if len(raw) != len(stored):
+            problems.append(f"{name}: raw={len(raw)} groups, index={len(stored)}")
+            continue
+        for i, (a, b) in enumerate(zip(raw.itertuples(index=False), stored.itertuples(index=False))):
+            for col, x, y in zip(raw.columns, a, b):
+                same = (x == y or (pd.isna(x) and pd.isna(y)) or
+                        (isinstance(x, float) and abs(x - y) <= rel_tol * max(abs(x), abs(y), 1.0)))
+                if not same:
+                    problems.append(f"{name}[{i}] {col}: raw={x!r} index={y!r}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the duplicate/split invoice index.")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check"])
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    status = 0
+    if args.command == "rebuild":
+        rebuild_index(conn)
+        print("Invoice index rebuilt.")
+    elif args.command == "refresh":
+        print(refresh_index(conn))
+    else:
+        problems = check_index(conn)
+        for p in problems[:20]:
+            print(f"  MISMATCH {p}")
+        print("Invoice index consistent." if not problems else f"{len(problems)} mismatches.")
+        status = 1 if problems else 0
+    conn.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
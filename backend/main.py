@@ -1,12 +1,21 @@
 """GPG Analytics Dashboard - FastAPI Backend"""
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import math
 import sqlite3
 import sys
 import os
+import secrets
+from contextlib import asynccontextmanager, contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
 import pandas as pd
 import numpy as np
@@ -16,14 +25,29 @@ backend_dir = Path(__file__).resolve().parent
 if str(backend_dir) not in sys.path:
     sys.path.append(str(backend_dir))
 
-from anomaly_detection import detect_transaction_anomalies, detect_contract_anomalies, detect_invoice_anomalies
-
-# Robust path resolution for database
-potential_paths = [
-    Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db", # Root mono-repo
-    Path(__file__).resolve().parent / "database" / "gpg_analytics.db",        # Nested in backend
-    Path("/opt/render/project/src/database/gpg_analytics.db"),              # Render absolute path
-]
+import settings
+from db_pool import get_pool, PoolTimeout
+from anomaly_detection import cached_transaction_anomalies, detect_contract_anomalies, detect_invoice_anomalies, supplier_model_store
+import transaction_scores
+from migrations import ensure_migrations
+from rollups import ensure_rollups
+from feature_store import ensure_feature_store
+from invoice_index import ensure_invoice_index
+from search_index import ensure_search_index, search as search_index
+from columnar import get_engine
+from supplier_index import get_supplier_index
+import fact_planner
+from ingest import INGEST_TABLES, detect_format, ingest_stream
+from response_cache import DataVersion, ResponseCache, ResponseCacheMiddleware
+from readers import ReadersBusy, offload, readers
+from pagination import ListQuery, PageRequestError, ensure_pagination_indexes
+import metrics
+import profiler
+import response_format
+from bootstrap import Bootstrap, StartupGateMiddleware
+
+# Robust path resolution for database (see settings.py; GPG_DB_PATH takes precedence)
+potential_paths = settings.POTENTIAL_DB_PATHS
 
 # In cloud deployment, the DB might be missing because it's too large for Git.
 # Auto-generate a lightweight version if so.
@@ -39,21 +63,41 @@ def init_db():
             
             from data.generate_data import generate_all_data
             
-            # Use small transaction count for Render free tier (Ultra-Fast & low RAM)
-            generate_all_data(db_path=potential_paths[0], transactions_n=5000, po_n=1000, supplier_n=100)
+            # Use small transaction count for Render free tier (Ultra-Fast & low RAM);
+            # vectorized in-process generation, no worker pool on a single small instance
+            generate_all_data(db_path=potential_paths[0], transactions_n=5000, po_n=1000, supplier_n=100,
+                              vectorized=True, workers=1)
             print("[DEBUG] Database generated successfully.")
         else:
             print(f"[DEBUG] Database found at: {potential_db}")
     except Exception as e:
         print(f"[DEBUG] FATAL: Database auto-initialization failed: {e}")
 
-app = FastAPI(title="GPG Analytics API", version="1.1.1")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
-                   allow_methods=["*"], allow_headers=["*"])
+# Database generation and derived-table refreshes; run in the background from the
+# lifespan (or during import with GPG_STARTUP_MODE=blocking), steps added below.
+bootstrap = Bootstrap()
+
+@asynccontextmanager
+async def lifespan(app):
+    bootstrap.start()
+    yield
+
+app = FastAPI(title="GPG Analytics API", version="1.1.1", default_response_class=response_format.APIResponse,
+              lifespan=lifespan)
+
+@app.exception_handler(ReadersBusy)
+async def readers_busy(request: Request, exc: ReadersBusy):
+    return JSONResponse(status_code=503, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.exception_handler(PageRequestError)
+async def bad_page_request(request: Request, exc: PageRequestError):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 @app.get("/api/health")
 def health():
-    return {"status": "ok", "db_path": str(DB_PATH), "db_exists": DB_PATH.exists()}
+    return {"status": "ok", "db_path": str(DB_PATH), "db_exists": DB_PATH.exists(),
+            "pool": get_pool(DB_PATH).stats(), "readers": readers.stats()}
 
 @app.get("/api/debug-db")
 def debug_db():
@@ -67,23 +111,126 @@ def debug_db():
         "cwd": os.getcwd()
     }
 
-DB_PATH = next((p for p in potential_paths if p.exists()), potential_paths[0])
-init_db()
+DB_PATH = settings.DB_PATH
+bootstrap.add("init_db", init_db)
+bootstrap.add("migrations", lambda: ensure_migrations(DB_PATH))
+bootstrap.add("rollups", lambda: ensure_rollups(DB_PATH))
+bootstrap.add("feature_store", lambda: ensure_feature_store(DB_PATH))
+bootstrap.add("invoice_index", lambda: ensure_invoice_index(DB_PATH))
+bootstrap.add("pagination_indexes", lambda: ensure_pagination_indexes(DB_PATH))
+bootstrap.add("search_index", lambda: ensure_search_index(DB_PATH))
+bootstrap.add("supplier_index", lambda: get_supplier_index(DB_PATH))
+if settings.ANALYTICS_ENGINE == "columnar":
+    bootstrap.add("column_cache", lambda: get_engine(DB_PATH))     # build or attach the shared columns
+if settings.STARTUP_MODE == "blocking":
+    bootstrap.run()
+
+@app.get("/api/ready")
+def ready():
+    """Readiness: 200 once the database bootstrap has finished, 503 before (or if it failed)."""
+    status = bootstrap.status()
+    return status if status["ready"] else JSONResponse(status_code=503, content=status)
+
+# ─── Response cache ─────────────────────────────────────────────────────────
+# Keyed by data version; the supplier model version is part of it because the
+# model refits in the background after the data has already moved.
+data_version = DataVersion(DB_PATH, extra_sources=[lambda: supplier_model_store.version])
+response_cache = ResponseCache()
+if settings.RESPONSE_CACHE_ENABLED:
+    app.add_middleware(ResponseCacheMiddleware, version=data_version, cache=response_cache,
+                       exclude={"/api/health", "/api/ready", "/api/debug-db", "/api/anomalies/model",
+                                "/api/anomalies/transactions/status", "/api/cache/stats",
+                                "/api/metrics", "/api/metrics/slow-queries"},
+                       exclude_prefixes=("/api/profiles",))
+
+# Outside the cache: an Accept-selected format is rewritten into ?format=, part of the cache key.
+app.add_middleware(response_format.ResponseFormatMiddleware)
+
+app.add_middleware(StartupGateMiddleware, bootstrap=bootstrap)
+
+# Outside the cache, so CORS headers are computed per request, for cache hits too,
+# and never replayed from a response cached for another Origin.
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                   allow_methods=["*"], allow_headers=["*"])
 
+# Outermost, so request timings include cache hits and the cache lookup itself.
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiler.ProfilerMiddleware, exclude=("/api/profiles", "/api/metrics"))
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Request, SQL, DataFrame and JSON timings in Prometheus text format."""
+    return metrics.render_metrics()
+
+@app.get("/api/metrics/slow-queries")
+def slow_queries():
+    """Recent statements over GPG_SLOW_QUERY_MS, with their query plans."""
+    return {"threshold_ms": metrics.slow_queries.threshold_ms, "queries": metrics.slow_queries.recent()}
+
+# ─── Request profiles ───────────────────────────────────────────────────────
+def check_profile_token(request: Request):
+    """Profiles are only served to holders of GPG_PROFILE_TOKEN, and not at all without one."""
+    if not settings.PROFILE_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("x-gpg-profile", "").encode(), settings.PROFILE_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="X-GPG-Profile token required")
+
+@app.get("/api/profiles")
+def list_profiles(request: Request):
+    """Stored request profiles, newest first."""
+    check_profile_token(request)
+    return {"profiles": profiler.store.recent()}
+
+@app.get("/api/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    """One profile's metadata and allocation sites."""
+    check_profile_token(request)
+    meta = profiler.store.get(profile_id)
+    if meta is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return meta
+
+@app.get("/api/profiles/{profile_id}/folded")
+def download_profile(profile_id: str, request: Request):
+    """Collapsed stacks, for flamegraph.pl or speedscope."""
+    check_profile_token(request)
+    path = profiler.store.path(profile_id, ".folded")
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"profile-{profile_id}.folded")
+
+@app.get("/api/cache/stats")
+def cache_stats():
+    """Per-endpoint hit/miss/304 counters and size of the response cache."""
+    return {"enabled": settings.RESPONSE_CACHE_ENABLED, "data_version": data_version.current(),
+            **response_cache.stats()}
+
+@contextmanager
 def get_db():
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Borrow a pooled read-only connection returning sqlite3.Row rows."""
+    try:
+        with get_pool(DB_PATH).connection() as conn:
+            conn.row_factory = sqlite3.Row
+            yield conn
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
 def query_df(sql, params=None):
     try:
-        conn = sqlite3.connect(str(DB_PATH))
-        df = pd.read_sql(sql, conn, params=params)
-        conn.close()
-        return df
+        with get_pool(DB_PATH).connection() as conn:
+            return metrics.read_sql(conn, sql, params)
+    except PoolTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database query failed: {str(e)}")
 
+def query_records(sql, params=None):
+    return metrics.to_records(query_df(sql, params), sql)
+
+def query_rows(sql, params=None):
+    """query_records for result sets returned as is: a Table when the response is columnar."""
+    return response_format.rows(query_df(sql, params))
+
 # ─── Auth ────────────────────────────────────────────────────────────────────
 class LoginRequest(BaseModel):
     username: str
@@ -94,58 +241,31 @@ def login(req: LoginRequest):
     return {"token": "mock-jwt-token-gpg-2025", "user": req.username, "role": "analyst"}
 
 @app.get("/api/departments")
+@offload
 def get_departments():
-    return query_df("SELECT id, name FROM departments ORDER BY name").to_dict('records')
-
-# ─── Overview ────────────────────────────────────────────────────────────────
-@app.get("/api/overview")
-def overview(department_id: Optional[int] = None):
-    where_clause = "WHERE 1=1"
-    params = []
-    if department_id:
-        where_clause += " AND department_id = ?"
-        params.append(department_id)
-
-    conn = get_db()
-    c = conn.cursor()
-    
-    # KPIs
-    total_spend = c.execute(f"SELECT SUM(amount) FROM transactions {where_clause}", params).fetchone()[0] or 0
-    total_txns = c.execute(f"SELECT COUNT(*) FROM transactions {where_clause}", params).fetchone()[0] or 0
-    total_pos = c.execute(f"SELECT COUNT(*) FROM purchase_orders {where_clause}", params).fetchone()[0] or 0
-    
-    # For active suppliers/contracts, we act slightly differently if filtering
-    if department_id:
-        # Suppliers used by this dept
-        active_suppliers = c.execute(
-            "SELECT COUNT(DISTINCT supplier_id) FROM transactions WHERE department_id = ?", 
-            (department_id,)
-        ).fetchone()[0] or 0
-        active_contracts = c.execute(
-            "SELECT COUNT(*) FROM contracts WHERE department_id = ? AND status='Active'", 
-            (department_id,)
-        ).fetchone()[0] or 0
-        budget = c.execute("SELECT annual_budget FROM departments WHERE id = ?", (department_id,)).fetchone()[0]
-    else:
-        active_suppliers = c.execute("SELECT COUNT(*) FROM suppliers").fetchone()[0]
-        active_contracts = c.execute("SELECT COUNT(*) FROM contracts WHERE status='Active'").fetchone()[0]
-        budget = c.execute("SELECT SUM(annual_budget) FROM departments").fetchone()[0]
-
-    # Monthly spend trend
-    monthly = query_df(f"""
-        SELECT substr(transaction_date,1,7) as month, SUM(amount) as total,
-               COUNT(*) as txn_count
-        FROM transactions {where_clause} GROUP BY month ORDER BY month
-    """, params).to_dict('records')
-    
-    # Simple Forecast (Linear Projection for next 6 months)
+    return query_rows("SELECT id, name FROM departments ORDER BY name")
+
+# ─── Analytics engine ────────────────────────────────────────────────────────
+# The fact-table aggregates behind overview/maverick/suppliers come either from
+# SQLite or from the in-memory columnar engine (columnar.py); both return the
+# same dicts, selected by GPG_ANALYTICS_ENGINE. On SQLite, overview and maverick
+# go through the single-scan planner (fact_planner.py), whose per-statement
+# reference lives in benchmarks/bench_page_reads.py.
+def analytics_facts(kind, department_id):
+    if settings.ANALYTICS_ENGINE == "columnar":
+        engine = get_engine(DB_PATH)
+        return getattr(engine, f"{kind}_facts")(department_id)
+    return FACTS_SQL[kind](department_id)
+
+def monthly_forecast(monthly):
+    """Simple Forecast (Linear Projection for next 6 months)."""
     forecast = []
     if len(monthly) > 12:
         last_month = monthly[-1]['month']
         # Simple moving average of last 3 months for projection base
         avg_spend = float(np.mean([m['total'] for m in monthly[-3:]]))
         last_date = datetime.strptime(last_month, "%Y-%m")
-        
+
         for i in range(1, 7):
             m = last_date.month - 1 + i
             y = last_date.year + m // 12
@@ -155,171 +275,223 @@ def overview(department_id: Optional[int] = None):
                 "total": avg_spend * (1 + (i * 0.02)), # Slight inflation trend
                 "is_forecast": True
             })
+    return forecast
+
+# ─── Overview ────────────────────────────────────────────────────────────────
+@app.get("/api/overview")
+@offload
+def overview(department_id: Optional[int] = None):
+    facts = analytics_facts("overview", department_id)
+    total_spend = facts["total_spend"]
+    active_suppliers = get_supplier_index(DB_PATH).active_suppliers(department_id)
+
+    with get_db() as conn:
+        c = conn.cursor()
+        # For active suppliers/contracts, we act slightly differently if filtering
+        if department_id:
+            active_contracts = c.execute(
+                "SELECT COUNT(*) FROM contracts WHERE department_id = ? AND status='Active'",
+                (department_id,)
+            ).fetchone()[0] or 0
+            budget = c.execute("SELECT annual_budget FROM departments WHERE id = ?", (department_id,)).fetchone()[0]
+        else:
+            active_contracts = c.execute("SELECT COUNT(*) FROM contracts WHERE status='Active'").fetchone()[0]
+            budget = c.execute("SELECT SUM(annual_budget) FROM departments").fetchone()[0]
+
+    monthly = facts["monthly_trend"]
+    forecast = monthly_forecast(monthly)
+
+    supplier_conc = facts["supplier_concentration"]
+    for sc in supplier_conc:
+        sc['pct_of_total'] = round(sc['total_spend'] / total_spend * 100, 1) if total_spend else 0
 
-    # Spend by department (if no dept filter)
-    dept_spend = []
-    if not department_id:
-        dept_spend = query_df("""
-            SELECT d.name as department, SUM(t.amount) as total_spend,
-                   COUNT(t.id) as txn_count
-            FROM transactions t JOIN departments d ON t.department_id = d.id
-            GROUP BY d.name ORDER BY total_spend DESC
-        """).to_dict('records')
-
-    # Spend by SCOA category
-    scoa_spend = query_df(f"""
-        SELECT scoa_description as category, SUM(amount) as total
-        FROM transactions {where_clause} GROUP BY scoa_description ORDER BY total DESC
-    """, params).to_dict('records')
-
-    # Top 20 supplier concentration (global only)
-    supplier_conc = []
-    if not department_id:
-        supplier_conc = query_df("""
-            SELECT s.id, s.supplier_name, SUM(t.amount) as total_spend, COUNT(t.id) as txn_count
-            FROM transactions t JOIN suppliers s ON t.supplier_id = s.id
-            GROUP BY s.id, s.supplier_name ORDER BY total_spend DESC LIMIT 20
-        """).to_dict('records')
-        for sc in supplier_conc:
-            sc['pct_of_total'] = round(sc['total_spend'] / total_spend * 100, 1) if total_spend else 0
-
-    conn.close()
     return {
         "kpis": {
             "total_spend": round(total_spend, 2),
-            "total_transactions": total_txns,
-            "total_purchase_orders": total_pos,
+            "total_transactions": facts["total_transactions"],
+            "total_purchase_orders": facts["total_purchase_orders"],
             "active_suppliers": active_suppliers,
             "active_contracts": active_contracts,
             "budget_variance": round(((budget - total_spend) / budget) * 100, 1) if budget else 0
         },
         "monthly_trend": monthly + forecast,
-        "department_spend": dept_spend,
-        "scoa_spend": scoa_spend,
+        "department_spend": facts["department_spend"],
+        "scoa_spend": facts["scoa_spend"],
         "supplier_concentration": supplier_conc,
     }
 
 # ─── Maverick Spend ─────────────────────────────────────────────────────────
-@app.get("/api/maverick")
-def maverick(department_id: Optional[int] = None):
-    where_clause = ""
-    params = []
+MAVERICK_PO_LIST = ListQuery(
+    select="""po.po_number, po.po_date, po.total_value,
+              s.supplier_name, d.name as department,
+              po.commodity_description as category,
+              CASE
+                  WHEN po.total_value > 500000 THEN 'Value exceeds threshold'
+                  ELSE 'No approved contract'
+              END as reason""",
+    source="""purchase_orders po
+              JOIN suppliers s ON po.supplier_id = s.id
+              JOIN departments d ON po.department_id = d.id""",
+    sorts={"total_value": "po.total_value", "po_date": "po.po_date"},
+    default_sort="-total_value",
+    filters={"po_number": ("po.po_number", "text"), "po_date": ("po.po_date", "date"),
+             "total_value": ("po.total_value", "number"), "supplier_name": ("s.supplier_name", "text"),
+             "department": ("d.name", "text"), "category": ("po.commodity_description", "text")},
+    tiebreak="po.id",
+)
+
+def maverick_po_page(department_id, limit, cursor, sort, filters):
+    """A keyset page of every off-contract PO."""
+    where, params = ["po.contract_id IS NULL"], []
     if department_id:
-        where_clause = "WHERE po.department_id = ?"
+        where.append("po.department_id = ?")
         params.append(department_id)
+    count = lambda: query_records(f"""
+        SELECT SUM(po_count) as n FROM po_by_dept_month_commodity
+        WHERE is_maverick = 1 {"AND department_id = ?" if department_id else ""}
+    """, params)[0]["n"]
+    return MAVERICK_PO_LIST.page(query_records, limit, cursor, sort, filters,
+                                 where=where, params=params, count=count)
 
-    # Maverick = PO without contract_id
-    by_dept = []
-    if not department_id:
-        by_dept = query_df("""
-            SELECT d.name as department,
-                   COUNT(*) as total_pos,
-                   SUM(CASE WHEN po.contract_id IS NULL THEN 1 ELSE 0 END) as maverick_pos,
-                   ROUND(SUM(CASE WHEN po.contract_id IS NULL THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as maverick_pct,
-                   SUM(CASE WHEN po.contract_id IS NULL THEN po.total_value ELSE 0 END) as maverick_value,
-                   SUM(po.total_value) as total_value
-            FROM purchase_orders po
-            JOIN departments d ON po.department_id = d.id
-            GROUP BY d.name ORDER BY maverick_pct DESC
-        """).to_dict('records')
-
-    # Monthly trend
-    monthly = query_df(f"""
-        SELECT substr(po_date,1,7) as month,
-               COUNT(*) as total_pos,
-               SUM(CASE WHEN contract_id IS NULL THEN 1 ELSE 0 END) as maverick_pos,
-               ROUND(SUM(CASE WHEN contract_id IS NULL THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as maverick_pct
-        FROM purchase_orders po {where_clause} GROUP BY month ORDER BY month
-    """, params).to_dict('records')
-
-    overall = query_df(f"""
-        SELECT 
-            ROUND(SUM(CASE WHEN contract_id IS NULL THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as pct,
-            SUM(CASE WHEN contract_id IS NULL THEN total_value ELSE 0 END) as val
-        FROM purchase_orders po {where_clause}
-    """, params).iloc[0]
-
-    # Category breakdown (Maverick only)
-    by_category = query_df(f"""
-        SELECT commodity_description as category, COUNT(*) as count, SUM(total_value) as value
-        FROM purchase_orders po
-        WHERE contract_id IS NULL {"AND department_id = ?" if department_id else ""}
-        GROUP BY category ORDER BY value DESC LIMIT 10
-    """, params).to_dict('records')
-
-    # Individual maverick POs with reason flags
-    pos_where = "WHERE po.contract_id IS NULL"
-    pos_params = []
-    if department_id:
-        pos_where += " AND po.department_id = ?"
-        pos_params.append(department_id)
-    maverick_pos = query_df(f"""
-        SELECT po.po_number, po.po_date, po.total_value,
-               s.supplier_name, d.name as department,
-               po.commodity_description as category,
-               CASE
-                   WHEN po.total_value > 500000 THEN 'Value exceeds threshold'
-                   ELSE 'No approved contract'
-               END as reason
-        FROM purchase_orders po
-        JOIN suppliers s ON po.supplier_id = s.id
-        JOIN departments d ON po.department_id = d.id
-        {pos_where} ORDER BY po.total_value DESC LIMIT 100
-    """, pos_params).to_dict('records')
-
-    return {
-        "overall_maverick_pct": float(overall['pct'] or 0),
-        "total_maverick_value": float(overall['val'] or 0),
-        "by_department": by_dept,
-        "monthly_trend": monthly,
-        "by_category": by_category,
-        "maverick_pos": maverick_pos
+@app.get("/api/maverick")
+@offload
+def maverick(department_id: Optional[int] = None, limit: Optional[int] = None,
+             cursor: Optional[str] = None, sort: Optional[str] = None,
+             filters: Optional[List[str]] = Query(None, alias="filter")):
+    """Maverick summary; maverick_pos is the top 100 unless a page of every off-contract PO is asked for."""
+    facts = analytics_facts("maverick", department_id)
+    payload = {
+        "overall_maverick_pct": facts["overall_maverick_pct"],
+        "total_maverick_value": facts["total_maverick_value"],
+        "by_department": facts["by_department"],
+        "monthly_trend": facts["monthly_trend"],
+        "by_category": facts["by_category"],
     }
+    if paginated(limit, cursor, sort, filters):
+        return page_response("maverick_pos", maverick_po_page(department_id, limit, cursor, sort, filters),
+                             **payload)
+    return {**payload, "maverick_pos": facts["maverick_pos"]}
 
 # ─── Suppliers ───────────────────────────────────────────────────────────────
-@app.get("/api/suppliers")
-def suppliers(department_id: Optional[int] = None):
+def supplier_facts_sql(department_id):
     # Base WHERE for transactions join
-    txn_where = "" 
+    txn_where = ""
     params = []
     if department_id:
         txn_where = "WHERE t.department_id = ?"
         params.append(department_id)
 
-    top_suppliers = query_df(f"""
+    top_suppliers = query_records(f"""
         SELECT s.id, s.supplier_name, s.bbbee_level, s.tax_compliant, s.province,
-               COUNT(t.id) as txn_count, SUM(t.amount) as total_spend,
-               COUNT(DISTINCT t.department_id) as dept_count
+               SUM(t.txn_count) as txn_count, SUM(t.total_amount) as total_spend,
+               COUNT(*) as dept_count
         FROM suppliers s
-        JOIN transactions t ON s.id = t.supplier_id
+        JOIN spend_by_dept_supplier t ON s.id = t.supplier_id
         {txn_where}
         GROUP BY s.id ORDER BY total_spend DESC LIMIT 50
-    """, params).to_dict('records')
-
-    # Distributions (global for now, complex to filter by txn on the fly efficiently for demo)
-    bbbee_dist = query_df("""
-        SELECT bbbee_level, COUNT(*) as count FROM suppliers GROUP BY bbbee_level ORDER BY bbbee_level
-    """).to_dict('records')
+    """, params)
+    return {"top_suppliers": top_suppliers}
+
+FACTS_SQL = {
+    "overview": lambda department_id: fact_planner.overview_facts(query_df, department_id),
+    "maverick": lambda department_id: fact_planner.maverick_facts(query_df, department_id),
+    "supplier": supplier_facts_sql,
+}
+
+def paginated(limit, cursor, sort, filters):
+    """List endpoints keep their original payload unless a page is asked for."""
+    return any(v is not None for v in (limit, cursor, sort, filters))
+
+def page_response(key, page, **extra):
+    """{key: rows, **extra, next_cursor, total_count, total_count_exact}."""
+    return {key: page.pop("items"), **extra, **page}
+
+def top_supplier_list(department_id):
+    """Supplier spend ranking as a ListQuery; keyset over the grouped rollup rows."""
+    txn_where = "WHERE t.department_id = ?" if department_id else ""
+    return ListQuery(
+        select="ts.*",
+        source=f"""(
+            SELECT s.id, s.supplier_name, s.bbbee_level, s.tax_compliant, s.province,
+                   SUM(t.txn_count) as txn_count, SUM(t.total_amount) as total_spend,
+                   COUNT(*) as dept_count
+            FROM suppliers s
+            JOIN spend_by_dept_supplier t ON s.id = t.supplier_id
+            {txn_where}
+            GROUP BY s.id) ts""",
+        sorts={"total_spend": "ts.total_spend", "txn_count": "ts.txn_count",
+               "dept_count": "ts.dept_count", "supplier_name": "ts.supplier_name"},
+        default_sort="-total_spend",
+        filters={"supplier_name": ("ts.supplier_name", "text"), "province": ("ts.province", "text"),
+                 "bbbee_level": ("ts.bbbee_level", "number"), "tax_compliant": ("ts.tax_compliant", "number"),
+                 "total_spend": ("ts.total_spend", "number"), "txn_count": ("ts.txn_count", "number"),
+                 "dept_count": ("ts.dept_count", "number")},
+        tiebreak="ts.id",
+    )
+
+def top_supplier_page(department_id, limit, cursor, sort, filters):
+    """A keyset page of every supplier by spend."""
+    source_params = [department_id] if department_id else []
+    count = lambda: query_records(f"""
+        SELECT COUNT(DISTINCT supplier_id) as n FROM spend_by_dept_supplier
+        {"WHERE department_id = ?" if department_id else ""}
+    """, source_params)[0]["n"]
+    return top_supplier_list(department_id).page(query_records, limit, cursor, sort, filters,
+                                                 source_params=source_params, count=count)
 
-    tax_compliance = query_df("""
-        SELECT CASE WHEN tax_compliant=1 THEN 'Compliant' ELSE 'Non-Compliant' END as status,
-               COUNT(*) as count FROM suppliers GROUP BY tax_compliant
-    """).to_dict('records')
-
-    province_dist = query_df("""
-        SELECT province, COUNT(*) as count FROM suppliers GROUP BY province ORDER BY count DESC
-    """).to_dict('records')
+@app.get("/api/suppliers")
+async def suppliers(department_id: Optional[int] = None, limit: Optional[int] = None,
+                    cursor: Optional[str] = None, sort: Optional[str] = None,
+                    filters: Optional[List[str]] = Query(None, alias="filter")):
+    # Independent lookups, fanned out over the reader threads; the distributions
+    # cover the suppliers the department has paid (supplier_index.py).
+    # top_suppliers is the top 50 unless a page of every supplier is asked for.
+    if paginated(limit, cursor, sort, filters):
+        page, index = await asyncio.gather(
+            readers.run(top_supplier_page, department_id, limit, cursor, sort, filters),
+            readers.run(get_supplier_index, DB_PATH),
+        )
+        return page_response("top_suppliers", page, **index.distributions(department_id))
+
+    top_suppliers, index = await asyncio.gather(
+        readers.run(lambda: analytics_facts("supplier", department_id)["top_suppliers"]),
+        readers.run(get_supplier_index, DB_PATH),
+    )
 
     return {
         "top_suppliers": top_suppliers,
-        "bbbee_distribution": bbbee_dist,
-        "tax_compliance": tax_compliance,
-        "province_distribution": province_dist,
+        **index.distributions(department_id),
     }
 
 # ─── Contracts ───────────────────────────────────────────────────────────────
+UTILISATION_PCT = "ROUND(c.spend_to_date * 100.0 / c.contract_value, 1)"
+CONTRACT_LIST = ListQuery(
+    select=f"""c.id, c.contract_number, c.description, s.supplier_name,
+               d.name as department_name, c.contract_value, c.spend_to_date,
+               {UTILISATION_PCT} as utilisation_pct,
+               c.start_date, c.end_date, c.status""",
+    source="""contracts c
+              JOIN suppliers s ON c.supplier_id = s.id
+              JOIN departments d ON c.department_id = d.id""",
+    # a few hundred rows: keys may be computed, NULLs sort last like the full list
+    sorts={"utilisation_pct": f"IFNULL({UTILISATION_PCT}, -1)",
+           "contract_value": "IFNULL(c.contract_value, 0)", "spend_to_date": "IFNULL(c.spend_to_date, 0)",
+           "start_date": "IFNULL(c.start_date, '')", "end_date": "IFNULL(c.end_date, '')",
+           "contract_number": "c.contract_number"},
+    default_sort="-utilisation_pct",
+    filters={"contract_number": ("c.contract_number", "text"), "description": ("c.description", "text"),
+             "supplier_name": ("s.supplier_name", "text"), "department_name": ("d.name", "text"),
+             "status": ("c.status", "text"), "contract_value": ("c.contract_value", "number"),
+             "spend_to_date": ("c.spend_to_date", "number"), "utilisation_pct": (UTILISATION_PCT, "number"),
+             "start_date": ("c.start_date", "date"), "end_date": ("c.end_date", "date")},
+    tiebreak="c.id",
+)
+
 @app.get("/api/contracts")
-def contracts(department_id: Optional[int] = None, supplier_id: Optional[int] = None):
+@offload
+def contracts(department_id: Optional[int] = None, supplier_id: Optional[int] = None,
+              limit: Optional[int] = None, cursor: Optional[str] = None, sort: Optional[str] = None,
+              filters: Optional[List[str]] = Query(None, alias="filter")):
     where_parts = []
     params = []
     if department_id:
@@ -331,7 +503,22 @@ def contracts(department_id: Optional[int] = None, supplier_id: Optional[int] =
     
     where = "WHERE " + " AND ".join(where_parts) if where_parts else ""
 
-    all_contracts = query_df(f"""
+    util_buckets = query_rows(f"""
+        SELECT CASE
+            WHEN spend_to_date * 100.0 / contract_value > 100 THEN 'Over 100%'
+            WHEN spend_to_date * 100.0 / contract_value > 80 THEN '80-100%'
+            WHEN spend_to_date * 100.0 / contract_value > 50 THEN '50-80%'
+            ELSE 'Under 50%'
+        END as bucket, COUNT(*) as count
+        FROM contracts c {where} GROUP BY bucket
+    """, params)
+
+    if paginated(limit, cursor, sort, filters):
+        page = CONTRACT_LIST.page(query_records, limit, cursor, sort, filters,
+                                  where=where_parts, params=params)
+        return page_response("contracts", page, utilisation_buckets=util_buckets)
+
+    all_contracts = query_rows(f"""
         SELECT c.id, c.contract_number, c.description, s.supplier_name,
                d.name as department_name, c.contract_value, c.spend_to_date,
                ROUND(c.spend_to_date * 100.0 / c.contract_value, 1) as utilisation_pct,
@@ -341,27 +528,18 @@ def contracts(department_id: Optional[int] = None, supplier_id: Optional[int] =
         JOIN departments d ON c.department_id = d.id
         {where}
         ORDER BY utilisation_pct DESC
-    """, params).to_dict('records')
-
-    util_buckets = query_df(f"""
-        SELECT CASE
-            WHEN spend_to_date * 100.0 / contract_value > 100 THEN 'Over 100%'
-            WHEN spend_to_date * 100.0 / contract_value > 80 THEN '80-100%'
-            WHEN spend_to_date * 100.0 / contract_value > 50 THEN '50-80%'
-            ELSE 'Under 50%'
-        END as bucket, COUNT(*) as count
-        FROM contracts c {where} GROUP BY bucket
-    """, params).to_dict('records')
+    """, params)
 
     return {"contracts": all_contracts, "utilisation_buckets": util_buckets}
 
 @app.get("/api/contracts/expiring")
+@offload
 def expiring_contracts():
     # Return contracts expiring in next 90 days
     today = datetime.now().strftime("%Y-%m-%d")
     future = (datetime.now() + timedelta(days=90)).strftime("%Y-%m-%d")
 
-    expiring = query_df("""
+    expiring = query_rows("""
         SELECT c.id, c.contract_number, c.description, s.supplier_name,
                c.end_date, c.contract_value,
                ROUND(c.spend_to_date * 100.0 / c.contract_value, 1) as utilisation_pct
@@ -369,72 +547,104 @@ def expiring_contracts():
         JOIN suppliers s ON c.supplier_id = s.id
         WHERE c.end_date BETWEEN ? AND ? AND c.status = 'Active'
         ORDER BY c.end_date ASC
-    """, [today, future]).to_dict('records')
+    """, [today, future])
     return expiring
 
 # ─── Supplier Transactions (Drill-down) ─────────────────────────────────────
+SUPPLIER_TXN_LIST = ListQuery(
+    select="t.transaction_date, t.amount, d.name as department, t.scoa_description as category",
+    source="transactions t JOIN departments d ON t.department_id = d.id",
+    sorts={"transaction_date": "t.transaction_date", "amount": "t.amount"},
+    default_sort="-transaction_date",
+    filters={"transaction_date": ("t.transaction_date", "date"), "amount": ("t.amount", "number"),
+             "department": ("d.name", "text"), "category": ("t.scoa_description", "text"),
+             "document_number": ("t.document_number", "text")},
+    tiebreak="t.id",
+)
+
 @app.get("/api/suppliers/{supplier_id}/transactions")
-def supplier_transactions(supplier_id: int):
-    conn = get_db()
-    c = conn.cursor()
-    row = c.execute("SELECT supplier_name FROM suppliers WHERE id = ?", (supplier_id,)).fetchone()
-    conn.close()
+@offload
+def supplier_transactions(supplier_id: int, limit: Optional[int] = None, cursor: Optional[str] = None,
+                          sort: Optional[str] = None,
+                          filters: Optional[List[str]] = Query(None, alias="filter")):
+    with get_db() as conn:
+        row = conn.execute("SELECT supplier_name FROM suppliers WHERE id = ?", (supplier_id,)).fetchone()
     name = row['supplier_name'] if row else 'Unknown'
-    txns = query_df("""
+    if paginated(limit, cursor, sort, filters):
+        page = SUPPLIER_TXN_LIST.page(query_records, limit, cursor, sort, filters,
+                                      where=["t.supplier_id = ?"], params=[supplier_id])
+        return page_response("transactions", page, supplier_name=name)
+    txns = query_rows("""
         SELECT t.transaction_date, t.amount, d.name as department, t.scoa_description as category
         FROM transactions t JOIN departments d ON t.department_id = d.id
-        WHERE t.supplier_id = ? ORDER BY t.transaction_date DESC LIMIT 50
-    """, [supplier_id]).to_dict('records')
+        WHERE t.supplier_id = ? ORDER BY t.transaction_date DESC, t.id LIMIT 50
+    """, [supplier_id])
     return {"supplier_name": name, "transactions": txns}
 
 # ─── Search ──────────────────────────────────────────────────────────────────
 @app.get("/api/search")
-def search(q: str):
-    if not q or len(q) < 2: return []
-    q_wild = f"%{q}%"
-    
-    suppliers = query_df("SELECT id, supplier_name as label, 'Supplier' as type FROM suppliers WHERE supplier_name LIKE ? LIMIT 5", [q_wild]).to_dict('records')
-    contracts = query_df("SELECT id, contract_number as label, 'Contract' as type FROM contracts WHERE contract_number LIKE ? LIMIT 5", [q_wild]).to_dict('records')
-    
-    return suppliers + contracts
+@offload
+def search(q: str, limit: int = Query(5, ge=1, le=20)):
+    """Ranked suppliers, contracts, POs and transactions from the trigram index (search_index.py)."""
+    with get_db() as conn:
+        return search_index(conn, q, per_type=limit)
 
 # ─── Personnel ───────────────────────────────────────────────────────────────
 @app.get("/api/personnel")
+@offload
 def personnel():
-    by_dept = query_df("""
+    # Employees and positions are counted and grouped by their codes in the
+    # fact table (migration 3), decoded once per group rather than per row.
+    by_dept = query_rows("""
         SELECT d.name as department,
-               COUNT(DISTINCT p.employee_number) as employees,
+               COUNT(DISTINCT p.employee_id) as employees,
                SUM(p.basic_salary) as total_salary,
                SUM(p.overtime) as total_overtime,
                SUM(p.total_cost) as total_cost,
                AVG(p.total_cost) as avg_cost
-        FROM personnel_costs p
+        FROM personnel_cost_facts p
         JOIN departments d ON p.department_id = d.id
         GROUP BY d.name ORDER BY total_cost DESC
-    """).to_dict('records')
+    """)
 
-    monthly = query_df("""
-        SELECT substr(period_date,1,7) as month,
+    monthly = query_rows("""
+        SELECT month,
                SUM(basic_salary) as salary, SUM(overtime) as overtime,
                SUM(housing_allowance) as housing, SUM(transport_allowance) as transport,
                SUM(medical_aid) as medical, SUM(total_cost) as total
         FROM personnel_costs GROUP BY month ORDER BY month
-    """).to_dict('records')
+    """)
 
-    by_level = query_df("""
-        SELECT job_title, salary_level, COUNT(DISTINCT employee_number) as count,
-               AVG(basic_salary) as avg_salary, AVG(total_cost) as avg_total
-        FROM personnel_costs GROUP BY job_title, salary_level ORDER BY salary_level DESC
-    """).to_dict('records')
+    by_level = query_rows("""
+        SELECT ps.job_title, ps.salary_level, p.count, p.avg_salary, p.avg_total
+        FROM (SELECT position_id, COUNT(DISTINCT employee_id) as count,
+                     AVG(basic_salary) as avg_salary, AVG(total_cost) as avg_total
+              FROM personnel_cost_facts GROUP BY position_id) p
+        LEFT JOIN positions ps ON ps.id = p.position_id
+        ORDER BY ps.salary_level DESC, ps.job_title
+    """)
 
     return {"by_department": by_dept, "monthly_trend": monthly, "by_level": by_level}
 
 # ─── Anomaly Detection ──────────────────────────────────────────────────────
 @app.get("/api/anomalies")
-def anomalies():
-    txn_anomalies = detect_transaction_anomalies(top_n=50)
+@offload
+def anomalies(split_window_days: Optional[int] = None, split_low: Optional[float] = None,
+              split_high: Optional[float] = None, split_min_count: Optional[int] = None):
+    if split_window_days is not None and not 1 <= split_window_days <= 366:
+        raise HTTPException(status_code=400, detail="split_window_days must be between 1 and 366")
+    low = settings.SPLIT_LOW if split_low is None else split_low
+    high = settings.SPLIT_HIGH if split_high is None else split_high
+    min_count = settings.SPLIT_MIN_COUNT if split_min_count is None else split_min_count
+    if not (math.isfinite(low) and math.isfinite(high)):
+        raise HTTPException(status_code=400, detail="split_low and split_high must be finite numbers")
+    if not 0 <= low < high:
+        raise HTTPException(status_code=400, detail="split_low must be below split_high (and not negative)")
+    if min_count < 2:
+        raise HTTPException(status_code=400, detail="split_min_count must be at least 2")
+    txn_anomalies = cached_transaction_anomalies(top_n=50)
     contract_anomalies = detect_contract_anomalies()
-    invoice_anomalies = detect_invoice_anomalies()
+    invoice_anomalies = detect_invoice_anomalies(split_window_days, low, high, min_count)
     return {
         "supplier_anomalies": txn_anomalies,
         "contract_anomalies": contract_anomalies,
@@ -444,6 +654,102 @@ def anomalies():
         "total_invoice_flags": len(invoice_anomalies),
     }
 
+@app.get("/api/anomalies/model")
+@offload
+def anomaly_model_status():
+    """Age, data version and refit duration of the cached supplier anomaly model."""
+    return supplier_model_store.status()
+
+# Per-transaction scores are written by a background job (transaction_scores.py),
+# started by the first request for them; each run commits, which moves the
+# response cache's data version.
+scoring_job = transaction_scores.ScoringJob(DB_PATH)
+
+@app.get("/api/anomalies/transactions")
+@offload
+def transaction_anomalies(limit: int = 50, department_id: Optional[int] = None):
+    """Highest-scoring flagged transactions; empty until the first scoring run has finished."""
+    if not 1 <= limit <= settings.PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {settings.PAGE_MAX_LIMIT}")
+    scoring_job.start()
+    with get_db() as conn:
+        flagged = transaction_scores.top_flagged(conn, limit, department_id).to_dict('records')
+        total = transaction_scores.flagged_count(conn, department_id)
+        status = scoring_job.status(conn)
+    for row in flagged:
+        row['reasons'] = transaction_scores.reason_labels(int(row['reasons'])) or ['Unusual combination of features']
+    return {"transactions": flagged, "total_flagged": total,
+            "scored_rows": status["scored_rows"], "scored_at": status["scored_at"]}
+
+@app.get("/api/anomalies/transactions/status")
+@offload
+def transaction_scoring_status():
+    """Progress of the per-transaction scoring job."""
+    scoring_job.start()
+    with get_db() as conn:
+        return scoring_job.status(conn)
+
+# ─── Bulk ingest ────────────────────────────────────────────────────────────
+@app.post("/api/ingest/{table}")
+async def ingest(table: str, request: Request, format: Optional[str] = None,
+                 on_error: str = "abort", batch_size: Optional[int] = None):
+    """Stream an NDJSON (default) or CSV body into transactions/purchase_orders.
+
+    The body is consumed as it arrives and handed to a worker thread through a
+    bounded queue, so request size doesn't bound memory.
+    """
+    if table not in INGEST_TABLES:
+        raise HTTPException(status_code=404, detail=f"Ingest not supported for '{table}'")
+    if on_error not in ("abort", "skip") or format not in (None, "ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson|csv, on_error abort|skip")
+    fmt = detect_format(request.headers.get("content-type"), format)
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=16)
+
+    def body_chunks():
+        while (chunk := asyncio.run_coroutine_threadsafe(queue.get(), loop).result()) is not None:
+            if isinstance(chunk, BaseException):
+                raise chunk         # the body was cut off: drop the batch being read
+            yield chunk
+
+    job = loop.run_in_executor(None, lambda: ingest_stream(
+        table, body_chunks(), fmt, db_path=DB_PATH, batch_size=batch_size, on_error=on_error))
+
+    async def feed(item):
+        # Race the put against the worker so a failed/aborted job can't deadlock us
+        put = asyncio.ensure_future(queue.put(item))
+        await asyncio.wait({put, job}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+        return not job.done()
+
+    end = None
+    try:
+        async for chunk in request.stream():
+            if chunk and not await feed(chunk):
+                break
+    except ClientDisconnect as e:
+        end = e
+    finally:
+        await feed(end)             # always release the worker, even on a disconnect
+
+    try:
+        report = await job
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except sqlite3.OperationalError as e:   # e.g. the database stayed locked by another writer
+        raise HTTPException(status_code=503, detail=f"ingest failed: {e}", headers={"Retry-After": "5"})
+    except ClientDisconnect:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ingest failed: {e}")
+    if report.get("aborted"):
+        return JSONResponse(status_code=422, content=report)
+    return report
+
+bootstrap.import_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+print(f"[DEBUG] API imported in {bootstrap.import_seconds}s ({settings.STARTUP_MODE} bootstrap)")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
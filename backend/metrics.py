@@ -0,0 +1,259 @@
+"""Request and query instrumentation, exposed in Prometheus text format.
+
+MetricsMiddleware times every HTTP request by route template and keeps a
+per-request RequestTrace in a context variable; reader threads inherit it (see
+readers.py), so the queries an endpoint runs add to its request's SQL time.
+read_sql() replaces pd.read_sql for the API: it times execute+fetch per
+normalized statement, counts rows and times the DataFrame build separately;
+to_records() times the to_dict('records') conversion, TimedJSONResponse the
+JSON rendering. Statements slower than GPG_SLOW_QUERY_MS are logged with their
+EXPLAIN QUERY PLAN to a bounded in-memory list (and GPG_SLOW_QUERY_LOG, if set).
+"""
+import bisect
+import contextvars
+import json
+import re
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+import settings
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+# ─── Metric families ─────────────────────────────────────────────────────────
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Labelled Prometheus histogram (cumulative buckets, _sum, _count)."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name, self.help = name, help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {value}" for labels, value in values]
+        return lines
+
+
+REQUEST_SECONDS = Histogram("gpg_http_request_duration_seconds", "Wall time per request.",
+                            ["method", "endpoint", "status"])
+REQUEST_SQL_SECONDS = Histogram("gpg_http_request_sql_seconds", "SQL execute+fetch time per request.",
+                                ["endpoint"])
+JSON_RENDER_SECONDS = Histogram("gpg_json_render_seconds", "JSON serialization time per response.",
+                                ["endpoint"])
+QUERY_SECONDS = Histogram("gpg_sql_query_duration_seconds", "Execute+fetch time per SQL statement.",
+                          ["statement"])
+QUERY_ROWS = Histogram("gpg_sql_rows_returned", "Rows returned per SQL statement.", ["statement"],
+                       buckets=ROW_BUCKETS)
+FRAME_SECONDS = Histogram("gpg_dataframe_build_seconds", "DataFrame construction time per SQL statement.",
+                          ["statement"])
+RECORDS_SECONDS = Histogram("gpg_dataframe_to_records_seconds", "to_dict('records') time per SQL statement.",
+                            ["statement"])
+SLOW_QUERIES = Counter("gpg_sql_slow_queries_total", "Statements over the slow-query threshold.",
+                       ["statement"])
+FAMILIES = [REQUEST_SECONDS, REQUEST_SQL_SECONDS, JSON_RENDER_SECONDS, QUERY_SECONDS, QUERY_ROWS,
+            FRAME_SECONDS, RECORDS_SECONDS, SLOW_QUERIES]
+
+
+def render_metrics():
+    return "\n".join(line for family in FAMILIES for line in family.render()) + "\n"
+
+
+# ─── Per-request trace ───────────────────────────────────────────────────────
+class RequestTrace:
+    __slots__ = ("sql_seconds", "render_seconds")
+
+    def __init__(self):
+        self.sql_seconds = []       # list.append is safe across the reader threads
+        self.render_seconds = []
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _endpoint(scope):
+    """Route template of the request; responses served by the cache never
+    reach the router, so those are matched here."""
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        route = next((r for r in scope["app"].router.routes if r.matches(scope)[0] == Match.FULL), None)
+    return getattr(route, "path", "<unmatched>")
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing each HTTP request by route template."""
+
+    def __init__(self, app, prefix="/api/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        trace = RequestTrace()
+        token = current_trace.set(trace)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_trace.reset(token)
+            endpoint = _endpoint(scope)
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], endpoint, str(status[0]))
+            REQUEST_SQL_SECONDS.observe(sum(trace.sql_seconds), endpoint)
+            if trace.render_seconds:
+                JSON_RENDER_SECONDS.observe(sum(trace.render_seconds), endpoint)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse recording its render time on the current request trace;
+    subclasses change the serialization by overriding encode()."""
+
+    def render(self, content):
+        start = time.perf_counter()
+        body = self.encode(content)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.render_seconds.append(time.perf_counter() - start)
+        return body
+
+    def encode(self, content):
+        return super().render(content)
+
+
+# ─── Query tracing ───────────────────────────────────────────────────────────
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(sql, max_length=300):
+    """Statement text with literals replaced by ? and whitespace collapsed."""
+    text = _SPACE.sub(" ", _LITERALS.sub("?", sql)).strip()
+    return text if len(text) <= max_length else text[:max_length - 3] + "..."
+
+
+class SlowQueryLog:
+    """Most recent statements over the threshold, with their query plans."""
+
+    def __init__(self, threshold_ms=None, keep=None, path=None):
+        self.threshold_ms = threshold_ms if threshold_ms is not None else settings.SLOW_QUERY_MS
+        self.entries = deque(maxlen=keep or settings.SLOW_QUERY_KEEP)
+        self.path = path if path is not None else settings.SLOW_QUERY_LOG
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    def record(self, conn, sql, params, statement, seconds, rows):
+        try:
+            plan = [row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+        except Exception as e:
+            plan = [f"<plan unavailable: {e}>"]
+        entry = {"at": time.strftime("%Y-%m-%dT%H:%M:%S"), "ms": round(seconds * 1000, 2), "rows": rows,
+                 "statement": statement, "params": [str(p) for p in (params or ())], "plan": plan}
+        SLOW_QUERIES.inc(statement)
+        print(f"[SLOW] {entry['ms']} ms, {rows} rows: {statement[:120]} | plan: {' / '.join(plan)}")
+        with self._lock:
+            self.entries.append(entry)
+            if self.path:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+
+    def recent(self):
+        with self._lock:
+            return list(reversed(self.entries))
+
+
+slow_queries = SlowQueryLog()
+
+
+def read_sql(conn, sql, params=None):
+    """pd.read_sql(sql, conn, params) with execute/fetch, rows and DataFrame
+    build recorded per normalized statement."""
+    statement = normalize_sql(sql)
+    start = time.perf_counter()
+    cursor = conn.execute(sql, params or ())
+    rows = cursor.fetchall()
+    fetched = time.perf_counter()
+    columns = [d[0] for d in cursor.description] if cursor.description else []
+    frame = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    built = time.perf_counter()
+
+    QUERY_SECONDS.observe(fetched - start, statement)
+    QUERY_ROWS.observe(len(rows), statement)
+    FRAME_SECONDS.observe(built - fetched, statement)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.sql_seconds.append(fetched - start)
+    if slow_queries.enabled and (fetched - start) * 1000 >= slow_queries.threshold_ms:
+        slow_queries.record(conn, sql, params, statement, fetched - start, len(rows))
+    return frame
+
+
+def to_records(frame, sql):
+    """frame.to_dict('records'), timed under sql's normalized statement."""
+    start = time.perf_counter()
+    records = frame.to_dict('records')
+    RECORDS_SECONDS.observe(time.perf_counter() - start, normalize_sql(sql))
+    return records
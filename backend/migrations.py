@@ -0,0 +1,464 @@
+"""Versioned schema migrations for an existing database, plus an index advisor.
+
+    python backend/migrations.py status|upgrade [--to N] [--db path]
+    python backend/migrations.py advise [--db path] [--min-rows 10000] [--json]
+
+`PRAGMA user_version` records the last migration applied; `upgrade` applies
+the ones after it in order, each in its own transaction together with the
+version bump, so an interrupted upgrade resumes at the failed step. The API
+upgrades its database at startup (ensure_migrations).
+
+Month and fiscal columns are VIRTUAL generated columns: ALTER TABLE cannot
+add STORED ones to an existing table. The value lives in the indexes that
+cover them, which is what lets GROUP BY month and month ranges read an index
+in order instead of evaluating substr() over every row.
+
+Migration 3 dictionary-encodes the fact tables into a star schema (see the
+section below); existing SQL keeps reading and writing them by their old names.
+Migration 4 counts in-place UPDATEs per source table, which the id-watermark
+refreshes of the derived tables cannot see otherwise.
+Migrations that free a lot of pages are followed by a VACUUM.
+
+`advise` runs every GET endpoint in-process, records the statements it sends
+to SQLite, and reports the EXPLAIN QUERY PLAN steps that scan a large table
+(with that statement's temporary B-tree sorts), plus indexes made redundant
+by a wider one with the same leading columns.
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import sqlite3
+import sys
+from pathlib import Path
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+
+FISCAL_YEAR = ("CASE WHEN CAST(substr({col},6,2) AS INTEGER) >= 4 "
+               "THEN substr({col},1,4) || '/' || (CAST(substr({col},1,4) AS INTEGER) + 1) "
+               "ELSE (CAST(substr({col},1,4) AS INTEGER) - 1) || '/' || substr({col},1,4) END")
+FISCAL_PERIOD = "(CAST(substr({col},6,2) AS INTEGER) + 8) % 12 + 1"
+
+# (table, column, type, expression) generated by migration 1
+MONTH_COLUMNS = [
+    ("transactions", "month", "TEXT", "substr(transaction_date,1,7)"),
+    ("purchase_orders", "month", "TEXT", "substr(po_date,1,7)"),
+    ("purchase_orders", "fiscal_year", "TEXT", FISCAL_YEAR.format(col="po_date")),
+    ("purchase_orders", "fiscal_period", "INTEGER", FISCAL_PERIOD.format(col="po_date")),
+    ("personnel_costs", "month", "TEXT", "substr(period_date,1,7)"),
+]
+
+# name: definition, created by migration 2
+COMPOSITE_INDEXES = {
+    "idx_txn_dept_month_amount": "transactions(department_id, month, amount)",
+    "idx_txn_supplier_date": "transactions(supplier_id, transaction_date)",
+    "idx_po_dept_month_value": "purchase_orders(department_id, month, total_value)",
+    "idx_pers_month_cost": "personnel_costs(month, basic_salary, overtime, housing_allowance, "
+                           "transport_allowance, medical_aid, total_cost)",
+}
+
+
+def _columns(conn, table):
+    return {r[1] for r in conn.execute(f"PRAGMA table_xinfo({table})")}
+
+
+def add_month_columns(conn):
+    for table, column, type_, expr in MONTH_COLUMNS:
+        if column not in _columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {type_} GENERATED ALWAYS AS ({expr}) VIRTUAL")
+
+
+def add_composite_indexes(conn):
+    for name, definition in COMPOSITE_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {definition}")
+    conn.execute("PRAGMA analysis_limit = 1000")
+    for table in sorted({d.split("(")[0] for d in COMPOSITE_INDEXES.values()}):
+        conn.execute(f"ANALYZE {table}")
+
+
+# ─── Star schema (migration 3) ───────────────────────────────────────────────
+# Each fact table moves to <name>_facts with its repeated text replaced by
+# integer codes into small dimension tables; a view under the old name decodes
+# them and INSTEAD OF triggers route writes through it. The view decodes with
+# scalar subqueries rather than joins: SQLite only evaluates the ones a query
+# reads, where it keeps an unused LEFT JOIN in aggregate queries.
+
+# dimension: natural key columns
+DIMENSIONS = {
+    "document_types": {"document_type": "TEXT"},
+    "scoa_items": {"scoa_code": "TEXT", "scoa_description": "TEXT"},
+    "transaction_descriptions": {"description": "TEXT"},
+    "commodities": {"commodity_code": "TEXT", "commodity_description": "TEXT"},
+    "employees": {"employee_number": "TEXT"},
+    "positions": {"job_title": "TEXT", "salary_level": "INTEGER"},
+}
+
+# view: (fact table, its columns, {code column: dimension})
+STAR_TABLES = {
+    "transactions": ("transaction_facts", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT, transaction_date TEXT, posting_lag INTEGER,
+        document_type_id INTEGER, document_number TEXT, department_id INTEGER, supplier_id INTEGER,
+        scoa_id INTEGER, amount REAL, description_id INTEGER,
+        month TEXT GENERATED ALWAYS AS (substr(transaction_date,1,7)) VIRTUAL,
+        fiscal_year TEXT GENERATED ALWAYS AS ({FISCAL_YEAR.format(col="transaction_date")}) VIRTUAL,
+        fiscal_period INTEGER GENERATED ALWAYS AS ({FISCAL_PERIOD.format(col="transaction_date")}) VIRTUAL""",
+        {"document_type_id": "document_types", "scoa_id": "scoa_items",
+         "description_id": "transaction_descriptions"}),
+    "purchase_orders": ("purchase_order_facts", f"""
+        id INTEGER PRIMARY KEY AUTOINCREMENT, po_number TEXT NOT NULL, po_date TEXT,
+        department_id INTEGER, supplier_id INTEGER, commodity_id INTEGER, quantity INTEGER,
+        unit_price REAL, total_value REAL, contract_id INTEGER, delivery_date TEXT,
+        status TEXT DEFAULT 'Completed',
+        month TEXT GENERATED ALWAYS AS (substr(po_date,1,7)) VIRTUAL,
+        fiscal_year TEXT GENERATED ALWAYS AS ({FISCAL_YEAR.format(col="po_date")}) VIRTUAL,
+        fiscal_period INTEGER GENERATED ALWAYS AS ({FISCAL_PERIOD.format(col="po_date")}) VIRTUAL""",
+        {"commodity_id": "commodities"}),
+    "personnel_costs": ("personnel_cost_facts", """
+        id INTEGER PRIMARY KEY AUTOINCREMENT, period_date TEXT, department_id INTEGER,
+        employee_id INTEGER, position_id INTEGER, basic_salary REAL, overtime REAL, housing_allowance REAL,
+        transport_allowance REAL, medical_aid REAL, total_cost REAL,
+        month TEXT GENERATED ALWAYS AS (substr(period_date,1,7)) VIRTUAL""",
+        {"employee_id": "employees", "position_id": "positions"}),
+}
+FACT_TABLES = {view: fact for view, (fact, _, _) in STAR_TABLES.items()}
+
+# posting_date is transaction_date in practice, so it is stored as a day offset
+STORED_AS = {"posting_lag": "CAST(julianday({row}.posting_date) - julianday({row}.transaction_date) AS INTEGER)"}
+VIEW_AS = {"posting_date": "date({fact}.transaction_date, {fact}.posting_lag || ' days')"}
+INDEX_TABLE = re.compile(r"\bON\s+\"?(\w+)\"?\s*\(")
+
+
+def _any_key(dimension, row):
+    return " OR ".join(f"{row}.{k} IS NOT NULL" for k in DIMENSIONS[dimension])
+
+
+def _code(dimension, row):
+    """Id of row's natural key in dimension (IS: NULL parts match NULL parts)."""
+    where = " AND ".join(f"{k} IS {row}.{k}" for k in DIMENSIONS[dimension])
+    return f"(SELECT id FROM {dimension} WHERE {where})"
+
+
+def _stored_values(conn, view, row):
+    """Stored fact column -> its value for a view-shaped row (a table alias, NEW)."""
+    fact, _, codes = STAR_TABLES[view]
+    columns = [r[1] for r in conn.execute(f"PRAGMA table_xinfo({fact})") if r[6] == 0]
+    return {c: _code(codes[c], row) if c in codes else STORED_AS[c].format(row=row) if c in STORED_AS
+            else f"{row}.{c}" for c in columns}
+
+
+def _add_keys(view):
+    """Trigger statements adding NEW's dimension keys that are not coded yet."""
+    return [f"INSERT INTO {dimension} ({', '.join(DIMENSIONS[dimension])}) "
+            f"SELECT {', '.join(f'NEW.{k}' for k in DIMENSIONS[dimension])} "
+            f"WHERE ({_any_key(dimension, 'NEW')}) AND {_code(dimension, 'NEW')} IS NULL"
+            for dimension in STAR_TABLES[view][2].values()]
+
+
+def _view_sql(view, columns):
+    """The compatibility view, with the replaced table's columns in their order."""
+    fact, _, codes = STAR_TABLES[view]
+    owner = {k: (column, dimension) for column, dimension in codes.items() for k in DIMENSIONS[dimension]}
+    select = [f"(SELECT {c} FROM {owner[c][1]} WHERE id = {fact}.{owner[c][0]}) AS {c}" if c in owner
+              else f"{VIEW_AS[c].format(fact=fact)} AS {c}" if c in VIEW_AS else f"{fact}.{c}"
+              for c in columns]
+    # unaliased, so query plans name the fact table
+    return f"CREATE VIEW {view} AS SELECT {', '.join(select)} FROM {fact}"
+
+
+def _triggers(conn, view):
+    fact = FACT_TABLES[view]
+    new = _stored_values(conn, view, "NEW")
+    insert = _add_keys(view) + [f"INSERT INTO {fact} ({', '.join(new)}) VALUES ({', '.join(new.values())})"]
+    update = _add_keys(view) + [
+        f"UPDATE {fact} SET {', '.join(f'{c} = {v}' for c, v in new.items())} WHERE id = OLD.id"]
+    return [f"CREATE TRIGGER {view}_insert INSTEAD OF INSERT ON {view} BEGIN {'; '.join(insert)}; END",
+            f"CREATE TRIGGER {view}_update INSTEAD OF UPDATE ON {view} BEGIN {'; '.join(update)}; END",
+            f"CREATE TRIGGER {view}_delete INSTEAD OF DELETE ON {view} BEGIN "
+            f"DELETE FROM {fact} WHERE id = OLD.id; END"]
+
+
+def to_star_schema(conn):
+    for dimension, keys in DIMENSIONS.items():
+        conn.execute(f"CREATE TABLE {dimension} (id INTEGER PRIMARY KEY, "
+                     f"{', '.join(f'{k} {t}' for k, t in keys.items())})")
+        conn.execute(f"CREATE UNIQUE INDEX idx_{dimension}_key ON {dimension}({', '.join(keys)})")
+    for view, (fact, definition, codes) in STAR_TABLES.items():
+        columns = [r[1] for r in conn.execute(f"PRAGMA table_xinfo({view})")]
+        indexes = [sql for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (view,))]
+        sequence = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (view,)).fetchone()
+        for dimension in codes.values():
+            keys = ", ".join(DIMENSIONS[dimension])
+            conn.execute(f"INSERT INTO {dimension} ({keys}) SELECT DISTINCT {keys} FROM {view} o "
+                         f"WHERE {_any_key(dimension, 'o')} ORDER BY {keys}")
+        conn.execute(f"CREATE TABLE {fact} ({definition})")
+        stored = _stored_values(conn, view, "o")
+        conn.execute(f"INSERT INTO {fact} ({', '.join(stored)}) SELECT {', '.join(stored.values())} "
+                     f"FROM {view} o ORDER BY o.id")
+        if sequence:
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (sequence[0], fact))
+        conn.execute(f"DROP TABLE {view}")
+        conn.execute(_view_sql(view, columns))
+        for statement in _triggers(conn, view):
+            conn.execute(statement)
+        for sql in indexes:
+            try:
+                conn.execute(INDEX_TABLE.sub(f"ON {fact}(", sql, count=1))
+            except sqlite3.OperationalError as e:       # on a column that moved to a dimension
+                print(f"[DEBUG] Index not carried over to {fact}: {sql} ({e})")
+    conn.execute("PRAGMA analysis_limit = 1000")
+    for table in list(FACT_TABLES.values()) + list(DIMENSIONS):
+        conn.execute(f"ANALYZE {table}")
+
+
+# ─── Update counters (migration 4) ───────────────────────────────────────────
+# Rollups, the feature store, the invoice and search indexes and the
+# transaction scores are refreshed by id watermark: (row count, max id) moves
+# on appends and deletes, not on an UPDATE in place. An AFTER UPDATE trigger
+# counts those per source, and each derived state row records the count it was
+# built at, so a refresh that finds the count moved rebuilds.
+COUNTED_SOURCES = ("transactions", "purchase_orders", "personnel_costs", "suppliers", "contracts")
+DERIVED_STATE_TABLES = ("rollup_state", "feature_store_state", "invoice_index_state",
+                        "search_index_state", "transaction_scores_state")
+
+
+def add_update_counters(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS table_updates (source TEXT PRIMARY KEY, updates INTEGER NOT NULL)")
+    for source in COUNTED_SOURCES:
+        conn.execute("INSERT OR IGNORE INTO table_updates VALUES (?, 0)", (source,))
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS {source}_counted AFTER UPDATE ON {FACT_TABLES.get(source, source)} "
+                     f"BEGIN UPDATE table_updates SET updates = updates + 1 WHERE source = '{source}'; END")
+    for table in DERIVED_STATE_TABLES:         # built before this migration: at count 0
+        columns = _columns(conn, table)
+        if columns and "updates" not in columns:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN updates INTEGER NOT NULL DEFAULT 0")
+
+
+def update_count(conn, source):
+    """In-place UPDATEs of source counted so far; 0 before migration 4."""
+    try:
+        row = conn.execute("SELECT updates FROM table_updates WHERE source = ?", (source,)).fetchone()
+    except sqlite3.OperationalError:            # no table_updates yet
+        return 0
+    return row[0] if row else 0
+
+
+# (version, description, apply(conn)); append only, never renumber
+MIGRATIONS = [
+    (1, "generated month and fiscal columns", add_month_columns),
+    (2, "composite month and supplier indexes", add_composite_indexes),
+    (3, "dictionary-encoded star schema behind compatibility views", to_star_schema),
+    (4, "in-place update counters per source table", add_update_counters),
+]
+LATEST = MIGRATIONS[-1][0]
+# migrations that leave enough free pages to be worth a VACUUM afterwards
+VACUUM_AFTER = {3}
+LOCK_TIMEOUT = 600          # seconds ensure_migrations waits for another process's migration
+
+
+# ─── Apply ───────────────────────────────────────────────────────────────────
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def upgrade(conn, target=LATEST):
+    """Apply the migrations after the current version up to target; returns
+    the versions applied.
+
+    Each migration takes the write lock first and re-reads user_version inside
+    its transaction, so of several processes upgrading the same file at once
+    one applies it and the others wait, then skip it.
+    """
+    applied = []
+    for version, description, apply in MIGRATIONS:
+        if version <= current_version(conn) or version > target:
+            continue                            # already applied: no need for the lock
+        conn.isolation_level = None
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if version <= current_version(conn):
+                conn.execute("ROLLBACK")        # applied by another process while we waited
+                continue
+            apply(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.isolation_level = ""
+        print(f"[DEBUG] Migration {version} applied: {description}")
+        applied.append(version)
+    if VACUUM_AFTER.intersection(applied):
+        conn.execute("VACUUM")
+        print("[DEBUG] Database vacuumed")
+    return applied
+
+
+def ensure_migrations(db_path=DB_PATH):
+    """Upgrade db_path to the latest version (opens its own read-write connection)."""
+    try:
+        # another worker may hold the write lock for a whole migration
+        conn = sqlite3.connect(str(db_path), timeout=LOCK_TIMEOUT)
+        applied = upgrade(conn)
+        conn.close()
+        print(f"[DEBUG] Schema: {'upgraded to ' + str(LATEST) if applied else 'version ' + str(LATEST)}")
+    except Exception as e:
+        print(f"[DEBUG] Schema migration failed: {e}")
+
+
+# ─── Index advisor ───────────────────────────────────────────────────────────
+ADVISE_SKIP = ("/api/metrics", "/api/profiles", "/api/cache", "/api/health", "/api/debug-db")
+PLAN_SCAN = re.compile(r"^SCAN (\w+)( USING (?:COVERING )?INDEX \w+)?")
+TABLE_REF = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?", re.IGNORECASE)
+SQL_WORDS = {"WHERE", "JOIN", "LEFT", "INNER", "CROSS", "ON", "GROUP", "ORDER", "LIMIT", "USING", "UNION",
+             "NATURAL", "INDEXED", "NOT"}
+
+
+def endpoint_requests(app, conn):
+    """GET URLs covering each API route: as is, per department, and paged."""
+    sample = {
+        "department_id": conn.execute("SELECT MIN(id) FROM departments").fetchone()[0],
+        "supplier_id": conn.execute("SELECT supplier_id FROM transactions WHERE supplier_id IS NOT NULL "
+                                    "LIMIT 1").fetchone()[0],
+        "q": "Theron",
+    }
+    for route in app.routes:
+        if "GET" not in getattr(route, "methods", ()) or not route.path.startswith("/api/") \
+                or route.path.startswith(ADVISE_SKIP):
+            continue
+        if any(p.name not in sample for p in route.dependant.path_params):
+            continue
+        path = route.path.format(**sample)
+        query = {p.name for p in route.dependant.query_params}
+        base = [f"q={sample['q']}"] if "q" in query else []
+        variants = [base]
+        if "department_id" in query:
+            variants.append(base + [f"department_id={sample['department_id']}"])
+        if "limit" in query:
+            variants += [v + ["limit=50"] for v in list(variants)]
+        for params in variants:
+            yield route.path, path + ("?" + "&".join(params) if params else "")
+
+
+def _aliases(sql):
+    """alias -> table for the FROM/JOIN clauses of sql (plans name aliases)."""
+    aliases = {}
+    for table, alias in TABLE_REF.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_WORDS:
+            aliases[alias] = table
+    return aliases
+
+
+def plan_findings(conn, sql, table_rows, min_rows):
+    """Scans of tables with at least min_rows rows, with the temp B-tree sorts
+    of the same statement; nothing for statements that only scan small tables."""
+    scans, sorts, aliases = [], [], _aliases(sql)
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[-1]
+        scan = PLAN_SCAN.match(detail)
+        if scan and "VIRTUAL TABLE" not in detail:
+            rows = table_rows.get(aliases.get(scan.group(1), scan.group(1)), 0)
+            if rows >= min_rows:
+                scans.append(f"{'index scan' if scan.group(2) else 'full scan'}: {detail} ({rows:,} rows)")
+        elif detail.startswith("USE TEMP B-TREE"):
+            sorts.append(f"sort: {detail}")
+    return scans + sorts if scans else []
+
+
+def redundant_indexes(conn):
+    """(index, wider index) pairs where the first's columns lead the second's."""
+    columns = {}
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' "
+                                    "AND sql IS NOT NULL AND sql NOT LIKE '% WHERE %'"):
+        columns[name] = (table, [r[2] for r in conn.execute(f"PRAGMA index_info({name})")])
+    pairs = []
+    for name, (table, cols) in sorted(columns.items()):
+        if None in cols:
+            continue                    # expression index
+        wider = [other for other, (t, c) in sorted(columns.items())
+                 if other != name and t == table and len(c) > len(cols) and c[:len(cols)] == cols]
+        if wider:
+            pairs.append((name, wider[0]))
+    return pairs
+
+
+def advise(db_path, min_rows=10_000):
+    os.environ.update(GPG_DB_PATH=str(Path(db_path).resolve()), GPG_RESPONSE_CACHE="0")
+    sys.path[:0] = [str(Path(__file__).resolve().parent), str(Path(__file__).resolve().parent.parent)]
+    import main
+    from db_pool import get_pool
+    from fastapi.testclient import TestClient
+    import metrics
+
+    statements = []
+    pool = get_pool(main.DB_PATH)
+    pool.close()                        # reopened connections pick up the trace callback
+    pool.trace_callback = statements.append
+
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    table_rows = {name: conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                  for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    seen, report = set(), []
+    with TestClient(main.app) as client:
+        main.bootstrap.wait()
+        for endpoint, url in endpoint_requests(main.app, conn):
+            del statements[:]
+            status = client.get(url).status_code
+            for sql in list(statements):
+                if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+                    continue
+                key = (endpoint, metrics.normalize_sql(sql))
+                if key in seen:
+                    continue
+                seen.add(key)
+                findings = plan_findings(conn, sql, table_rows, min_rows)
+                if findings:
+                    report.append({"endpoint": endpoint, "url": url, "status": status,
+                                   "statement": key[1], "findings": findings})
+    redundant = redundant_indexes(conn)
+    conn.close()
+    return {"queries": len(seen), "findings": report,
+            "redundant_indexes": [{"index": a, "covered_by": b} for a, b in redundant]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Schema migrations and index advice.")
+    parser.add_argument("command", choices=["status", "upgrade", "advise"])
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database path")
+    parser.add_argument("--to", type=int, default=LATEST, help="upgrade: target version")
+    parser.add_argument("--min-rows", type=int, default=10_000, help="advise: smallest table worth reporting")
+    parser.add_argument("--json", action="store_true", help="advise: machine-readable output")
+    args = parser.parse_args(argv)
+
+    if args.command == "advise":
+        with contextlib.redirect_stdout(sys.stderr):     # keep the API's logging out of the report
+            result = advise(args.db, args.min_rows)
+        if args.json:
+            print(json.dumps(result, indent=1))
+            return 0
+        for item in result["findings"]:
+            print(f"{item['endpoint']}  ({item['url']})\n  {item['statement'][:160]}")
+            for finding in item["findings"]:
+                print(f"    - {finding}")
+        for item in result["redundant_indexes"]:
+            print(f"redundant index: {item['index']} (leading columns of {item['covered_by']})")
+        print(f"{result['queries']} distinct endpoint queries, {len(result['findings'])} with scans or sorts")
+        return 0
+
+    conn = sqlite3.connect(args.db)
+    if args.command == "upgrade":
+        applied = upgrade(conn, args.to)
+        print(f"Applied {', '.join(map(str, applied))}." if applied else "Nothing to apply.")
+    version = current_version(conn)
+    for number, description, _ in MIGRATIONS:
+        print(f"  {'x' if number <= version else ' '} {number}: {description}")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""Persisted, versioned cache of fitted anomaly models and their scored results.
+
+A fit is keyed by the data version of `transactions` (row count, max id and
+migration 4's in-place update count) and written to settings.MODEL_DIR with
+joblib. Requests are served from the newest stored fit; a daemon thread polls
+the data version and refits only when it moves.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+import settings
+from db_pool import get_pool
+from migrations import update_count
+
+
+def data_version(db_path=None):
+    """Version marker of the transactions table: '<row count>-<max id>-<updates>'."""
+    with get_pool(db_path).connection() as conn:
+        count, max_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM transactions").fetchone()
+        updates = update_count(conn, "transactions")
+    return f"{count}-{max_id}-{updates}"
+
+
+class ModelStore:
+    """Holds the latest fit of `fit()` -> (scaler, model, anomalies) for one model name."""
+
+    def __init__(self, name, fit, db_path=None, directory=None,
+                 refit_interval=None, keep=None):
+        self.name = name
+        self.fit = fit
+        self.db_path = db_path
+        self.directory = Path(directory or settings.MODEL_DIR)
+        self.refit_interval = refit_interval or settings.MODEL_REFIT_INTERVAL
+        self.keep = keep or settings.MODEL_KEEP
+
+        self._entry = None
+        self._refit_lock = threading.Lock()
+        self._worker = None
+        self._stop = threading.Event()
+        self._refitting = False
+        self._last_error = None
+
+    # ─── Disk ────────────────────────────────────────────────────────────────
+    def _files(self):
+        return sorted(self.directory.glob(f"{self.name}-*.joblib"), key=lambda p: p.stat().st_mtime)
+
+    def _load_latest(self):
+        import joblib                   # deferred with scikit-learn, see anomaly_detection.py
+        for path in reversed(self._files()):
+            try:
+                return joblib.load(path)
+            except Exception as e:
+                print(f"[DEBUG] Skipping unreadable model {path.name}: {e}")
+        return None
+
+    def _save(self, entry):
+        import joblib
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.name}-{entry['version']}.joblib"
+        tmp = path.with_suffix(".tmp")
+        joblib.dump(entry, tmp)
+        os.replace(tmp, path)
+        for old in self._files()[:-self.keep]:
+            old.unlink(missing_ok=True)
+
+    # ─── Fitting ─────────────────────────────────────────────────────────────
+    def refit(self, version=None, force=False):
+        """Fit and persist for the current data version unless already stored."""
+        with self._refit_lock:
+            version = version or data_version(self.db_path)
+            if not force and self._entry and self._entry["version"] == version:
+                return self._entry
+            self._refitting = True
+            try:
+                start = time.perf_counter()
+                scaler, model, anomalies = self.fit()
+                entry = {
+                    "version": version,
+                    "fitted_at": time.time(),
+                    "refit_seconds": round(time.perf_counter() - start, 3),
+                    "scaler": scaler,
+                    "model": model,
+                    "anomalies": anomalies,
+                }
+                self._save(entry)
+                self._entry = entry
+                self._last_error = None
+                print(f"[DEBUG] Refit {self.name} for data version {version} in {entry['refit_seconds']}s")
+                return entry
+            finally:
+                self._refitting = False
+
+    def get(self):
+        """Latest fit, loading from disk (or fitting once) on first use."""
+        if self._entry is None:
+            with self._refit_lock:
+                if self._entry is None:
+                    self._entry = self._load_latest()
+            if self._entry is None:
+                self.refit()
+        self.start_worker()
+        return self._entry
+
+    @property
+    def version(self):
+        """Data version of the fit being served (None before the first fit)."""
+        entry = self._entry
+        return entry["version"] if entry else None
+
+    # ─── Background worker ───────────────────────────────────────────────────
+    def _run(self):
+        while True:
+            try:
+                version = data_version(self.db_path)
+                if self._entry is None or self._entry["version"] != version:
+                    self.refit(version)
+            except Exception as e:
+                self._last_error = str(e)
+                print(f"[DEBUG] Background refit of {self.name} failed: {e}")
+            if self._stop.wait(self.refit_interval):
+                return
+
+    def start_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name=f"refit-{self.name}", daemon=True)
+            self._worker.start()
+
+    def stop_worker(self):
+        self._stop.set()
+
+    def status(self):
+        entry = self._entry
+        current = data_version(self.db_path)
+        return {
+            "model": self.name,
+            "data_version": entry["version"] if entry else None,
+            "current_data_version": current,
+            "stale": entry is None or entry["version"] != current,
+            "fitted_at": entry["fitted_at"] if entry else None,
+            "age_seconds": round(time.time() - entry["fitted_at"], 1) if entry else None,
+            "refit_seconds": entry["refit_seconds"] if entry else None,
+            "refitting": self._refitting,
+            "last_error": self._last_error,
+        }
@@ -0,0 +1,212 @@
+"""Keyset pagination for the list endpoints.
+
+OFFSET makes page N read and throw away every row before it. Here a page
+resumes after the last row of the previous one, `(sort key, id) < (last key,
+last id)`, on an index that already holds the rows in (key, rowid) order, so
+page N costs the same as page 1. The cursor is an opaque base64 token carrying
+that position, the sort and total count it was issued for, and a hash of the
+scope (endpoint conditions such as department_id/supplier_id, plus the
+normalized filters): a cursor replayed against another scope is a 400.
+
+    ?limit=50&sort=-total_value&filter=category~steel&filter=total_value>=100000
+"""
+import base64
+import hashlib
+import json
+import re
+import sqlite3
+from datetime import date
+
+import settings
+
+# Indexes serving the keyset scans (rowid is the implicit last column of each),
+# on the fact tables behind the purchase_orders and transactions views.
+PAGINATION_INDEXES = {
+    "idx_po_maverick_value":
+        "purchase_order_facts(total_value) WHERE contract_id IS NULL",
+    "idx_po_maverick_dept_value":
+        "purchase_order_facts(department_id, total_value) WHERE contract_id IS NULL",
+    "idx_po_maverick_date":
+        "purchase_order_facts(po_date) WHERE contract_id IS NULL",
+    "idx_txn_supplier_date": "transaction_facts(supplier_id, transaction_date)",
+    "idx_txn_supplier_amount": "transaction_facts(supplier_id, amount)",
+}
+
+FILTER_RE = re.compile(r"^(\w+)(>=|<=|!=|=|>|<|~)(.*)$")
+OPERATORS = {"=": "=", "!=": "!=", ">=": ">=", "<=": "<=", ">": ">", "<": "<"}
+
+
+class PageRequestError(ValueError):
+    """Bad limit, sort, filter or cursor (a 400 for the client)."""
+
+
+def ensure_pagination_indexes(db_path):
+    """Create the keyset indexes in db_path (opens its own read-write connection)."""
+    try:
+        conn = sqlite3.connect(str(db_path))
+        existing = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        missing = [name for name in PAGINATION_INDEXES if name not in existing]
+        with conn:
+            for name in missing:
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {PAGINATION_INDEXES[name]}")
+            if missing:
+                # Without statistics the planner prefers idx_po_contract (contract_id = NULL)
+                # plus a sort over the partial indexes; a sampled ANALYZE is enough to fix that.
+                conn.execute("PRAGMA analysis_limit = 1000")
+                for table in sorted({PAGINATION_INDEXES[name].split("(")[0] for name in missing}):
+                    conn.execute(f"ANALYZE {table}")
+        conn.close()
+        print(f"[DEBUG] Pagination indexes: {'created ' + ', '.join(missing) if missing else 'up to date'}")
+    except Exception as e:
+        print(f"[DEBUG] Pagination index setup failed: {e}")
+
+
+# ─── Cursor tokens ───────────────────────────────────────────────────────────
+def encode_cursor(state):
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        keys = state.get("k") if isinstance(state, dict) else None
+        if (not isinstance(keys, list) or len(keys) != 2
+                or not all(k is None or isinstance(k, (str, int, float)) for k in keys)):
+            raise ValueError
+        return state
+    except ValueError:
+        raise PageRequestError("invalid cursor")
+
+
+def _plain(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def scope_hash(conditions, params):
+    """Short digest of the WHERE conditions and bound values a page list is drawn from."""
+    raw = json.dumps([list(conditions), [_plain(p) for p in params]], separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+# ─── List queries ────────────────────────────────────────────────────────────
+class ListQuery:
+    """One paginated list: `select` columns over a `source` FROM clause.
+
+    sorts maps sort names to non-NULL SQL expressions, ideally the leading
+    indexed column after any equality filters; `tiebreak` is the unique row id
+    ordered along with them. filters maps filter fields to (expression, kind),
+    kind being "text" (= != ~ and ranges), "number" or "date".
+    """
+
+    def __init__(self, select, source, sorts, default_sort, filters, tiebreak="id"):
+        self.select = select
+        self.source = source
+        self.sorts = sorts
+        self.default_sort = default_sort
+        self.filters = filters
+        self.tiebreak = tiebreak
+
+    def _sort(self, sort):
+        sort = sort or self.default_sort
+        name = sort.lstrip("-")
+        if name not in self.sorts:
+            raise PageRequestError(f"unknown sort '{name}', expected one of {', '.join(self.sorts)}")
+        return sort, self.sorts[name], sort.startswith("-")
+
+    def _filters(self, clauses):
+        where, params = [], []
+        for clause in clauses or ():
+            match = FILTER_RE.match(clause)
+            if not match or match.group(1) not in self.filters:
+                raise PageRequestError(f"invalid filter '{clause}', expected <field><op><value> "
+                                       f"with field one of {', '.join(self.filters)}")
+            field, op, value = match.groups()
+            expr, kind = self.filters[field]
+            if op == "~":
+                if kind != "text":
+                    raise PageRequestError(f"'~' only applies to text fields, not '{field}'")
+                where.append(f"{expr} LIKE ? ESCAPE '\\'")
+                params.append("%" + value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+                continue
+            if kind == "number":
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise PageRequestError(f"filter '{field}' expects a number, got '{value}'")
+            elif kind == "date":
+                try:
+                    value = date.fromisoformat(value).isoformat()
+                except ValueError:
+                    raise PageRequestError(f"filter '{field}' expects an ISO date (YYYY-MM-DD), got '{value}'")
+            where.append(f"{expr} {OPERATORS[op]} ?")
+            params.append(value)
+        return where, params
+
+    def page(self, query, limit=None, cursor=None, sort=None, filters=None,
+             where=(), params=(), source_params=(), count=None):
+        """One page of records plus next_cursor and total_count.
+
+        query runs (sql, params) and returns records; where/params are the
+        endpoint's own conditions, source_params bind placeholders inside
+        `source`. count() is a cheap total for the unfiltered list (e.g. from a
+        rollup); otherwise rows are counted up to settings.PAGE_COUNT_LIMIT and
+        total_count_exact is False beyond it. The total is computed for the
+        first page only and carried in the cursor.
+        """
+        limit = settings.PAGE_DEFAULT_LIMIT if limit is None else limit
+        if not 1 <= limit <= settings.PAGE_MAX_LIMIT:
+            raise PageRequestError(f"limit must be between 1 and {settings.PAGE_MAX_LIMIT}")
+        sort, key, desc = self._sort(sort)
+        clauses = sorted(filters or ())
+        filter_where, filter_params = self._filters(clauses)
+        conditions = list(where) + filter_where
+        bound = list(source_params) + list(params) + filter_params
+        scope = scope_hash(conditions, bound)
+
+        state = decode_cursor(cursor) if cursor else None
+        if state is not None and (state.get("s") != sort or state.get("h") != scope):
+            raise PageRequestError("cursor was issued for a different sort, scope or filter")
+
+        if state is None:
+            total, exact = self._count(query, conditions, bound, clauses, count)
+        else:
+            total, exact = state.get("n"), state.get("x", True)
+
+        page_conditions, page_params = list(conditions), list(bound)
+        if state is not None:
+            page_conditions.append(f"({key}, {self.tiebreak}) {'<' if desc else '>'} (?, ?)")
+            page_params += state["k"]
+        direction = "DESC" if desc else "ASC"
+        rows = query(f"""
+            SELECT {self.select}, {key} AS _page_key, {self.tiebreak} AS _page_id
+            FROM {self.source}
+            {self._where(page_conditions)}
+            ORDER BY {key} {direction}, {self.tiebreak} {direction}
+            LIMIT ?
+        """, page_params + [limit + 1])
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor({"s": sort, "h": scope, "n": total, "x": exact,
+                                         "k": [_plain(last["_page_key"]), _plain(last["_page_id"])]})
+        for row in rows:
+            del row["_page_key"], row["_page_id"]
+        return {"items": rows, "next_cursor": next_cursor,
+                "total_count": total, "total_count_exact": exact}
+
+    @staticmethod
+    def _where(conditions):
+        return "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    def _count(self, query, conditions, params, clauses, count):
+        if count is not None and not clauses:
+            return int(count() or 0), True
+        cap = settings.PAGE_COUNT_LIMIT
+        n = query(f"""
+            SELECT COUNT(*) AS n FROM (
+                SELECT 1 FROM {self.source} {self._where(conditions)} LIMIT ?)
+        """, params + [cap + 1])[0]["n"]
+        return (cap, False) if n > cap else (int(n), True)
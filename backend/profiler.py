@@ -0,0 +1,260 @@
+"""On-demand sampling profiler for individual API requests.
+
+A request is profiled when it carries the X-GPG-Profile header with the value
+of GPG_PROFILE_TOKEN (the header is ignored while no token is configured) or
+is picked at GPG_PROFILE_SAMPLE_RATE. Profiled requests skip the response cache, so the
+endpoint really runs. While the request is in flight a sampler thread reads
+the stacks of the threads working on it every GPG_PROFILE_INTERVAL_MS: the
+event loop thread (when not idle) and the reader threads running its calls
+(readers.run registers them via sampled()). Stacks are written in collapsed
+format ("thread;outer;...;leaf count", for flamegraph.pl or speedscope), with
+the largest allocation sites from tracemalloc, to a bounded ring of files in
+GPG_PROFILE_DIR. Sampled requests faster than GPG_PROFILE_MIN_MS are dropped.
+
+tracemalloc and the event loop are process-wide, so requests running
+concurrently with a profiled one can show up in its allocations and loop
+stacks; reader thread stacks are the profiled request's own.
+"""
+import asyncio
+import contextvars
+import functools
+import json
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+import settings
+
+HEADER = b"x-gpg-profile"
+PROFILE_ID = re.compile(r"^[0-9T]{15}-[0-9a-f]{6}$")
+IDLE_FILES = ("selectors.py", "base_events.py")     # the event loop waiting for I/O
+
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+
+# ─── Sampling ────────────────────────────────────────────────────────────────
+def _frame_label(code):
+    path = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class Profile:
+    """Stacks of the threads registered for one request, sampled until stop()."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._threads = {threading.get_ident(): "event-loop"}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def add_thread(self, ident, name):
+        with self._lock:
+            self._threads[ident] = name
+
+    def remove_thread(self, ident):
+        with self._lock:
+            self._threads.pop(ident, None)
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self._done.set()
+        self._sampler.join()
+
+    def _run(self):
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads.items())
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is None or frame.f_code.co_filename.endswith(IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def sampled(fn):
+    """Wrap fn so the thread running it is sampled for the current request's
+    profile, if there is one (readers.run wraps every call with this)."""
+    @functools.wraps(fn)
+    def call(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.add_thread(ident, re.sub(r"_\d+$", "", threading.current_thread().name))
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.remove_thread(ident)
+    return call
+
+
+# ─── Allocations ─────────────────────────────────────────────────────────────
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _start_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(settings.PROFILE_TRACE_FRAMES)
+        _tracing_users += 1
+        tracemalloc.reset_peak()
+
+
+def _stop_tracing(top):
+    """Largest allocation sites still alive plus the traced peak, then stop
+    tracing if no other profile needs it."""
+    global _tracing_users
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+    current, peak = tracemalloc.get_traced_memory()
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0:
+            tracemalloc.stop()
+    sites = [{"site": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+             for stat in snapshot.statistics("lineno")[:top]]
+    return {"traced_current_bytes": current, "traced_peak_bytes": peak, "top": sites}
+
+
+# ─── Storage ─────────────────────────────────────────────────────────────────
+class ProfileStore:
+    """The newest `keep` profiles, as <id>.json (metadata, allocations) and
+    <id>.folded (collapsed stacks) in directory."""
+
+    def __init__(self, directory=None, keep=None):
+        self.directory = Path(directory or settings.PROFILE_DIR)
+        self.keep = keep or settings.PROFILE_KEEP
+        self._lock = threading.Lock()
+
+    def save(self, meta, collapsed):
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / f"{meta['id']}.folded").write_text(collapsed)
+            (self.directory / f"{meta['id']}.json").write_text(json.dumps(meta, indent=1))
+            for old in sorted(self.directory.glob("*.json"))[:-self.keep]:
+                old.unlink(missing_ok=True)
+                old.with_suffix(".folded").unlink(missing_ok=True)
+
+    def path(self, profile_id, suffix):
+        if not PROFILE_ID.match(profile_id):
+            return None
+        path = self.directory / f"{profile_id}{suffix}"
+        return path if path.exists() else None
+
+    def get(self, profile_id):
+        path = self.path(profile_id, ".json")
+        return json.loads(path.read_text()) if path else None
+
+    def recent(self):
+        """Metadata of stored profiles, newest first (allocation sites omitted)."""
+        with self._lock:
+            paths = sorted(self.directory.glob("*.json"), reverse=True) if self.directory.exists() else []
+        listing = []
+        for path in paths:
+            try:
+                meta = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue                    # rotated out while listing
+            meta.pop("allocations", None)
+            listing.append(meta)
+        return listing
+
+
+store = ProfileStore()
+
+
+# ─── Middleware ──────────────────────────────────────────────────────────────
+def requested(scope, token=None, sample_rate=None):
+    """'header', 'sampled' or None: whether and why to profile this request."""
+    token = settings.PROFILE_TOKEN if token is None else token
+    sample_rate = settings.PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    value = dict(scope["headers"]).get(HEADER)
+    if value is not None and token and secrets.compare_digest(value, token.encode()):
+        return "header"
+    if sample_rate > 0 and random.random() < sample_rate:
+        return "sampled"
+    return None
+
+
+class ProfilerMiddleware:
+    """ASGI middleware profiling opted-in /api requests into `store`."""
+
+    def __init__(self, app, store=store, prefix="/api/", exclude=()):
+        self.app = app
+        self.store = store
+        self.prefix = prefix
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not scope["path"].startswith(self.prefix)
+                or scope["path"].startswith(self.exclude)):
+            return await self.app(scope, receive, send)
+        trigger = requested(scope)
+        if trigger is None:
+            return await self.app(scope, receive, send)
+
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{secrets.token_hex(3)}"
+        scope["cache_bypass"] = True
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message.setdefault("headers", []).append((b"x-gpg-profile-id", profile_id.encode()))
+            await send(message)
+
+        if settings.PROFILE_ALLOCATIONS:
+            _start_tracing()
+        profile = Profile(settings.PROFILE_INTERVAL_MS / 1000)
+        token = current_profile.set(profile)
+        profile.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            profile.stop()
+            current_profile.reset(token)
+            await asyncio.to_thread(self._finish, profile_id, trigger, scope, status[0], elapsed, profile)
+
+    def _finish(self, profile_id, trigger, scope, status, elapsed, profile):
+        allocations = _stop_tracing(settings.PROFILE_TOP_ALLOCATIONS) if settings.PROFILE_ALLOCATIONS else None
+        if trigger == "sampled" and elapsed * 1000 < settings.PROFILE_MIN_MS:
+            return
+        route = scope.get("route")
+        meta = {
+            "id": profile_id, "trigger": trigger, "method": scope["method"], "path": scope["path"],
+            "query": scope.get("query_string", b"").decode("latin-1"),
+            "endpoint": getattr(route, "path", "<unmatched>"), "status": status,
+            "duration_ms": round(elapsed * 1000, 2), "interval_ms": settings.PROFILE_INTERVAL_MS,
+            "samples": profile.samples, "stacks": len(profile.stacks), "allocations": allocations,
+        }
+        try:
+            self.store.save(meta, profile.collapsed())
+            print(f"[DEBUG] Profile {profile_id}: {meta['endpoint']} {meta['duration_ms']} ms, "
+                  f"{profile.samples} samples")
+        except OSError as e:
+            print(f"[DEBUG] Profile {profile_id} not saved: {e}")
@@ -0,0 +1,103 @@
+"""Bounded executor for the blocking SQLite/pandas work behind async endpoints.
+
+Endpoints are `async def` and hand their reads to a dedicated thread pool sized
+to the cores (capped by the connection pool, so a reader never waits on a
+connection). Admission control bounds the backlog: once `threads + queue_limit`
+calls are in flight, new ones fail fast with ReadersBusy (503 + Retry-After)
+instead of queueing invisibly in Starlette's shared threadpool.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import profiler
+import response_format
+import settings
+
+
+class ReadersBusy(Exception):
+    """The reader queue is full; the client should retry later."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"reader queue full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ReaderExecutor:
+    def __init__(self, threads=None, queue_limit=None, retry_after=None):
+        self.threads = threads or min(os.cpu_count() or 1, settings.DB_POOL_SIZE)
+        self.queue_limit = queue_limit if queue_limit is not None else settings.READER_QUEUE_LIMIT
+        self.retry_after = retry_after or settings.READER_RETRY_AFTER
+        self._pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="reader")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._stats = {"completed": 0, "failed": 0, "rejected": 0, "max_queued": 0,
+                       "wait_seconds": 0.0, "run_seconds": 0.0}
+
+    def _admit(self):
+        with self._lock:
+            if self._in_flight >= self.threads + self.queue_limit:
+                self._stats["rejected"] += 1
+                raise ReadersBusy(self.retry_after)
+            self._in_flight += 1
+            self._stats["max_queued"] = max(self._stats["max_queued"], self._in_flight - self._running)
+
+    def _call(self, fn, submitted):
+        started = time.perf_counter()
+        with self._lock:
+            self._running += 1
+            self._stats["wait_seconds"] += started - submitted
+        ok = False
+        try:
+            result = fn()
+            ok = True
+            return result
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._in_flight -= 1
+                self._stats["completed" if ok else "failed"] += 1
+                self._stats["run_seconds"] += time.perf_counter() - started
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on a reader thread, carrying over contextvars."""
+        self._admit()
+        call = functools.partial(contextvars.copy_context().run, profiler.sampled(fn), *args, **kwargs)
+        future = self._pool.submit(self._call, call, time.perf_counter())
+        try:
+            return await asyncio.wrap_future(future)
+        finally:
+            if future.cancelled():      # never started, so _call didn't release the slot
+                with self._lock:
+                    self._in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            done = self._stats["completed"] + self._stats["failed"]
+            return {
+                "threads": self.threads, "queue_limit": self.queue_limit,
+                "running": self._running, "queued": self._in_flight - self._running,
+                "completed": self._stats["completed"], "failed": self._stats["failed"],
+                "rejected": self._stats["rejected"], "max_queued": self._stats["max_queued"],
+                "avg_wait_ms": round(self._stats["wait_seconds"] / done * 1000, 2) if done else 0.0,
+                "avg_run_ms": round(self._stats["run_seconds"] / done * 1000, 2) if done else 0.0,
+            }
+
+
+readers = ReaderExecutor()
+
+
+def offload(fn):
+    """Turn a blocking endpoint function into an async one run on the readers
+    (columnar responses are encoded there too, see response_format.py)."""
+    call = response_format.rendered(fn)
+
+    @functools.wraps(fn)
+    async def endpoint(*args, **kwargs):
+        return await readers.run(call, *args, **kwargs)
+    return endpoint
@@ -0,0 +1,200 @@
+"""Conditional response cache for the read-only GET endpoints.
+
+Responses are cached per method + path + normalized query string and tagged
+with the data version they were computed under: a per-process boot id plus
+SQLite's `PRAGMA data_version`, read from one dedicated connection (the value
+moves whenever another connection commits, e.g. an ingest batch). Extra version
+sources (such as the anomaly model store's fitted version) can be added for
+payloads that change without a commit. A version change drops every entry.
+
+ETags are strong content hashes, so If-None-Match gets a 304 both on cache hits
+and when a recomputed payload turns out byte-identical.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qsl, urlencode
+
+import settings
+
+BOOT_ID = uuid.uuid4().hex[:12]
+
+
+class DataVersion:
+    """Cheap database change marker: '<boot id>-<PRAGMA data_version>[-<extra>...]'."""
+
+    def __init__(self, db_path, extra_sources=()):
+        self.db_path = Path(db_path).resolve()
+        self.extra_sources = list(extra_sources)
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def add_source(self, source):
+        self.extra_sources.append(source)
+
+    def _data_version(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"{self.db_path.as_uri()}?mode=ro", uri=True,
+                                         check_same_thread=False)
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def current(self):
+        with self._lock:
+            try:
+                parts = [BOOT_ID, str(self._data_version())]
+            except sqlite3.Error:
+                self._conn = None
+                parts = [BOOT_ID, f"t{time.monotonic_ns()}"]  # never matches: no caching
+        parts += [str(source()) for source in self.extra_sources]
+        return "-".join(parts)
+
+
+class ResponseCache:
+    """LRU of (etag, status, headers, body) bounded by entry count and total bytes."""
+
+    def __init__(self, max_entries=None, max_bytes=None):
+        self.max_entries = max_entries or settings.RESPONSE_CACHE_MAX_ENTRIES
+        self.max_bytes = max_bytes or settings.RESPONSE_CACHE_MAX_BYTES
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.evictions = 0
+
+    def _count(self, endpoint, outcome):
+        counts = self._stats.setdefault(endpoint, {"hits": 0, "misses": 0, "not_modified": 0})
+        counts[outcome] += 1
+
+    def get(self, key, version):
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, version, entry):
+        size = len(entry["body"])
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                return      # computed under a version that is already gone
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old["body"])
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted["body"])
+                self.evictions += 1
+
+    def record(self, endpoint, outcome):
+        with self._lock:
+            self._count(endpoint, outcome)
+
+    def stats(self):
+        """hits are 200s served from cache, not_modified 304s (cached or recomputed)."""
+        with self._lock:
+            return {"version": self._version, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_entries": self.max_entries, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions,
+                    "endpoints": {k: dict(v) for k, v in sorted(self._stats.items())}}
+
+
+def make_etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+class ResponseCacheMiddleware:
+    """ASGI middleware serving cached GET responses and 304s for the API."""
+
+    def __init__(self, app, version, cache=None, prefix="/api/", exclude=(), exclude_prefixes=()):
+        self.app = app
+        self.version = version
+        self.cache = cache or ResponseCache()
+        self.prefix = prefix
+        self.exclude = set(exclude)
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    def _key(self, scope):
+        query = urlencode(sorted(parse_qsl(scope.get("query_string", b"").decode("latin-1"),
+                                           keep_blank_values=True)))
+        return f"{scope['path']}?{query}"
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "GET"
+                or not scope["path"].startswith(self.prefix) or scope["path"] in self.exclude
+                or scope["path"].startswith(self.exclude_prefixes) or scope.get("cache_bypass")):
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        key = self._key(scope)
+        version = self.version.current()
+
+        entry = self.cache.get(key, version)
+        if entry is not None:
+            outcome = "not_modified" if etag_matches(if_none_match, entry["etag"]) else "hits"
+            self.cache.record(entry["endpoint"], outcome)
+            return await self._send(send, entry, outcome == "not_modified", b"HIT")
+
+        # Miss: run the endpoint, buffering the response to cache it
+        start, chunks = {}, []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                start.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+        body = b"".join(chunks)
+        route = scope.get("route")
+        entry = {
+            "endpoint": getattr(route, "path", "<unmatched>"),
+            "status": start.get("status", 500),
+            "headers": [(k, v) for k, v in start.get("headers", [])
+                        if k.lower() not in (b"content-length", b"etag", b"cache-control")],
+            "body": body,
+            "etag": make_etag(body),
+        }
+        cacheable = entry["status"] == 200
+        if cacheable:
+            self.cache.put(key, version, entry)
+        not_modified = cacheable and etag_matches(if_none_match, entry["etag"])
+        self.cache.record(entry["endpoint"], "not_modified" if not_modified else "misses")
+        await self._send(send, entry, not_modified, b"MISS", cacheable)
+
+    @staticmethod
+    async def _send(send, entry, not_modified, outcome, cacheable=True):
+        headers = list(entry["headers"])
+        if cacheable:
+            headers += [(b"etag", entry["etag"].encode()), (b"cache-control", b"no-cache")]
+        headers.append((b"x-cache", outcome))
+        if not_modified:
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-type"]
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(entry["body"])).encode()))
+        await send({"type": "http.response.start", "status": entry["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": entry["body"]})
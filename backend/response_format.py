@@ -0,0 +1,161 @@
+"""Opt-in columnar JSON responses.
+
+The default payloads are lists of records: every row repeats every key, and
+FastAPI's jsonable_encoder walks them object by object before json.dumps.
+A GET request can instead ask for
+
+    ?format=columnar   {"columns": ["month", "total"], "data": [["2024-04", 1.5], ...]}
+    ?format=arrays     {"month": ["2024-04", ...], "total": [1.5, ...]}
+
+(or send `Accept: application/vnd.gpg.columnar+json` / `...arrays+json`), in
+which case every list of records in the payload takes that shape. Result sets
+that go into the payload untouched are handed over as Tables, so their columns
+are serialized by orjson straight from the DataFrame's NumPy arrays; @offload
+endpoints also skip jsonable_encoder. Missing and NaN values are null. An empty
+list of records stays [] (it has no columns), and so does a list whose rows
+differ in keys (overview's monthly_trend with its forecast months).
+"""
+import contextvars
+from datetime import date, datetime
+from urllib.parse import parse_qsl, urlencode
+
+import numpy as np
+import orjson
+from starlette.responses import Response
+
+import metrics
+
+FORMATS = ("records", "columnar", "arrays")
+MEDIA_TYPES = {b"application/vnd.gpg.columnar+json": "columnar",
+               b"application/vnd.gpg.arrays+json": "arrays"}
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+current_format = contextvars.ContextVar("current_format", default="records")
+
+
+# ─── Tables ──────────────────────────────────────────────────────────────────
+class Table:
+    """A DataFrame headed for a columnar payload."""
+
+    __slots__ = ("frame",)
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def column_values(self):
+        """One value sequence per column: numeric columns as their NumPy arrays
+        (orjson writes those without boxing), the rest as Python lists."""
+        return [values if values.dtype.kind in "iufb" else values.tolist()
+                for values in (self.frame[c].to_numpy() for c in self.frame.columns)]
+
+
+def rows(frame):
+    """frame as records, or as a Table when the response is columnar; for
+    result sets returned as is (not post-processed row by row)."""
+    return Table(frame) if current_format.get() != "records" else frame.to_dict('records')
+
+
+# ─── Encoding ────────────────────────────────────────────────────────────────
+def _is_records(value):
+    if not value or not isinstance(value[0], dict):
+        return False
+    keys = value[0].keys()
+    return all(isinstance(row, dict) and row.keys() == keys for row in value)
+
+
+def _shape(columns, values, fmt):
+    if fmt == "arrays":
+        return dict(zip(columns, values))
+    return {"columns": columns,
+            "data": list(zip(*[v.tolist() if isinstance(v, np.ndarray) else v for v in values]))}
+
+
+NESTED = (dict, list, tuple, Table)
+
+
+def to_columnar(content, fmt):
+    """content with every Table and list of records reshaped for fmt."""
+    if isinstance(content, Table):
+        return _shape([str(c) for c in content.frame.columns], content.column_values(), fmt)
+    if isinstance(content, dict):
+        return {k: to_columnar(v, fmt) for k, v in content.items()}
+    if isinstance(content, (list, tuple)):
+        if _is_records(content):
+            columns = list(content[0])
+            return _shape(columns, [[to_columnar(v, fmt) if isinstance(v, NESTED) else v
+                                     for v in (row[c] for row in content)] for c in columns], fmt)
+        return [to_columnar(v, fmt) if isinstance(v, NESTED) else v for v in content]
+    return content
+
+
+def _default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode(content, fmt):
+    return orjson.dumps(to_columnar(content, fmt), default=_default, option=ORJSON_OPTIONS)
+
+
+class APIResponse(metrics.TimedJSONResponse):
+    """The app's JSON response: records by default, columnar when requested."""
+
+    def encode(self, content):
+        fmt = current_format.get()
+        return super().encode(content) if fmt == "records" else encode(content, fmt)
+
+
+def rendered(fn):
+    """Wrap a blocking endpoint so a columnar result is encoded where it ran
+    (a reader thread) and returned as a response, bypassing jsonable_encoder."""
+    def call(*args, **kwargs):
+        content = fn(*args, **kwargs)
+        if current_format.get() == "records" or isinstance(content, Response):
+            return content
+        return APIResponse(content)
+    return call
+
+
+# ─── Negotiation ─────────────────────────────────────────────────────────────
+class ResponseFormatMiddleware:
+    """ASGI middleware selecting the response format of GET /api requests.
+
+    An Accept media type is rewritten into ?format=, so the response cache
+    (keyed by query string) keeps the formats apart.
+    """
+
+    def __init__(self, app, prefix="/api/"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not scope["path"].startswith(self.prefix):
+            return await self.app(scope, receive, send)
+        query = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+        fmt = next((v for k, v in query if k == "format"), None)
+        if fmt is None:
+            accept = dict(scope["headers"]).get(b"accept", b"")
+            fmt = next((f for media, f in MEDIA_TYPES.items() if media in accept), "records")
+            if fmt != "records":
+                scope["query_string"] = urlencode(query + [("format", fmt)]).encode("latin-1")
+        if fmt not in FORMATS:
+            body = orjson.dumps({"detail": f"unknown format '{fmt}', expected one of {', '.join(FORMATS)}"})
+            await send({"type": "http.response.start", "status": 400,
+                        "headers": [(b"content-type", b"application/json"),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"vary", b"Accept"))
+            await send(message)
+
+        token = current_format.set(fmt)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_format.reset(token)
@@ -0,0 +1,209 @@
+"""Pre-aggregated spend rollups behind the overview, maverick and supplier KPIs.
+
+The rollups are a set of small cubes rather than one department x month x SCOA x
+supplier table: the full four-way key is nearly as sparse as `transactions`
+itself, whereas the two-way/three-way projections the endpoints actually group
+by are a few thousand rows each.
+"""
+import argparse
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from migrations import update_count
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+
+# source table -> rollup tables derived from it
+ROLLUPS = {
+    "transactions": ("spend_by_dept_month_scoa", "spend_by_dept_supplier"),
+    "purchase_orders": ("po_by_dept_month_commodity",),
+}
+
+# ─── Schema ──────────────────────────────────────────────────────────────────
+def create_rollup_tables(conn):
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS spend_by_dept_month_scoa (
+            department_id INTEGER NOT NULL, month TEXT NOT NULL,
+            scoa_code TEXT NOT NULL, scoa_description TEXT,
+            txn_count INTEGER NOT NULL, total_amount REAL NOT NULL,
+            PRIMARY KEY (department_id, month, scoa_code)) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS spend_by_dept_supplier (
+            department_id INTEGER NOT NULL, supplier_id INTEGER NOT NULL,
+            txn_count INTEGER NOT NULL, total_amount REAL NOT NULL,
+            PRIMARY KEY (department_id, supplier_id)) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS po_by_dept_month_commodity (
+            department_id INTEGER NOT NULL, month TEXT NOT NULL,
+            commodity_description TEXT NOT NULL, is_maverick INTEGER NOT NULL,
+            po_count INTEGER NOT NULL, total_value REAL NOT NULL,
+            PRIMARY KEY (department_id, month, commodity_description, is_maverick)) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            source TEXT PRIMARY KEY, row_count INTEGER NOT NULL,
+            max_id INTEGER NOT NULL, built_at TEXT NOT NULL, updates INTEGER NOT NULL DEFAULT 0);
+    ''')
+
+# Each statement aggregates the source rows in (?, ?] by id and merges them into
+# the rollup, so the same SQL serves a full rebuild (0, max_id] and an append.
+UPSERTS = {
+    "spend_by_dept_month_scoa": '''
+        INSERT INTO spend_by_dept_month_scoa
+        SELECT IFNULL(department_id, 0), IFNULL(substr(transaction_date,1,7), ''),
+               IFNULL(scoa_code, ''), MAX(scoa_description), COUNT(*), IFNULL(SUM(amount), 0)
+        FROM transactions WHERE id > ? AND id <= ?
+        GROUP BY 1, 2, 3
+        ON CONFLICT (department_id, month, scoa_code) DO UPDATE SET
+            txn_count = txn_count + excluded.txn_count,
+            total_amount = total_amount + excluded.total_amount''',
+    "spend_by_dept_supplier": '''
+        INSERT INTO spend_by_dept_supplier
+        SELECT IFNULL(department_id, 0), supplier_id, COUNT(*), IFNULL(SUM(amount), 0)
+        FROM transactions WHERE id > ? AND id <= ? AND supplier_id IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT (department_id, supplier_id) DO UPDATE SET
+            txn_count = txn_count + excluded.txn_count,
+            total_amount = total_amount + excluded.total_amount''',
+    "po_by_dept_month_commodity": '''
+        INSERT INTO po_by_dept_month_commodity
+        SELECT IFNULL(department_id, 0), IFNULL(substr(po_date,1,7), ''),
+               IFNULL(commodity_description, ''), contract_id IS NULL,
+               COUNT(*), IFNULL(SUM(total_value), 0)
+        FROM purchase_orders WHERE id > ? AND id <= ?
+        GROUP BY 1, 2, 3, 4
+        ON CONFLICT (department_id, month, commodity_description, is_maverick) DO UPDATE SET
+            po_count = po_count + excluded.po_count,
+            total_value = total_value + excluded.total_value''',
+}
+
+# ─── Build / refresh ─────────────────────────────────────────────────────────
+def _source_state(conn, source):
+    count, max_id = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(id), 0) FROM {source}").fetchone()
+    return count, max_id
+
+def _save_state(conn, source, count, max_id):
+    conn.execute("INSERT OR REPLACE INTO rollup_state (source, row_count, max_id, built_at, updates) "
+                 "VALUES (?,?,?,?,?)",
+                 (source, count, max_id, datetime.now().isoformat(timespec='seconds'), update_count(conn, source)))
+
+def apply_rows(conn, source, after_id, upto_id, row_count=None):
+    """Merge source rows with after_id < id <= upto_id into its rollups (no commit).
+
+    Pass the source's row_count when the caller already knows it (ingest does) to
+    skip re-counting the table.
+    """
+    for table in ROLLUPS[source]:
+        conn.execute(UPSERTS[table], (after_id, upto_id))
+    if row_count is None:
+        row_count, upto_id = _source_state(conn, source)
+    _save_state(conn, source, row_count, upto_id)
+
+def rebuild_rollups(conn):
+    """Drop and rebuild every rollup from the raw tables."""
+    create_rollup_tables(conn)
+    for source, tables in ROLLUPS.items():
+        for table in tables:
+            conn.execute(f"DELETE FROM {table}")
+        apply_rows(conn, source, 0, _source_state(conn, source)[1])
+    conn.commit()
+
+def refresh_rollups(conn):
+    """Bring rollups up to date, appending new rows where possible.
+
+    Returns a dict of source -> 'fresh' | 'appended' | 'rebuilt'. Rows are only
+    appended when the source grew strictly past the recorded max id; deletes
+    (row count) or in-place updates (migration 4's update counter) trigger a
+    rebuild of that source's rollups.
+    """
+    create_rollup_tables(conn)
+    actions = {}
+    for source, tables in ROLLUPS.items():
+        count, max_id = _source_state(conn, source)
+        updates = update_count(conn, source)
+        state = conn.execute("SELECT row_count, max_id, updates FROM rollup_state WHERE source = ?",
+                             (source,)).fetchone()
+        if state == (count, max_id, updates):
+            actions[source] = "fresh"
+            continue
+        if state and state[2] == updates and max_id > state[1]:
+            new_rows = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE id > ?",
+                                    (state[1],)).fetchone()[0]
+            if state[0] + new_rows == count:
+                apply_rows(conn, source, state[1], max_id)
+                actions[source] = "appended"
+                continue
+        for table in tables:
+            conn.execute(f"DELETE FROM {table}")
+        apply_rows(conn, source, 0, max_id)
+        actions[source] = "rebuilt"
+    conn.commit()
+    return actions
+
+def ensure_rollups(db_path=DB_PATH):
+    """Startup hook: refresh rollups in db_path, logging what had to be done."""
+    try:
+        conn = sqlite3.connect(str(db_path))
+        actions = refresh_rollups(conn)
+        conn.close()
+        print(f"[DEBUG] Rollups: {actions}")
+    except Exception as e:
+        print(f"[DEBUG] Rollup refresh failed: {e}")
+
+# ─── Consistency check ──────────────────────────────────────────────────────
+CHECKS = [
+    ("spend_by_dept_month_scoa",
+     "SELECT IFNULL(department_id,0), COUNT(*), IFNULL(SUM(amount),0) FROM transactions GROUP BY 1",
+     "SELECT department_id, SUM(txn_count), SUM(total_amount) FROM spend_by_dept_month_scoa GROUP BY 1"),
+    ("spend_by_dept_supplier",
+     """SELECT IFNULL(department_id,0), COUNT(*), IFNULL(SUM(amount),0) FROM transactions
+        WHERE supplier_id IS NOT NULL GROUP BY 1""",
+     "SELECT department_id, SUM(txn_count), SUM(total_amount) FROM spend_by_dept_supplier GROUP BY 1"),
+    ("po_by_dept_month_commodity",
+     """SELECT IFNULL(department_id,0) * 2 + (contract_id IS NULL), COUNT(*), IFNULL(SUM(total_value),0)
+        FROM purchase_orders GROUP BY 1""",
+     """SELECT department_id * 2 + is_maverick, SUM(po_count), SUM(total_value)
+        FROM po_by_dept_month_commodity GROUP BY 1"""),
+]
+
+def check_rollups(conn, rel_tol=1e-9):
+    """Compare per-department counts and sums of each rollup against the raw tables.
+
+    Returns a list of human-readable mismatches (empty when consistent).
+    """
+    problems = []
+    for table, raw_sql, rollup_sql in CHECKS:
+        raw = {k: (n, s) for k, n, s in conn.execute(raw_sql)}
+        rolled = {k: (n, s) for k, n, s in conn.execute(rollup_sql)}
+        for key in sorted(set(raw) | set(rolled)):
+            n1, s1 = raw.get(key, (0, 0.0))
+            n2, s2 = rolled.get(key, (0, 0.0))
+            if n1 != n2 or abs(s1 - s2) > rel_tol * max(abs(s1), abs(s2), 1.0):
+                problems.append(f"{table} key={key}: raw=({n1}, {s1:.2f}) rollup=({n2}, {s2:.2f})")
+    return problems
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the spend rollup tables.")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check"])
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    if args.command == "rebuild":
+        rebuild_rollups(conn)
+        print("Rollups rebuilt.")
+    elif args.command == "refresh":
+        print(refresh_rollups(conn))
+    else:
+        problems = check_rollups(conn)
+        for p in problems:
+            print(f"  MISMATCH {p}")
+        print("Rollups consistent." if not problems else f"{len(problems)} mismatches.")
+        conn.close()
+        return 1 if problems else 0
+    conn.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+"""Trigram full-text index behind /api/search.
+
+`LIKE '%q%'` can't use a B-tree, so every search scanned suppliers and
+contracts. Here one FTS5 table (trigram tokenizer, so any substring of three or
+more characters is an index lookup) holds the searchable text of every
+supplier, contract, purchase order and transaction document number. The rowid
+packs the source and its id (source kind << 40 | id), so each type is a rowid
+range of the same index and can be queried, refreshed and rebuilt on its own.
+
+Rows are appended by id watermark like rollups.py, in the ingest transaction.
+Supplier and contract matches (a few thousand rows at most) are all ranked.
+Purchase orders and transactions read a bounded number of candidates in id
+order, so a query matching a million document numbers costs about the same as
+one matching ten; their labels are fixed-format codes, which all score the
+same against a query, so the lowest ids are also the top ranked.
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+from migrations import update_count
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db"
+
+# source table: (kind, result type, label expression, detail expression)
+SOURCES = {
+    "suppliers": (0, "Supplier", "supplier_name", "NULL"),
+    "contracts": (1, "Contract", "contract_number", "description"),
+    "purchase_orders": (2, "Purchase Order", "po_number", "NULL"),
+    "transactions": (3, "Transaction", "document_number", "NULL"),
+}
+TYPES = {kind: result_type for kind, result_type, _, _ in SOURCES.values()}
+KIND_SHIFT = 40
+CANDIDATES = 4          # candidates read per result slot of a bounded type
+RANKED_IN_FULL = {"suppliers", "contracts"}     # small tables: every match is ranked
+
+
+def _rowid_range(kind):
+    return kind << KIND_SHIFT, ((kind + 1) << KIND_SHIFT) - 1
+
+
+# ─── Schema ──────────────────────────────────────────────────────────────────
+def create_index_tables(conn):
+    conn.executescript('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index
+            USING fts5(label, detail, tokenize = 'trigram');
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            source TEXT PRIMARY KEY, row_count INTEGER NOT NULL, max_id INTEGER NOT NULL,
+            updates INTEGER NOT NULL DEFAULT 0);
+    ''')
+
+
+# ─── Build / refresh ─────────────────────────────────────────────────────────
+def apply_rows(conn, source, after_id, upto_id, row_count=None):
+    """Index rows of source with after_id < id <= upto_id (no commit)."""
+    kind, _, label, detail = SOURCES[source]
+    conn.execute(f'''
+        INSERT INTO search_index (rowid, label, detail)
+        SELECT ({kind} << {KIND_SHIFT}) | id, {label}, {detail}
+        FROM {source} WHERE id > ? AND id <= ? AND {label} IS NOT NULL
+    ''', (after_id, upto_id))
+    if row_count is None:
+        row_count, upto_id = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(id), 0) FROM {source}").fetchone()
+    conn.execute("INSERT OR REPLACE INTO search_index_state (source, row_count, max_id, updates) VALUES (?, ?, ?, ?)",
+                 (source, row_count, upto_id, update_count(conn, source)))
+
+
+def rebuild_source(conn, source):
+    conn.execute("DELETE FROM search_index WHERE rowid BETWEEN ? AND ?", _rowid_range(SOURCES[source][0]))
+    apply_rows(conn, source, 0, conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {source}").fetchone()[0])
+
+
+def rebuild_index(conn):
+    create_index_tables(conn)
+    conn.execute("DELETE FROM search_index")
+    for source in SOURCES:
+        apply_rows(conn, source, 0, conn.execute(f"SELECT IFNULL(MAX(id), 0) FROM {source}").fetchone()[0])
+    conn.execute("INSERT INTO search_index (search_index) VALUES ('optimize')")
+    conn.commit()
+
+
+def refresh_index(conn):
+    """Index appended rows of each source, rebuilding a source whose rows were
+    deleted or updated in place (migration 4's update counter). Returns
+    'fresh', 'appended' or 'rebuilt'."""
+    create_index_tables(conn)
+    states = dict((r[0], r[1:]) for r in conn.execute(
+        "SELECT source, row_count, max_id, updates FROM search_index_state"))
+    actions = set()
+    for source in SOURCES:
+        count, max_id = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(id), 0) FROM {source}").fetchone()
+        updates = update_count(conn, source)
+        state = states.get(source)
+        if state == (count, max_id, updates):
+            continue
+        if state and state[2] == updates and max_id > state[1]:
+            new_rows = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE id > ?", (state[1],)).fetchone()[0]
+            if state[0] + new_rows == count:
+                apply_rows(conn, source, state[1], max_id)
+                actions.add("appended")
+                continue
+        rebuild_source(conn, source)
+        actions.add("rebuilt")
+    conn.commit()
+    return "rebuilt" if "rebuilt" in actions else "appended" if actions else "fresh"
+
+
+def ensure_search_index(db_path=DB_PATH):
+    """Refresh the index in db_path (opens its own read-write connection)."""
+    try:
+        conn = sqlite3.connect(str(db_path))
+        action = refresh_index(conn)
+        conn.close()
+        print(f"[DEBUG] Search index: {action}")
+    except Exception as e:
+        print(f"[DEBUG] Search index refresh failed: {e}")
+
+
+# ─── Reads ───────────────────────────────────────────────────────────────────
+def _spans(text, q):
+    """[start, end) offsets of case-insensitive occurrences of q in text."""
+    if not text:
+        return []
+    spans, lowered, needle = [], text.lower(), q.lower()
+    i = lowered.find(needle)
+    while i >= 0:
+        spans.append([i, i + len(needle)])
+        i = lowered.find(needle, i + len(needle))
+    return spans
+
+
+def _score(q, label, detail):
+    """(match, score): label prefix > label substring > detail only, each
+    scaled by how much of the matched field the query covers."""
+    needle = q.lower()
+    if label.lower().startswith(needle):
+        return "prefix", 2 + len(q) / len(label)
+    if needle in label.lower():
+        return "label", 1 + len(q) / len(label)
+    return "detail", len(q) / len(detail) if detail else 0.0
+
+
+def _result(kind, ref_id, label, detail, q):
+    match, score = _score(q, label, detail)
+    highlights = {field: spans for field, spans in (("label", _spans(label, q)), ("detail", _spans(detail, q)))
+                  if spans}
+    return {"id": ref_id, "label": label, "type": TYPES[kind], "detail": detail,
+            "match": match, "score": round(score, 4),
+            "highlights": highlights}
+
+
+def _candidates(conn, phrase, limit):
+    """Matches of each type: all of them for RANKED_IN_FULL, else the first
+    `limit` in rowid order."""
+    by_kind = {}
+    for source, (kind, _, _, _) in SOURCES.items():
+        bounded = source not in RANKED_IN_FULL
+        by_kind[kind] = conn.execute(f"""
+            SELECT rowid, label, detail FROM search_index
+            WHERE search_index MATCH ? AND rowid BETWEEN ? AND ? {"LIMIT ?" if bounded else ""}
+        """, (phrase, *_rowid_range(kind)) + ((limit,) if bounded else ())).fetchall()
+    return by_kind
+
+
+def search(conn, q, per_type=5):
+    """Typed results, at most per_type of each, ranked within each type.
+
+    Every supplier and contract match is ranked by _score (label prefix, then
+    label substring, then description); purchase orders and transactions rank
+    their first per_type * CANDIDATES matches. bm25() is not used: ordering by
+    it scores every match of the query (a second for one matching every
+    document number), which is what the bounded read avoids. Queries shorter than three characters (below a
+    trigram) fall back to LIKE on supplier names and contract numbers.
+    """
+    q = q.strip()
+    if len(q) < 3:
+        return like_search(conn, q, per_type)
+    phrase = '"' + q.replace('"', '""') + '"'
+    results = []
+    for kind, rows in _candidates(conn, phrase, per_type * CANDIDATES).items():
+        ranked = sorted((_result(kind, rowid & ((1 << KIND_SHIFT) - 1), label, detail, q)
+                         for rowid, label, detail in rows),
+                        key=lambda r: (-r["score"], r["id"]))
+        results += ranked[:per_type]
+    return results
+
+
+def like_search(conn, q, per_type=5):
+    """Short-query fallback: LIKE over the two small tables, as before the index."""
+    if len(q) < 2:
+        return []
+    results = []
+    for source in ("suppliers", "contracts"):
+        kind, _, label, detail = SOURCES[source]
+        rows = conn.execute(f"""
+            SELECT id, {label}, {detail} FROM {source} WHERE {label} LIKE ? LIMIT ?
+        """, (f"%{q}%", per_type)).fetchall()
+        results += sorted((_result(kind, ref_id, lbl, det, q) for ref_id, lbl, det in rows),
+                          key=lambda r: (-r["score"], r["id"]))
+    return results
+
+
+# ─── Consistency check ──────────────────────────────────────────────────────
+def check_index(conn, samples=20):
+    """Compare indexed rows per source with the source tables, and FTS matches
+    with LIKE for substrings of a few labels; returns mismatches."""
+    create_index_tables(conn)
+    problems = []
+    for source, (kind, _, label, _) in SOURCES.items():
+        expected = conn.execute(f"SELECT COUNT(*) FROM {source} WHERE {label} IS NOT NULL").fetchone()[0]
+        indexed = conn.execute("SELECT COUNT(*) FROM search_index WHERE rowid BETWEEN ? AND ?",
+                               _rowid_range(kind)).fetchone()[0]
+        if expected != indexed:
+            problems.append(f"{source}: {expected} rows, {indexed} indexed")
+            continue
+        labels = conn.execute(f"""
+            SELECT {label} FROM {source} WHERE {label} IS NOT NULL AND length({label}) >= 5
+            ORDER BY id LIMIT ?""", (samples,)).fetchall()
+        for (text,) in labels:
+            needle = text[1:5]
+            raw = {r[0] for r in conn.execute(
+                f"SELECT id FROM {source} WHERE {label} LIKE ? ESCAPE '\\'",
+                ('%' + needle.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%',))}
+            lo, hi = _rowid_range(kind)
+            fts = {r[0] & ((1 << KIND_SHIFT) - 1) for r in conn.execute(
+                "SELECT rowid FROM search_index WHERE label MATCH ? AND rowid BETWEEN ? AND ?",
+                ('"' + needle.replace('"', '""') + '"', lo, hi))}
+            if raw != fts:
+                problems.append(f"{source} '{needle}': LIKE={len(raw)} rows, index={len(fts)}")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the full-text search index.")
+    parser.add_argument("command", choices=["rebuild", "refresh", "check"])
+    parser.add_argument("--db", default=str(DB_PATH), help="SQLite database path")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    status = 0
+    if args.command == "rebuild":
+        rebuild_index(conn)
+        print("Search index rebuilt.")
+    elif args.command == "refresh":
+        print(refresh_index(conn))
+    else:
+        problems = check_index(conn)
+        for p in problems[:20]:
+            print(f"  MISMATCH {p}")
+        print("Search index consistent." if not problems else f"{len(problems)} mismatches.")
+        status = 1 if problems else 0
+    conn.close()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
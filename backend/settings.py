@@ -0,0 +1,85 @@
+"""Runtime configuration, read once from GPG_* environment variables."""
+import os
+from pathlib import Path
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def _float(name, default):
+    return float(os.environ.get(name, default))
+
+
+# ─── Database location ──────────────────────────────────────────────────────
+POTENTIAL_DB_PATHS = [
+    Path(__file__).resolve().parent.parent / "database" / "gpg_analytics.db", # Root mono-repo
+    Path(__file__).resolve().parent / "database" / "gpg_analytics.db",        # Nested in backend
+    Path("/opt/render/project/src/database/gpg_analytics.db"),              # Render absolute path
+]
+if os.environ.get("GPG_DB_PATH"):
+    POTENTIAL_DB_PATHS.insert(0, Path(os.environ["GPG_DB_PATH"]).resolve())
+
+DB_PATH = next((p for p in POTENTIAL_DB_PATHS if p.exists()), POTENTIAL_DB_PATHS[0])
+
+# ─── Startup ────────────────────────────────────────────────────────────────
+STARTUP_MODE = os.environ.get("GPG_STARTUP_MODE", "background")  # "background" | "blocking"
+
+# ─── Read-only connection pool ──────────────────────────────────────────────
+DB_POOL_SIZE = _int("GPG_DB_POOL_SIZE", 8)                        # max open connections
+DB_POOL_TIMEOUT = _float("GPG_DB_POOL_TIMEOUT", 10.0)             # seconds to wait for a free one
+DB_POOL_MAX_LIFETIME = _float("GPG_DB_POOL_MAX_LIFETIME", 3600.0) # recycle connections older than this
+DB_POOL_HEALTH_CHECK_INTERVAL = _float("GPG_DB_POOL_HEALTH_CHECK_INTERVAL", 30.0)  # ping if idle longer
+DB_MMAP_SIZE = _int("GPG_DB_MMAP_SIZE", 256 * 1024 * 1024)        # bytes
+DB_CACHE_SIZE_KB = _int("GPG_DB_CACHE_SIZE_KB", 64 * 1024)        # page cache per connection
+
+# ─── Reader executor ────────────────────────────────────────────────────────
+READER_QUEUE_LIMIT = _int("GPG_READER_QUEUE_LIMIT", 64)          # waiting calls before 503
+READER_RETRY_AFTER = _int("GPG_READER_RETRY_AFTER", 1)           # seconds, sent as Retry-After
+
+# ─── Analytics engine ───────────────────────────────────────────────────────
+ANALYTICS_ENGINE = os.environ.get("GPG_ANALYTICS_ENGINE", "sqlite")  # "sqlite" | "columnar"
+COLUMN_CACHE = os.environ.get("GPG_COLUMN_CACHE", "shared")    # "shared" (mmap'd, all workers) | "process"
+COLUMN_CACHE_DIR = Path(os.environ.get("GPG_COLUMN_CACHE_DIR", DB_PATH.parent / "column-cache"))
+COLUMN_CACHE_KEEP = _int("GPG_COLUMN_CACHE_KEEP", 2)               # generations kept on disk
+
+# ─── Split-purchase detection ───────────────────────────────────────────────
+SPLIT_LOW = _float("GPG_SPLIT_LOW", 450_000)        # a split's spend falls in [low, high] ...
+SPLIT_HIGH = _float("GPG_SPLIT_HIGH", 500_000)
+SPLIT_MIN_COUNT = _int("GPG_SPLIT_MIN_COUNT", 2)    # ... over at least this many transactions
+
+# ─── Anomaly model store ────────────────────────────────────────────────────
+MODEL_DIR = Path(os.environ.get("GPG_MODEL_DIR", DB_PATH.parent / "models"))
+MODEL_REFIT_INTERVAL = _float("GPG_MODEL_REFIT_INTERVAL", 60.0)  # seconds between data-version checks
+MODEL_KEEP = _int("GPG_MODEL_KEEP", 2)                           # versions kept on disk per model
+TXN_SCORE_WORKERS = _int("GPG_TXN_SCORE_WORKERS", os.cpu_count() or 1)  # transaction scoring processes
+TXN_SCORE_CHUNK_ROWS = _int("GPG_TXN_SCORE_CHUNK_ROWS", 100_000)  # fact rows per scoring chunk
+
+# ─── Response cache ─────────────────────────────────────────────────────────
+RESPONSE_CACHE_ENABLED = os.environ.get("GPG_RESPONSE_CACHE", "1") != "0"
+RESPONSE_CACHE_MAX_ENTRIES = _int("GPG_RESPONSE_CACHE_MAX_ENTRIES", 1024)
+RESPONSE_CACHE_MAX_BYTES = _int("GPG_RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# ─── Bulk ingest ────────────────────────────────────────────────────────────
+INGEST_BATCH_ROWS = _int("GPG_INGEST_BATCH_ROWS", 5000)          # rows per write transaction
+
+# ─── List pagination ────────────────────────────────────────────────────────
+PAGE_DEFAULT_LIMIT = _int("GPG_PAGE_DEFAULT_LIMIT", 50)          # rows per page when limit is omitted
+PAGE_MAX_LIMIT = _int("GPG_PAGE_MAX_LIMIT", 1000)
+PAGE_COUNT_LIMIT = _int("GPG_PAGE_COUNT_LIMIT", 10000)           # total_count is exact up to this
+
+# ─── Instrumentation ────────────────────────────────────────────────────────
+SLOW_QUERY_MS = _float("GPG_SLOW_QUERY_MS", 0)                   # log statements slower than this; 0 = off
+SLOW_QUERY_KEEP = _int("GPG_SLOW_QUERY_KEEP", 100)               # entries kept for /api/metrics/slow-queries
+SLOW_QUERY_LOG = os.environ.get("GPG_SLOW_QUERY_LOG")            # optional JSONL file, appended to
+
+# ─── Request profiler ───────────────────────────────────────────────────────
+PROFILE_TOKEN = os.environ.get("GPG_PROFILE_TOKEN", "")          # X-GPG-Profile value; unset = header and /api/profiles off
+PROFILE_SAMPLE_RATE = _float("GPG_PROFILE_SAMPLE_RATE", 0.0)     # fraction of requests profiled anyway
+PROFILE_MIN_MS = _float("GPG_PROFILE_MIN_MS", 0.0)               # keep sampled profiles slower than this
+PROFILE_INTERVAL_MS = _float("GPG_PROFILE_INTERVAL_MS", 5.0)     # stack sampling interval
+PROFILE_ALLOCATIONS = os.environ.get("GPG_PROFILE_ALLOCATIONS", "1") != "0"  # tracemalloc per profile
+PROFILE_TRACE_FRAMES = _int("GPG_PROFILE_TRACE_FRAMES", 1)       # frames tracemalloc keeps per allocation
+PROFILE_TOP_ALLOCATIONS = _int("GPG_PROFILE_TOP_ALLOCATIONS", 25)
+PROFILE_DIR = Path(os.environ.get("GPG_PROFILE_DIR", DB_PATH.parent / "profiles"))
+PROFILE_KEEP = _int("GPG_PROFILE_KEEP", 50)                      # profiles kept on disk
@@ -0,0 +1,74 @@
+"""Rolling-window split-purchase detection over supplier-day totals.
+
+The same-day detector (invoice_index.py) misses threshold avoidance spread over
+several days. Here every supplier-day ending a window of N calendar days is
+checked: window counts and sums come from prefix sums over the supplier-day
+totals, and each window's start is found with a vectorized two-pointer
+(searchsorted on the sorted supplier/day key), so the cost is a sort plus O(n).
+With window_days=1 the result equals the same-day detector.
+
+The supplier-day totals come from the columnar engine when it is enabled, or
+else from the invoice index's supplier_daily_totals (supplier_days()).
+"""
+from types import SimpleNamespace
+
+import numpy as np
+
+from invoice_index import SPLIT_MIN, SPLIT_MAX
+
+
+def supplier_days(conn):
+    """Supplier-day arrays shaped like ColumnarEngine.supplier_days, read from
+    supplier_daily_totals: NULL supplier as 0, undated days left out, rows
+    whose dates fall on the same day merged."""
+    rows = np.array(conn.execute("""
+        SELECT IFNULL(supplier_id, 0), CAST(julianday(transaction_date) - 2440587.5 AS INTEGER),
+               txn_count, IFNULL(total_amount, 0)
+        FROM supplier_daily_totals WHERE julianday(transaction_date) IS NOT NULL""").fetchall(),
+        dtype=np.float64).reshape(-1, 4)
+    key = (rows[:, 0].astype(np.int64) << 32) | rows[:, 1].astype(np.int64)
+    keys, inverse = np.unique(key, return_inverse=True)
+    return SimpleNamespace(
+        supplier=(keys >> 32).astype(np.int32),
+        day=(keys & 0xFFFFFFFF).astype(np.int32),
+        count=np.bincount(inverse, weights=rows[:, 2], minlength=len(keys)).astype(np.int64),
+        total=np.bincount(inverse, weights=rows[:, 3], minlength=len(keys)))
+
+
+def window_splits(days, window_days, low=SPLIT_MIN, high=SPLIT_MAX, min_count=2):
+    """Windows of `window_days` days whose spend falls in [low, high].
+
+    `days` holds supplier, day, count and total arrays sorted by (supplier, day)
+    (ColumnarEngine.supplier_days). A window ends on a day with transactions and
+    is flagged when it holds at least min_count transactions. A chain of
+    overlapping flagged windows of one supplier is reported once, as its first.
+    Returns a namespace of supplier, first_day, last_day, txn_count and total
+    arrays.
+    """
+    key = (days.supplier.astype(np.int64) << 32) | days.day
+    end = np.arange(len(key))
+    # window start: first supplier-day >= day - (N-1), not before the supplier's first day
+    new_supplier = np.concatenate(([True], days.supplier[1:] != days.supplier[:-1]))
+    supplier_start = np.maximum.accumulate(np.where(new_supplier, end, 0))
+    start = np.maximum(np.searchsorted(key, key - (window_days - 1), 'left'), supplier_start)
+    count_cs = np.concatenate(([0], np.cumsum(days.count)))
+    # long double prefix sums keep window differences within float64 rounding
+    total_cs = np.concatenate(([0], np.cumsum(days.total, dtype=np.longdouble)))
+    counts = count_cs[end + 1] - count_cs[start]
+    totals = (total_cs[end + 1] - total_cs[start]).astype(np.float64)
+    totals[start == end] = days.total[start == end]
+    flagged = np.flatnonzero((counts >= min_count) & (totals >= low) & (totals <= high))
+
+    # a flagged window overlapping the previous flagged window of the same
+    # supplier belongs to the same cluster; report each cluster once
+    prev = np.concatenate(([-1], flagged[:-1]))
+    first = (np.concatenate(([True], days.supplier[flagged[1:]] != days.supplier[flagged[:-1]]))
+             | (start[flagged] > prev))
+    idx = flagged[first]
+    return SimpleNamespace(
+        supplier=days.supplier[idx],
+        first_day=days.day[start[idx]],
+        last_day=days.day[idx],
+        txn_count=counts[idx],
+        total=totals[idx],
+    )
@@ -0,0 +1,119 @@
+"""Supplier x department membership bitmaps behind the supplier distributions.
+
+spend_by_dept_supplier (rollups.py) already holds one row per (department,
+supplier) pair and is merged on ingest, so "which suppliers has department d
+paid" never needs a COUNT(DISTINCT supplier_id) over transactions. Joining
+it back to suppliers for each of the three distributions still costs a B-tree
+range, a lookup per pair and a temp B-tree per request, so here the pairs are
+loaded once per process into one packed bitmap per department over the
+suppliers (ordered by id) and every supplier attribute is dictionary-encoded.
+A distribution is then a bincount of the attribute codes under the unpacked
+bitmap: microseconds, with the same groups and order as the SQL it replaces.
+
+The index is rebuilt when the transactions rollup moves on or either table is
+updated in place: its signature is the (row_count, max_id, updates) watermark
+the transactions rollup was built at, and the same for suppliers (updates being
+migration 4's counter). Requests compare it without a lock; only a rebuild
+takes one.
+"""
+import threading
+
+import numpy as np
+
+from db_pool import get_pool
+from migrations import update_count
+
+
+def _sql_order(value):
+    """Sort key matching SQLite's ORDER BY: NULL, then numbers, then text."""
+    return (value is not None, isinstance(value, str), value)
+
+
+def _encode(values):
+    """(codes, sorted distinct values) of a column, NULL included as a value."""
+    uniques = sorted(set(values), key=_sql_order)
+    lookup = {v: i for i, v in enumerate(uniques)}
+    return np.array([lookup[v] for v in values], dtype=np.int32), uniques
+
+
+class SupplierIndex:
+    def __init__(self, conn):
+        self.version = self.signature(conn)
+        rows = conn.execute("SELECT id, bbbee_level, tax_compliant, province FROM suppliers ORDER BY id").fetchall()
+        ids, bbbee, tax, province = zip(*rows) if rows else ((),) * 4
+        self.supplier_ids = np.array(ids, dtype=np.int64)
+        self.bbbee, self.bbbee_levels = _encode(bbbee)
+        self.tax, self.tax_values = _encode(tax)
+        self.province, self.provinces = _encode(province)
+
+        pairs = np.array(conn.execute(
+            "SELECT department_id, supplier_id FROM spend_by_dept_supplier").fetchall(), dtype=np.int64).reshape(-1, 2)
+        dept, supplier = pairs[:, 0], pairs[:, 1]
+        # COUNT(*) per department, pairs whose supplier row is missing included
+        self.pair_counts = np.bincount(dept, minlength=1)
+        pos = np.searchsorted(self.supplier_ids, supplier)
+        known = pos < len(self.supplier_ids)
+        known[known] = self.supplier_ids[pos[known]] == supplier[known]
+        members = np.zeros((len(self.pair_counts), len(self.supplier_ids)), dtype=bool)
+        members[dept[known], pos[known]] = True
+        self.bitmaps = np.packbits(members, axis=1)
+
+    @staticmethod
+    def signature(conn):
+        """Cheap change marker: (row_count, max_id, updates) of the transactions
+        rollup and of the suppliers table."""
+        rollup = conn.execute("SELECT row_count, max_id, updates FROM rollup_state "
+                              "WHERE source = 'transactions'").fetchone()
+        count, max_id = conn.execute("SELECT COUNT(*), IFNULL(MAX(id), 0) FROM suppliers").fetchone()
+        return tuple(rollup or ()), (count, max_id, update_count(conn, "suppliers"))
+
+    def members(self, department_id):
+        """Boolean mask over the suppliers (by id) department_id has paid; every supplier if None."""
+        if not department_id:
+            return np.ones(len(self.supplier_ids), dtype=bool)
+        if not 0 < department_id < len(self.bitmaps):
+            return np.zeros(len(self.supplier_ids), dtype=bool)
+        return np.unpackbits(self.bitmaps[department_id], count=len(self.supplier_ids)).view(bool)
+
+    def active_suppliers(self, department_id=None):
+        """Suppliers paid by department_id (its spend_by_dept_supplier rows); all suppliers if None."""
+        if not department_id:
+            return len(self.supplier_ids)
+        return int(self.pair_counts[department_id]) if 0 < department_id < len(self.pair_counts) else 0
+
+    @staticmethod
+    def _counts(codes, mask, n):
+        counts = np.bincount(codes[mask], minlength=n)
+        return [(i, int(counts[i])) for i in np.flatnonzero(counts)]
+
+    def distributions(self, department_id=None):
+        """The B-BBEE, tax-compliance and province distributions of /api/suppliers,
+        over the suppliers department_id has paid (all suppliers if None)."""
+        mask = self.members(department_id)
+        provinces = self._counts(self.province, mask, len(self.provinces))
+        provinces.sort(key=lambda group: -group[1])          # ORDER BY count DESC, ties in key order
+        return {
+            "bbbee_distribution": [{"bbbee_level": self.bbbee_levels[i], "count": n}
+                                   for i, n in self._counts(self.bbbee, mask, len(self.bbbee_levels))],
+            "tax_compliance": [{"status": "Compliant" if self.tax_values[i] == 1 else "Non-Compliant", "count": n}
+                               for i, n in self._counts(self.tax, mask, len(self.tax_values))],
+            "province_distribution": [{"province": self.provinces[i], "count": n} for i, n in provinces],
+        }
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_supplier_index(db_path):
+    """Process-wide index for db_path, rebuilt when its signature changes."""
+    with get_pool(db_path).connection() as conn:
+        version = SupplierIndex.signature(conn)
+        index = _indexes.get(db_path)
+        if index is not None and index.version == version:
+            return index
+        with _indexes_lock:             # one rebuild at a time; others may have done it meanwhile
+            index = _indexes.get(db_path)
+            if index is None or index.version != version:
+                index = _indexes[db_path] = SupplierIndex(conn)
+            return index
@@ -0,0 +1,460 @@
+"""Per-transaction anomaly scores, computed in chunks across a process pool.
+
+The supplier model (anomaly_detection.py) scores about 2,100 supplier aggregate
+rows, so a single suspicious payment is never flagged. This pipeline scores
+every row of `transactions` with an Isolation Forest over per-row features
+(amounts below a baseline count as 0: small payments are not what it is for):
+
+  supplier_z            stds the log amount sits above the supplier's mean log amount
+  department_z          the same against the department's
+  weekend               dated on a Saturday or Sunday
+  scoa_rarity           -log share of the SCOA item among all transactions
+  supplier_scoa_rarity  -log share of the SCOA item among the supplier's transactions
+
+A build makes two passes over id ranges of the fact table. Each range is read
+by a worker process with its own read-only connection. The first pass returns
+partial baselines (count, sum and sum of squares per supplier and department,
+SCOA and supplier-SCOA counts) and a fixed-rate sample; the parent merges them
+and fits the scaler and forest on the sample. The second pass scores every
+range. At most two ranges per worker are in flight, so memory follows the
+chunk size, not the table.
+
+Scores are written to transaction_scores_next, which replaces transaction_scores
+in one transaction at the end. Appended rows are scored into transaction_scores
+directly with the stored model, by id watermark like the feature store. score is
+-decision_function: above 0 is flagged, higher is more anomalous.
+"""
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+import settings
+from db_pool import get_pool
+from migrations import FACT_TABLES, update_count
+
+FACT = FACT_TABLES["transactions"]
+FEATURES = ["supplier_z", "department_z", "weekend", "scoa_rarity", "supplier_scoa_rarity"]
+FIT_SAMPLE = 200_000        # rows the forest is fitted on
+CONTAMINATION = 0.01
+MIN_STD = 0.25              # floor of a baseline's log-amount std (suppliers with near-constant amounts)
+
+# (bit, test over a chunk's features, reason)
+REASONS = [
+    (1, lambda f: f["supplier_z"] >= 3, "Amount far above the supplier's usual range"),
+    (2, lambda f: f["department_z"] >= 3, "Large amount for the department"),
+    (4, lambda f: f["weekend"] > 0, "Dated on a weekend"),
+    (8, lambda f: f["supplier_scoa_rarity"] >= np.log(50), "SCOA item the supplier rarely uses"),
+    (16, lambda f: f["scoa_rarity"] >= np.log(1000), "Rarely used SCOA item"),
+]
+
+
+# ─── Schema ──────────────────────────────────────────────────────────────────
+def create_score_tables(conn, table="transaction_scores"):
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            transaction_id INTEGER PRIMARY KEY, score REAL NOT NULL, reasons INTEGER NOT NULL);
+
+        CREATE TABLE IF NOT EXISTS transaction_scores_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1), row_count INTEGER NOT NULL, max_id INTEGER NOT NULL,
+            model TEXT NOT NULL, scored_at TEXT NOT NULL, seconds REAL NOT NULL,
+            updates INTEGER NOT NULL DEFAULT 0);
+    ''')
+
+
+SCORE_INDEX = "CREATE INDEX IF NOT EXISTS idx_transaction_scores_score ON transaction_scores(score)"
+
+
+# ─── Chunks (run in the workers) ─────────────────────────────────────────────
+_worker = {}                    # per process: db path, loaded models by path
+
+
+def _init_worker(db_path):
+    _worker.clear()
+    _worker["db_path"] = db_path
+
+
+def _read_range(lo, hi):
+    """Fact rows with lo <= id < hi as typed columns; NULL keys read as 0."""
+    with get_pool(_worker["db_path"]).connection() as conn:
+        rows = conn.execute(f"""
+            SELECT id, IFNULL(supplier_id, 0), IFNULL(department_id, 0), IFNULL(scoa_id, 0), IFNULL(amount, 0),
+                   IFNULL(CAST(julianday(transaction_date) - 2440587.5 AS INTEGER), -1)
+            FROM {FACT} WHERE id >= ? AND id < ?""", (lo, hi)).fetchall()
+    a = np.array(rows, dtype=np.float64).reshape(-1, 6)
+    return SimpleNamespace(id=a[:, 0].astype(np.int64), supplier=a[:, 1].astype(np.int64),
+                           dept=a[:, 2].astype(np.int64), scoa=a[:, 3].astype(np.int64),
+                           amount=a[:, 4], day=a[:, 5].astype(np.int64))
+
+
+def _log_amount(amount):
+    return np.sign(amount) * np.log1p(np.abs(amount))
+
+
+def _pair_keys(supplier, scoa):
+    return (supplier << 32) | scoa
+
+
+def baseline_part(lo, hi, sample_rate):
+    """Partial baselines of one id range, plus its share of the fit sample."""
+    c = _read_range(lo, hi)
+    la = _log_amount(c.amount)
+    keys, counts = np.unique(_pair_keys(c.supplier, c.scoa), return_counts=True)
+    keep = np.random.default_rng(lo).random(len(c.id)) < sample_rate
+    return {"n": len(c.id),
+            "supplier": [np.bincount(c.supplier, w) for w in (None, la, la * la)],
+            "dept": [np.bincount(c.dept, w) for w in (None, la, la * la)],
+            "scoa": np.bincount(c.scoa), "pairs": (keys, counts),
+            "sample": SimpleNamespace(**{k: v[keep] for k, v in vars(c).items()})}
+
+
+def _lookup(values, index, default=0):
+    ok = index < len(values)
+    return np.where(ok, values[np.where(ok, index, 0)], default)
+
+
+def features(c, b):
+    """Feature columns of chunk c against baselines b."""
+    la = _log_amount(c.amount)
+    z = {}
+    for name, key in (("supplier_z", c.supplier), ("department_z", c.dept)):
+        n, mean, std = (_lookup(v, key) for v in (b[name]["n"], b[name]["mean"], b[name]["std"]))
+        z[name] = np.where(n >= 2, np.maximum(la - mean, 0) / np.where(n >= 2, std, 1), 0.0)
+    keys = _pair_keys(c.supplier, c.scoa)
+    pos = np.searchsorted(b["pair_keys"], keys)
+    found = pos < len(b["pair_keys"])
+    found[found] = b["pair_keys"][pos[found]] == keys[found]
+    pair_n = np.zeros(len(keys))
+    pair_n[found] = b["pair_n"][pos[found]]
+    supplier_n = _lookup(b["supplier_z"]["n"], c.supplier)
+    return {**z,
+            "weekend": ((c.day + 3) % 7 >= 5).astype(np.float64),        # 1970-01-01 was a Thursday
+            "scoa_rarity": -np.log(np.maximum(_lookup(b["scoa_n"], c.scoa), 1) / max(b["n"], 1)),
+            "supplier_scoa_rarity": -np.log(np.maximum(pair_n, 1) / np.maximum(supplier_n, 1))}
+
+
+def _model(path):
+    if path not in _worker:
+        import joblib               # deferred with scikit-learn, see anomaly_detection.py
+        _worker[path] = joblib.load(path)
+    return _worker[path]
+
+
+def score_part(lo, hi, model_path):
+    """(ids, scores, reason bits) of one id range."""
+    bundle = _model(model_path)
+    c = _read_range(lo, hi)
+    if not len(c.id):
+        return c.id, np.zeros(0), np.zeros(0, np.int64)
+    f = features(c, bundle["baselines"])
+    x = bundle["scaler"].transform(np.column_stack([f[k] for k in FEATURES]))
+    reasons = np.zeros(len(c.id), np.int64)
+    for bit, test, _ in REASONS:
+        reasons |= np.where(test(f), bit, 0)
+    return c.id, -bundle["model"].decision_function(x), reasons
+
+
+# ─── Pool ────────────────────────────────────────────────────────────────────
+def _ranges(after_id, upto_id, chunk_rows):
+    return [(lo, min(lo + chunk_rows, upto_id + 1)) for lo in range(after_id + 1, upto_id + 1, chunk_rows)]
+
+
+class _Runner:
+    """Runs chunk functions over id ranges: in-process for a single range or
+    worker, else on a spawned process pool (forking a threaded server is unsafe)."""
+
+    def __init__(self, db_path, workers):
+        self.db_path = str(db_path)
+        self.workers = max(1, workers)
+        self._pool = None
+
+    def map(self, fn, ranges, *args):
+        """Yield fn(lo, hi, *args) as each finishes, at most two ranges per worker in flight."""
+        if self.workers == 1 or len(ranges) <= 1:
+            _init_worker(self.db_path)
+            for lo, hi in ranges:
+                yield fn(lo, hi, *args)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(min(self.workers, len(ranges)),
+                                             mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker, initargs=(self.db_path,))
+        pending, todo = set(), iter(ranges)
+        while True:
+            for lo, hi in todo:
+                pending.add(self._pool.submit(fn, lo, hi, *args))
+                if len(pending) >= 2 * self.workers:
+                    break
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+def _grow(total, part):
+    if len(part) > len(total):
+        total = np.pad(total, (0, len(part) - len(total)))
+    total[:len(part)] += part
+    return total
+
+
+def fit_baselines(runner, upto_id, row_count, chunk_rows):
+    """Merge the first pass into baselines and the fit sample."""
+    sums = {"supplier": [np.zeros(0)] * 3, "dept": [np.zeros(0)] * 3}
+    scoa, pairs, samples, n = np.zeros(0), (np.zeros(0, np.int64), np.zeros(0, np.int64)), [], 0
+    rate = min(1.0, FIT_SAMPLE / max(row_count, 1))
+    for part in runner.map(baseline_part, _ranges(0, upto_id, chunk_rows), rate):
+        n += part["n"]
+        for group in sums:
+            sums[group] = [_grow(t, p) for t, p in zip(sums[group], part[group])]
+        scoa = _grow(scoa, part["scoa"])
+        keys, inverse = np.unique(np.concatenate([pairs[0], part["pairs"][0]]), return_inverse=True)
+        pairs = keys, np.bincount(inverse, np.concatenate([pairs[1], part["pairs"][1]])).astype(np.int64)
+        samples.append(part["sample"])
+
+    baselines = {"n": n, "scoa_n": scoa, "pair_keys": pairs[0], "pair_n": pairs[1]}
+    for group, name in (("supplier", "supplier_z"), ("dept", "department_z")):
+        count, total, squares = sums[group]
+        mean = total / np.maximum(count, 1)
+        std = np.sqrt(np.maximum(squares / np.maximum(count, 1) - mean * mean, 0))
+        baselines[name] = {"n": count, "mean": mean, "std": np.maximum(std, MIN_STD)}
+    columns = {k: np.concatenate([getattr(s, k) for s in samples]) if samples else np.zeros(0, np.int64)
+               for k in ("id", "supplier", "dept", "scoa", "amount", "day")}
+    order = np.argsort(columns["id"])       # parts arrive in completion order; the fit must not depend on it
+    return baselines, SimpleNamespace(**{k: v[order] for k, v in columns.items()})
+
+
+# ─── Build / refresh ─────────────────────────────────────────────────────────
+def _save_model(bundle, version):
+    import joblib
+    settings.MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    path = settings.MODEL_DIR / f"transaction_scores-{version}.joblib"
+    tmp = path.with_suffix(".tmp")
+    joblib.dump(bundle, tmp)
+    os.replace(tmp, path)
+    files = sorted(settings.MODEL_DIR.glob("transaction_scores-*.joblib"), key=lambda p: p.stat().st_mtime)
+    for old in files[:-settings.MODEL_KEEP]:
+        old.unlink(missing_ok=True)
+    return path
+
+
+def _write(conn, table, results, commit_each=False):
+    n = 0
+    for ids, scores, reasons in results:
+        conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?)",
+                         zip(ids.tolist(), scores.tolist(), reasons.tolist()))
+        n += len(ids)
+        if commit_each:         # keeps the WAL small; nothing reads the table being built
+            conn.commit()
+    return n
+
+
+def _record(conn, row_count, max_id, model_path, started):
+    conn.execute("""INSERT OR REPLACE INTO transaction_scores_state
+                    (id, row_count, max_id, model, scored_at, seconds, updates) VALUES (1, ?, ?, ?, ?, ?, ?)""",
+                 (row_count, max_id, model_path.name, time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  round(time.perf_counter() - started, 3), update_count(conn, "transactions")))
+
+
+def rebuild_scores(db_path, workers=None, chunk_rows=None):
+    """Fit on the whole table and score every row; returns rows scored."""
+    started = time.perf_counter()
+    conn = sqlite3.connect(str(db_path))
+    runner = _Runner(db_path, workers or settings.TXN_SCORE_WORKERS)
+    chunk_rows = chunk_rows or settings.TXN_SCORE_CHUNK_ROWS
+    try:
+        row_count, max_id = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(id), 0) FROM {FACT}").fetchone()
+        baselines, sample = fit_baselines(runner, max_id, row_count, chunk_rows)
+
+        # scikit-learn takes about a second to import; only fits pay for it
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+        f = features(sample, baselines)
+        x = np.column_stack([f[k] for k in FEATURES]) if len(sample.id) else np.zeros((1, len(FEATURES)))
+        scaler = StandardScaler().fit(x)
+        model = IsolationForest(n_estimators=100, contamination=CONTAMINATION, random_state=42,
+                                n_jobs=1).fit(scaler.transform(x))
+        model_path = _save_model({"scaler": scaler, "model": model, "baselines": baselines},
+                                 f"{row_count}-{max_id}")
+
+        conn.execute("DROP TABLE IF EXISTS transaction_scores_next")
+        create_score_tables(conn, "transaction_scores_next")
+        n = _write(conn, "transaction_scores_next",
+                   runner.map(score_part, _ranges(0, max_id, chunk_rows), str(model_path)), commit_each=True)
+        conn.commit()
+        # swap in one transaction (sqlite3 opens none implicitly for DDL); readers see the old scores until it commits
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DROP TABLE IF EXISTS transaction_scores")
+        conn.execute("ALTER TABLE transaction_scores_next RENAME TO transaction_scores")
+        conn.execute(SCORE_INDEX)
+        _record(conn, row_count, max_id, model_path, started)
+        conn.commit()
+        print(f"[DEBUG] Transaction scores rebuilt: {n} rows in {round(time.perf_counter() - started, 1)}s")
+        return n
+    finally:
+        runner.close()
+        conn.close()
+
+
+def refresh_scores(db_path, workers=None, chunk_rows=None):
+    """Score appended transactions with the stored model, or rebuild if rows
+    were deleted or updated in place (migration 4's update counter) or the
+    model is gone.
+
+    Returns 'fresh', 'appended' or 'rebuilt'.
+    """
+    conn = sqlite3.connect(str(db_path))
+    try:
+        create_score_tables(conn)
+        count, max_id = conn.execute(f"SELECT COUNT(*), IFNULL(MAX(id), 0) FROM {FACT}").fetchone()
+        updates = update_count(conn, "transactions")
+        state = conn.execute("SELECT row_count, max_id, model, updates FROM transaction_scores_state").fetchone()
+        if state and (state[0], state[1], state[3]) == (count, max_id, updates):
+            return "fresh"
+        model_path = settings.MODEL_DIR / state[2] if state else None
+        if state and state[3] == updates and max_id > state[1] and model_path.exists():
+            new_rows = conn.execute(f"SELECT COUNT(*) FROM {FACT} WHERE id > ?", (state[1],)).fetchone()[0]
+            if state[0] + new_rows == count:
+                started = time.perf_counter()
+                runner = _Runner(db_path, workers or settings.TXN_SCORE_WORKERS)
+                try:
+                    _write(conn, "transaction_scores", runner.map(
+                        score_part, _ranges(state[1], max_id, chunk_rows or settings.TXN_SCORE_CHUNK_ROWS),
+                        str(model_path)))
+                finally:
+                    runner.close()
+                conn.execute(SCORE_INDEX)
+                _record(conn, count, max_id, model_path, started)
+                conn.commit()
+                return "appended"
+    finally:
+        conn.close()
+    rebuild_scores(db_path, workers, chunk_rows)
+    return "rebuilt"
+
+
+# ─── Background refresh ──────────────────────────────────────────────────────
+class ScoringJob:
+    """Keeps transaction_scores current from a daemon thread, polling like ModelStore."""
+
+    def __init__(self, db_path=None, interval=None):
+        self.db_path = db_path or settings.DB_PATH
+        self.interval = interval or settings.MODEL_REFIT_INTERVAL
+        self.running = False
+        self.last_action = None
+        self.last_error = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _run(self):
+        while True:
+            self.running = True
+            try:
+                self.last_action = refresh_scores(self.db_path)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[DEBUG] Transaction scoring failed: {e}")
+            self.running = False
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        """Start polling (once); never from a pool worker re-importing the app."""
+        if multiprocessing.parent_process() is not None:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="transaction-scores", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def status(self, conn):
+        state = conn.execute("SELECT row_count, max_id, model, scored_at, seconds FROM transaction_scores_state"
+                             ).fetchone() if _exists(conn, "transaction_scores_state") else None
+        return {"scored_rows": state[0] if state else 0, "scored_max_id": state[1] if state else None,
+                "model": state[2] if state else None, "scored_at": state[3] if state else None,
+                "seconds": state[4] if state else None, "running": self.running,
+                "last_action": self.last_action, "last_error": self.last_error}
+
+
+# ─── Reads ───────────────────────────────────────────────────────────────────
+def _exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+
+
+def reason_labels(bits):
+    return [label for bit, _, label in REASONS if bits & bit]
+
+
+def top_flagged(conn, limit=50, department_id=None):
+    """Flagged transactions (score > 0), highest score first, with supplier and
+    department names; empty until the first build."""
+    import metrics          # the API's query timing; not needed by the scoring workers
+    if not _exists(conn, "transaction_scores"):
+        return pd.DataFrame()
+    frame = metrics.read_sql(conn, f"""
+        SELECT t.id, t.transaction_date, t.document_number, t.amount, t.description,
+               t.scoa_code, t.scoa_description, s.supplier_name, d.name as department,
+               sc.score, sc.reasons
+        FROM transaction_scores sc
+        JOIN transactions t ON t.id = sc.transaction_id
+        LEFT JOIN suppliers s ON s.id = t.supplier_id
+        LEFT JOIN departments d ON d.id = t.department_id
+        WHERE sc.score > 0 {"AND t.department_id = ?" if department_id else ""}
+        ORDER BY sc.score DESC LIMIT ?
+    """, ([department_id] if department_id else []) + [limit])
+    return frame.astype(object).where(frame.notna(), None)     # NULL columns as None, not NaN
+
+
+def flagged_count(conn, department_id=None):
+    if not _exists(conn, "transaction_scores"):
+        return 0
+    if department_id:
+        return conn.execute(f"""
+            SELECT COUNT(*) FROM transaction_scores sc JOIN {FACT} t ON t.id = sc.transaction_id
+            WHERE sc.score > 0 AND t.department_id = ?""", (department_id,)).fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM transaction_scores WHERE score > 0").fetchone()[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score every transaction for anomalies.")
+    parser.add_argument("command", choices=["rebuild", "refresh", "top"])
+    parser.add_argument("--db", default=str(settings.DB_PATH), help="SQLite database path")
+    parser.add_argument("--workers", type=int, help=f"scoring processes (default {settings.TXN_SCORE_WORKERS})")
+    parser.add_argument("--chunk-rows", type=int, help=f"rows per chunk (default {settings.TXN_SCORE_CHUNK_ROWS})")
+    parser.add_argument("--limit", type=int, default=20, help="top: rows to show")
+    args = parser.parse_args(argv)
+
+    if args.command == "rebuild":
+        rebuild_scores(args.db, args.workers, args.chunk_rows)
+    elif args.command == "refresh":
+        print(refresh_scores(args.db, args.workers, args.chunk_rows))
+    else:
+        conn = sqlite3.connect(args.db)
+        for r in top_flagged(conn, args.limit).to_dict('records'):
+            print(f"  {r['score']:.3f}  #{r['id']} {r['transaction_date']} R{r['amount']:,.2f} "
+                  f"{r['supplier_name']}: {'; '.join(reason_labels(r['reasons'])) or 'Unusual combination'}")
+        print(f"{flagged_count(conn)} flagged transactions.")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
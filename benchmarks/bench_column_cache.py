@@ -0,0 +1,122 @@
+"""Memory and startup of N worker processes on the columnar engine, per column cache mode.
+
+    python benchmarks/bench_column_cache.py [--scale default] [--workers 4] [--out bench_column_cache.json]
+
+Builds (or reuses, see bench_endpoints.py) the database for --scale, then for
+GPG_COLUMN_CACHE=process and =shared starts --workers fresh processes (spawned,
+like uvicorn workers) that each get the engine and answer overview, maverick
+and suppliers once. The shared run starts from an empty cache directory, so
+one of its workers runs the loader while the others wait and attach;
+shared-warm starts again with that generation published.
+Per mode it reports
+
+  ready_s    slowest worker's get_engine() time for its first engine
+  rss_mb     summed resident set of the workers
+  pss_mb     summed proportional set size: shared pages are split between the
+             processes mapping them, so this is what the workers cost the host
+  engine_mb  summed PSS growth of the workers over their post-import baseline
+
+Linux only (reads /proc/self/smaps_rollup).
+"""
+import argparse
+import contextlib
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_endpoints import SCALES, build_database, git_commit  # noqa: E402
+
+# name: (GPG_COLUMN_CACHE, whether the run finds the generation already published)
+MODES = {"process": ("process", False), "shared": ("shared", False), "shared-warm": ("shared", True)}
+
+
+def memory_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                fields[parts[0][:-1].lower()] = int(parts[1])
+    return fields
+
+
+def worker(db_path, start, ready, results):
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    with contextlib.redirect_stdout(sys.stderr):
+        import columnar
+        baseline = memory_kb()
+        start.wait()
+        began = time.perf_counter()
+        engine = columnar.get_engine(db_path)
+        seconds = time.perf_counter() - began
+        for department_id in (None, 3):
+            engine.overview_facts(department_id)
+            engine.maverick_facts(department_id)
+            engine.supplier_facts(department_id)
+    ready.wait()                    # measure while every worker still holds its engine
+    results.put({"ready_s": seconds, "baseline": baseline, "loaded": memory_kb()})
+    ready.wait()
+
+
+def measure(db_path, mode, n, cache_dir):
+    os.environ.update(GPG_DB_PATH=str(db_path), GPG_ANALYTICS_ENGINE="columnar",
+                      GPG_COLUMN_CACHE=mode, GPG_COLUMN_CACHE_DIR=cache_dir)
+    ctx = multiprocessing.get_context("spawn")
+    start, ready, results = ctx.Barrier(n + 1), ctx.Barrier(n), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(str(db_path), start, ready, results)) for _ in range(n)]
+    for p in procs:
+        p.start()
+    start.wait()
+    rows = [results.get(timeout=600) for _ in procs]
+    for p in procs:
+        p.join()
+    mb = lambda kb: round(kb / 1024, 1)
+    return {"ready_s": round(max(r["ready_s"] for r in rows), 3),
+            "rss_mb": mb(sum(r["loaded"]["rss"] for r in rows)),
+            "pss_mb": mb(sum(r["loaded"]["pss"] for r in rows)),
+            "engine_mb": mb(sum(r["loaded"]["pss"] - r["baseline"]["pss"] for r in rows))}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="default", choices=list(SCALES))
+    parser.add_argument("--workers", type=int, default=4, help="worker processes per mode")
+    parser.add_argument("--out", default="bench_column_cache.json")
+    parser.add_argument("--data-dir", default=str(ROOT / "database" / "bench"))
+    args = parser.parse_args(argv)
+
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    path, build_seconds = build_database(args.scale, args.data_dir, False, None)
+    print(f"[{args.scale}] {path}" + (f" built in {build_seconds}s" if build_seconds else " (reused)"),
+          file=sys.stderr)
+    cache_dir = tempfile.mkdtemp(prefix="column-cache-")
+    try:
+        results = {}
+        for name, (mode, warm) in MODES.items():
+            if not warm:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            results[name] = measure(path, mode, args.workers, cache_dir)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    report = {"meta": {"commit": git_commit(), "scale": args.scale, "workers": args.workers,
+                       "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "modes": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"{'mode':<13}{'ready':>10}{'rss':>12}{'pss':>12}{'engine':>12}")
+    for mode, r in results.items():
+        print(f"{mode:<13}{r['ready_s']:>9.2f}s{r['rss_mb']:>10.1f}MB{r['pss_mb']:>10.1f}MB"
+              f"{r['engine_mb']:>10.1f}MB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Latency, peak RSS and pages read per API endpoint across dataset scales.
+
+    python benchmarks/bench_endpoints.py run [--scales render,default,5m] [--out results.json]
+    python benchmarks/bench_endpoints.py compare before.json after.json [--threshold 10]
+
+`run` builds one database per scale with data.generate_data.generate_all_data
+(vectorized; reused from --data-dir on later runs unless --rebuild), then
+measures it in a fresh interpreter: the API is imported against that database
+(GPG_DB_PATH) and every endpoint is called in-process through the ASGI app,
+with and without department_id, --repeat times after one warm-up call. The
+response cache is off and mmap is disabled so every page SQLite reads goes
+through read() and shows up in /proc/self/io (Linux; null elsewhere).
+
+`compare` flags endpoints whose p50 or p95 grew by more than --threshold
+percent (and more than --min-ms) and exits 1 if any did.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# name: (transactions, purchase orders, suppliers)
+SCALES = {
+    "render": (5_000, 1_000, 100),          # the free-tier auto-generated database
+    "default": (510_000, 82_000, 2_100),
+    "5m": (5_000_000, 820_000, 2_100),
+}
+
+DEPARTMENT_ID = 1
+SUPPLIER_ID = 17
+# path, whether it takes department_id
+ENDPOINTS = [
+    ("/api/departments", False),
+    ("/api/overview", True),
+    ("/api/maverick", True),
+    ("/api/maverick?limit=50", True),
+    ("/api/suppliers", True),
+    ("/api/suppliers?limit=50", True),
+    (f"/api/suppliers/{SUPPLIER_ID}/transactions", False),
+    ("/api/contracts", True),
+    ("/api/contracts?limit=50", True),
+    ("/api/contracts/expiring", False),
+    ("/api/personnel", False),
+    ("/api/anomalies", False),
+    ("/api/search?q=Ng", False),
+    ("/api/search?q=Theron", False),
+    ("/api/search?q=DOC-000123", False),
+]
+
+
+def endpoint_urls():
+    for path, by_department in ENDPOINTS:
+        yield path
+        if by_department:
+            yield f"{path}{'&' if '?' in path else '?'}department_id={DEPARTMENT_ID}"
+
+
+# ─── Process probes (Linux) ──────────────────────────────────────────────────
+def rchar():
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("rchar"))
+    except OSError:
+        return None
+
+
+def reset_peak_rss():
+    """Reset VmHWM so the next reading is the peak since now."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM"))
+        return round(kb / 1024, 1)
+    except (OSError, StopIteration):
+        import resource
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, round(q * (len(sorted_samples) - 1)))]
+
+
+# ─── Measurement (runs in a child interpreter per database) ─────────────────
+def measure(db_path, repeat):
+    os.environ.update(GPG_DB_PATH=str(db_path), GPG_RESPONSE_CACHE="0", GPG_DB_MMAP_SIZE="0",
+                      GPG_MODEL_DIR=str(Path(db_path).with_suffix("")) + "-models")
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    start = time.perf_counter()
+    import main as api
+    from fastapi.testclient import TestClient
+    startup = time.perf_counter() - start
+
+    with sqlite3.connect(str(db_path)) as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    results = {}
+    with TestClient(api.app) as client:
+        if not api.bootstrap.wait():
+            raise SystemExit(f"bootstrap failed: {api.bootstrap.error}")
+        bootstrap = api.bootstrap.status()
+        for url in endpoint_urls():
+            reset_peak_rss()
+            before = rchar()
+            first = time.perf_counter()
+            status = client.get(url).status_code
+            first_ms = (time.perf_counter() - first) * 1000
+            first_pages = (rchar() - before) / page_size if before is not None else None
+
+            samples, pages = [], []
+            for _ in range(repeat):
+                before = rchar()
+                t0 = time.perf_counter()
+                response = client.get(url)
+                samples.append((time.perf_counter() - t0) * 1000)
+                status = max(status, response.status_code)
+                if before is not None:
+                    pages.append((rchar() - before) / page_size)
+            samples.sort()
+            results[url] = {
+                "status": status,
+                "first_ms": round(first_ms, 3),
+                "p50_ms": round(statistics.median(samples), 3),
+                "p95_ms": round(percentile(samples, 0.95), 3),
+                "max_ms": round(samples[-1], 3),
+                "peak_rss_mb": peak_rss_mb(),
+                "first_pages_read": round(first_pages) if first_pages is not None else None,
+                "pages_read": round(statistics.mean(pages), 1) if pages else None,
+            }
+            print(f"  {url:<48}{results[url]['p50_ms']:>10.2f}ms{results[url]['p95_ms']:>10.2f}ms",
+                  file=sys.stderr)
+    return {"startup_seconds": round(startup, 2), "import_seconds": bootstrap["import_seconds"],
+            "bootstrap_seconds": bootstrap["bootstrap_seconds"], "page_size": page_size, "endpoints": results}
+
+
+# ─── Run ─────────────────────────────────────────────────────────────────────
+def build_database(scale, data_dir, rebuild, workers):
+    path = Path(data_dir) / f"{scale}.db"
+    if path.exists() and not rebuild:
+        return path, None
+    sys.path.insert(0, str(ROOT))
+    from data.generate_data import generate_all_data
+    transactions_n, po_n, supplier_n = SCALES[scale]
+    start = time.perf_counter()
+    generate_all_data(db_path=path, transactions_n=transactions_n, po_n=po_n, supplier_n=supplier_n,
+                      vectorized=True, workers=workers)
+    return path, round(time.perf_counter() - start, 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    scales = args.scales.split(",")
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        sys.exit(f"unknown scale(s) {', '.join(unknown)}; expected {', '.join(SCALES)}")
+    report = {"meta": {"commit": git_commit(), "python": platform.python_version(),
+                       "sqlite": sqlite3.sqlite_version, "platform": platform.platform(),
+                       "cpus": os.cpu_count(), "repeat": args.repeat,
+                       "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "scales": {}}
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    for scale in scales:
+        path, build_seconds = build_database(scale, args.data_dir, args.rebuild, args.workers)
+        print(f"[{scale}] {path}" + (f" built in {build_seconds}s" if build_seconds else " (reused)"),
+              file=sys.stderr)
+        child = subprocess.run([sys.executable, __file__, "_measure", "--db", str(path),
+                                "--repeat", str(args.repeat)], stdout=subprocess.PIPE, text=True)
+        if child.returncode:
+            sys.exit(f"[{scale}] measurement failed (exit {child.returncode})")
+        transactions_n, po_n, supplier_n = SCALES[scale]
+        report["scales"][scale] = {
+            "rows": {"transactions": transactions_n, "purchase_orders": po_n, "suppliers": supplier_n},
+            "db_bytes": path.stat().st_size, "build_seconds": build_seconds,
+            **json.loads(child.stdout),
+        }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Results written to {args.out}", file=sys.stderr)
+    return 0
+
+
+# ─── Compare ─────────────────────────────────────────────────────────────────
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)["scales"]
+    with open(args.after) as f:
+        after = json.load(f)["scales"]
+    limit = 1 + args.threshold / 100
+    regressions = 0
+    print(f"{'scale':<9}{'endpoint':<50}{'p50 before':>12}{'after':>10}{'p95 before':>12}{'after':>10}")
+    for scale in [s for s in before if s in after]:
+        old, new = before[scale]["endpoints"], after[scale]["endpoints"]
+        for url in [u for u in old if u in new]:
+            flags = [stat for stat in ("p50_ms", "p95_ms")
+                     if new[url][stat] > old[url][stat] * limit
+                     and new[url][stat] - old[url][stat] > args.min_ms]
+            regressions += bool(flags)
+            mark = "  REGRESSION " + ",".join(f[:3] for f in flags) if flags else ""
+            print(f"{scale:<9}{url:<50}{old[url]['p50_ms']:>12.2f}{new[url]['p50_ms']:>10.2f}"
+                  f"{old[url]['p95_ms']:>12.2f}{new[url]['p95_ms']:>10.2f}{mark}")
+    print(f"\n{regressions} regression(s) over {args.threshold:g}%" if regressions
+          else f"\nNo regressions over {args.threshold:g}%")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("run", help="build databases and measure every endpoint")
+    p.add_argument("--scales", default="render,default", help=f"comma-separated, of {', '.join(SCALES)}")
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--out", default="bench_endpoints.json")
+    p.add_argument("--data-dir", default=str(ROOT / "database" / "bench"))
+    p.add_argument("--rebuild", action="store_true", help="regenerate databases that already exist")
+    p.add_argument("--workers", type=int, help="generator processes (default: CPU count)")
+    p = commands.add_parser("compare", help="flag regressions between two result files")
+    p.add_argument("before")
+    p.add_argument("after")
+    p.add_argument("--threshold", type=float, default=10.0, help="percent slower that counts")
+    p.add_argument("--min-ms", type=float, default=0.5, help="ignore differences below this")
+    p = commands.add_parser("_measure")         # internal: one database, JSON on stdout
+    p.add_argument("--db", required=True)
+    p.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.command == "_measure":
+        with contextlib.redirect_stdout(sys.stderr):     # keep the API's logging off the JSON
+            result = measure(args.db, args.repeat)
+        json.dump(result, sys.stdout)
+        return 0
+    return run(args) if args.command == "run" else compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Parity check and per-request latency of the SQLite vs columnar analytics engines.
+
+    python benchmarks/bench_engines.py [--db PATH] [--repeat 20]
+
+Calls the overview/maverick/suppliers endpoint functions in-process with each
+engine, fails (exit 1) if any payload differs beyond float rounding, and prints
+p50/p95 latency per endpoint and department filter.
+"""
+import argparse
+import asyncio
+import math
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def payload_diff(a, b, path="", rel_tol=1e-9):
+    """Yield (path, a, b) for every difference between two JSON-like payloads."""
+    if isinstance(a, dict) and isinstance(b, dict):
+        for key in sorted(set(a) | set(b), key=str):
+            if key not in a or key not in b:
+                yield f"{path}/{key}", a.get(key), b.get(key)
+            else:
+                yield from payload_diff(a[key], b[key], f"{path}/{key}", rel_tol)
+    elif isinstance(a, list) and isinstance(b, list):
+        if len(a) != len(b):
+            yield f"{path}[len]", len(a), len(b)
+        for i, (x, y) in enumerate(zip(a, b)):
+            yield from payload_diff(x, y, f"{path}[{i}]", rel_tol)
+    elif isinstance(a, float) or isinstance(b, float):
+        if a is None or b is None or not math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-6):
+            yield path, a, b
+    elif a != b:
+        yield path, a, b
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return result, samples
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database to benchmark (default: the API's own)")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--departments", default="0,1,4", help="department ids to filter by, 0 = all")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["GPG_DB_PATH"] = args.db
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    import main as api
+    import settings
+    from columnar import get_engine
+
+    api.bootstrap.start()               # no app lifespan here, so run the startup steps ourselves
+    if not api.bootstrap.wait():
+        raise SystemExit(f"bootstrap failed: {api.bootstrap.error}")
+
+    start = time.perf_counter()
+    get_engine(api.DB_PATH)
+    print(f"Columnar engine load: {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    endpoints = {"overview": api.overview, "maverick": api.maverick, "suppliers": api.suppliers}
+    failures = 0
+    print(f"{'endpoint':<24}{'sqlite p50':>12}{'p95':>9}{'columnar p50':>15}{'p95':>9}{'speedup':>9}")
+    for name, fn in endpoints.items():
+        for dept in [int(d) or None for d in args.departments.split(",")]:
+            results, stats = {}, {}
+            for engine in ("sqlite", "columnar"):
+                settings.ANALYTICS_ENGINE = engine
+                results[engine], samples = timed(lambda: asyncio.run(fn(department_id=dept)), args.repeat)
+                samples.sort()
+                stats[engine] = (statistics.median(samples), samples[int(0.95 * (len(samples) - 1))])
+            diffs = list(payload_diff(results["sqlite"], results["columnar"]))
+            failures += bool(diffs)
+            for path, a, b in diffs[:5]:
+                print(f"  MISMATCH {name} dept={dept} {path}: sqlite={a!r} columnar={b!r}")
+            label = f"{name}?department_id={dept}" if dept else name
+            (s50, s95), (c50, c95) = stats["sqlite"], stats["columnar"]
+            print(f"{label:<24}{s50:>10.2f}ms{s95:>7.2f}ms{c50:>13.2f}ms{c95:>7.2f}ms{s50 / c50:>8.1f}x")
+
+    print("\nParity OK" if not failures else f"\n{failures} payload(s) differ")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
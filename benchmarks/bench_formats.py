@@ -0,0 +1,113 @@
+"""Encode time and payload size of the records, columnar and arrays formats.
+
+    python benchmarks/bench_formats.py [--scale default] [--repeat 20] [--out bench_formats.json]
+
+Builds (or reuses, see bench_endpoints.py) the database for --scale and calls
+/api/contracts and /api/maverick in-process with each ?format=, the response
+cache off. Per endpoint and format it reports
+
+  encode_ms   payload -> body: jsonable_encoder + json.dumps for records (what
+              FastAPI does with a returned dict), orjson from the DataFrames'
+              arrays for columnar/arrays; the endpoint's queries are excluded
+  total_ms    the whole request through the ASGI app
+  bytes       response body size
+"""
+import argparse
+import contextlib
+import inspect
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_endpoints import SCALES, build_database, git_commit, percentile  # noqa: E402
+
+# url: endpoint function in main.py
+ENDPOINTS = {"/api/contracts": "contracts", "/api/maverick": "maverick"}
+FORMATS = ("records", "columnar", "arrays")
+
+
+def timings(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return result, {"p50_ms": round(statistics.median(samples), 3), "p95_ms": round(percentile(samples, 0.95), 3)}
+
+
+def measure(db_path, repeat):
+    os.environ.update(GPG_DB_PATH=str(db_path), GPG_RESPONSE_CACHE="0",
+                      GPG_MODEL_DIR=str(Path(db_path).with_suffix("")) + "-models")
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    import main as api
+    import response_format
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+
+    results = {}
+    with TestClient(api.app) as client:
+        if not api.bootstrap.wait():
+            raise SystemExit(f"bootstrap failed: {api.bootstrap.error}")
+        for url, name in ENDPOINTS.items():
+            endpoint = getattr(api, name).__wrapped__         # the blocking function behind @offload
+            results[url] = {}
+            for fmt in FORMATS:
+                token = response_format.current_format.set(fmt)
+                try:
+                    content = endpoint(**{p: None for p in inspect.signature(endpoint).parameters})
+                    encode = ((lambda: response_format.APIResponse(jsonable_encoder(content)).body)
+                              if fmt == "records" else (lambda: response_format.APIResponse(content).body))
+                    body, encoded = timings(encode, repeat)
+                finally:
+                    response_format.current_format.reset(token)
+                client.get(f"{url}?format={fmt}")               # warm-up
+                response, total = timings(lambda: client.get(f"{url}?format={fmt}"), repeat)
+                if response.status_code != 200 or len(response.content) != len(body):
+                    raise SystemExit(f"{url}?format={fmt}: status {response.status_code}, "
+                                     f"{len(response.content)} bytes served vs {len(body)} encoded")
+                results[url][fmt] = {"encode_p50_ms": encoded["p50_ms"], "encode_p95_ms": encoded["p95_ms"],
+                                     "total_p50_ms": total["p50_ms"], "total_p95_ms": total["p95_ms"],
+                                     "bytes": len(body)}
+                print(f"  {url:<18}{fmt:<10}{encoded['p50_ms']:>10.2f}ms{total['p50_ms']:>10.2f}ms"
+                      f"{len(body):>12,} B", file=sys.stderr)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="default", choices=list(SCALES))
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--out", default="bench_formats.json")
+    parser.add_argument("--data-dir", default=str(ROOT / "database" / "bench"))
+    parser.add_argument("--workers", type=int, help="generator processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    path, build_seconds = build_database(args.scale, args.data_dir, False, args.workers)
+    print(f"[{args.scale}] {path}" + (f" built in {build_seconds}s" if build_seconds else " (reused)"),
+          file=sys.stderr)
+    with contextlib.redirect_stdout(sys.stderr):          # keep the API's logging out of the way
+        results = measure(path, args.repeat)
+    report = {"meta": {"commit": git_commit(), "scale": args.scale, "repeat": args.repeat,
+                       "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "endpoints": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"{'endpoint':<18}{'format':<10}{'encode p50':>12}{'vs records':>12}{'bytes':>12}{'vs records':>12}")
+    for url, formats in results.items():
+        base = formats["records"]
+        for fmt, r in formats.items():
+            print(f"{url:<18}{fmt:<10}{r['encode_p50_ms']:>10.2f}ms{r['encode_p50_ms'] / base['encode_p50_ms']:>11.2f}x"
+                  f"{r['bytes']:>12,}{r['bytes'] / base['bytes']:>11.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
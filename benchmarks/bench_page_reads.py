@@ -0,0 +1,232 @@
+"""Statements, VM steps and database pages read per overview/maverick request,
+per-statement SQL facts vs the single-scan planner.
+
+    python benchmarks/bench_page_reads.py [--db PATH] [--departments 0,1,4]
+
+Runs with one pooled connection, mmap disabled and a minimal page cache, so
+every page SQLite needs is fetched with a read() and shows up in the process'
+rchar counter (/proc/self/io, Linux only; reported as n/a elsewhere). Fails
+(exit 1) if the planner's payload differs from the reference.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_engines import payload_diff
+
+
+# ─── Reference: the per-statement SQL facts the planner replaced ─────────────
+def overview_reference(api, department_id):
+    """Overview facts with one SQL statement per aggregate (the pre-planner path)."""
+    where_clause = "WHERE 1=1"
+    params = []
+    if department_id:
+        where_clause += " AND department_id = ?"
+        params.append(department_id)
+
+    facts = {}
+    with api.get_db() as conn:
+        c = conn.cursor()
+
+        # KPIs (answered from the rollups, see rollups.py)
+        total_spend, total_txns = c.execute(
+            f"SELECT SUM(total_amount), SUM(txn_count) FROM spend_by_dept_month_scoa {where_clause}", params
+        ).fetchone()
+        facts["total_spend"], facts["total_transactions"] = total_spend or 0, total_txns or 0
+        facts["total_purchase_orders"] = c.execute(
+            f"SELECT SUM(po_count) FROM po_by_dept_month_commodity {where_clause}", params
+        ).fetchone()[0] or 0
+
+    # Monthly spend trend
+    facts["monthly_trend"] = api.query_records(f"""
+        SELECT month, SUM(total_amount) as total, SUM(txn_count) as txn_count
+        FROM spend_by_dept_month_scoa {where_clause} GROUP BY month ORDER BY month
+    """, params)
+
+    # Spend by department (if no dept filter)
+    facts["department_spend"] = []
+    if not department_id:
+        facts["department_spend"] = api.query_records("""
+            SELECT d.name as department, SUM(r.total_amount) as total_spend,
+                   SUM(r.txn_count) as txn_count
+            FROM spend_by_dept_month_scoa r JOIN departments d ON r.department_id = d.id
+            GROUP BY d.name ORDER BY total_spend DESC
+        """)
+
+    # Spend by SCOA category
+    facts["scoa_spend"] = api.query_records(f"""
+        SELECT scoa_description as category, SUM(total_amount) as total
+        FROM spend_by_dept_month_scoa {where_clause} GROUP BY scoa_description ORDER BY total DESC
+    """, params)
+
+    # Top 20 supplier concentration (global only)
+    facts["supplier_concentration"] = []
+    if not department_id:
+        facts["supplier_concentration"] = api.query_records("""
+            SELECT s.id, s.supplier_name, SUM(r.total_amount) as total_spend, SUM(r.txn_count) as txn_count
+            FROM spend_by_dept_supplier r JOIN suppliers s ON r.supplier_id = s.id
+            GROUP BY s.id, s.supplier_name ORDER BY total_spend DESC LIMIT 20
+        """)
+    return facts
+
+
+def maverick_reference(api, department_id):
+    """Maverick facts with one SQL statement per aggregate (the pre-planner path)."""
+    where_clause = ""
+    params = []
+    if department_id:
+        where_clause = "WHERE po.department_id = ?"
+        params.append(department_id)
+
+    # Maverick = PO without contract_id. Aggregates come from the PO rollup
+    # (is_maverick flags contract_id IS NULL); only the PO list hits the raw table.
+    by_dept = []
+    if not department_id:
+        by_dept = api.query_records("""
+            SELECT d.name as department,
+                   SUM(po.po_count) as total_pos,
+                   SUM(CASE WHEN po.is_maverick THEN po.po_count ELSE 0 END) as maverick_pos,
+                   ROUND(SUM(CASE WHEN po.is_maverick THEN po.po_count ELSE 0 END) * 100.0 / SUM(po.po_count), 1) as maverick_pct,
+                   SUM(CASE WHEN po.is_maverick THEN po.total_value ELSE 0 END) as maverick_value,
+                   SUM(po.total_value) as total_value
+            FROM po_by_dept_month_commodity po
+            JOIN departments d ON po.department_id = d.id
+            GROUP BY d.name ORDER BY maverick_pct DESC
+        """)
+
+    # Monthly trend
+    monthly = api.query_records(f"""
+        SELECT month,
+               SUM(po_count) as total_pos,
+               SUM(CASE WHEN is_maverick THEN po_count ELSE 0 END) as maverick_pos,
+               ROUND(SUM(CASE WHEN is_maverick THEN po_count ELSE 0 END) * 100.0 / SUM(po_count), 1) as maverick_pct
+        FROM po_by_dept_month_commodity po {where_clause} GROUP BY month ORDER BY month
+    """, params)
+
+    overall = api.query_df(f"""
+        SELECT 
+            ROUND(SUM(CASE WHEN is_maverick THEN po_count ELSE 0 END) * 100.0 / SUM(po_count), 1) as pct,
+            SUM(CASE WHEN is_maverick THEN total_value ELSE 0 END) as val
+        FROM po_by_dept_month_commodity po {where_clause}
+    """, params).iloc[0]
+
+    # Category breakdown (Maverick only)
+    by_category = api.query_records(f"""
+        SELECT commodity_description as category, SUM(po_count) as count, SUM(total_value) as value
+        FROM po_by_dept_month_commodity po
+        WHERE is_maverick = 1 {"AND department_id = ?" if department_id else ""}
+        GROUP BY category ORDER BY value DESC LIMIT 10
+    """, params)
+
+    # Individual maverick POs with reason flags
+    pos_where = "WHERE po.contract_id IS NULL"
+    pos_params = []
+    if department_id:
+        pos_where += " AND po.department_id = ?"
+        pos_params.append(department_id)
+    maverick_pos = api.query_records(f"""
+        SELECT po.po_number, po.po_date, po.total_value,
+               s.supplier_name, d.name as department,
+               po.commodity_description as category,
+               CASE
+                   WHEN po.total_value > 500000 THEN 'Value exceeds threshold'
+                   ELSE 'No approved contract'
+               END as reason
+        FROM purchase_orders po
+        JOIN suppliers s ON po.supplier_id = s.id
+        JOIN departments d ON po.department_id = d.id
+        {pos_where} ORDER BY po.total_value DESC LIMIT 100
+    """, pos_params)
+
+    return {
+        "overall_maverick_pct": float(overall['pct'] or 0),
+        "total_maverick_value": float(overall['val'] or 0),
+        "by_department": by_dept,
+        "monthly_trend": monthly,
+        "by_category": by_category,
+        "maverick_pos": maverick_pos
+    }
+
+
+# ─── Measurement ─────────────────────────────────────────────────────────────
+def rchar():
+    try:
+        with open("/proc/self/io") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("rchar"))
+    except OSError:
+        return None
+
+
+def measure(conn, fn, page_size):
+    """Run fn() on the held connection; returns (result, statements, vm_steps, pages)."""
+    counts = {"statements": 0, "steps": 0}
+
+    def on_statement(sql):
+        counts["statements"] += 1
+
+    def on_progress():
+        counts["steps"] += 100
+
+    conn.set_trace_callback(on_statement)
+    conn.set_progress_handler(on_progress, 100)
+    before = rchar()
+    try:
+        result = fn()
+    finally:
+        after = rchar()
+        conn.set_trace_callback(None)
+        conn.set_progress_handler(None, 0)
+    pages = (after - before) / page_size if before is not None else None
+    return result, counts["statements"], counts["steps"], pages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="database to measure (default: the API's own)")
+    parser.add_argument("--departments", default="0,1,4", help="department ids to filter by, 0 = all")
+    args = parser.parse_args(argv)
+
+    if args.db:
+        os.environ["GPG_DB_PATH"] = args.db
+    os.environ.update(GPG_DB_POOL_SIZE="1", GPG_DB_MMAP_SIZE="0", GPG_DB_CACHE_SIZE_KB="1",
+                      GPG_ANALYTICS_ENGINE="sqlite", GPG_RESPONSE_CACHE="0")
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    import main as api
+    from db_pool import get_pool
+
+    api.bootstrap.start()               # no app lifespan here, so run the startup steps ourselves
+    if not api.bootstrap.wait():
+        raise SystemExit(f"bootstrap failed: {api.bootstrap.error}")
+
+    variants = {
+        "overview": (lambda dept: overview_reference(api, dept), api.FACTS_SQL["overview"]),
+        "maverick": (lambda dept: maverick_reference(api, dept), api.FACTS_SQL["maverick"]),
+    }
+    failures = 0
+    with get_pool(api.DB_PATH).connection() as conn:
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        print(f"{'request':<24}{'statements':>16}{'vm steps':>20}{'pages read':>20}")
+        print(f"{'':<24}{'before':>8}{'after':>8}{'before':>10}{'after':>10}{'before':>10}{'after':>10}")
+        for name, (reference, planned) in variants.items():
+            for dept in [int(d) or None for d in args.departments.split(",")]:
+                reference(dept)     # warm the OS page cache so both sides read the same way
+                ref, s0, v0, p0 = measure(conn, lambda: reference(dept), page_size)
+                new, s1, v1, p1 = measure(conn, lambda: planned(dept), page_size)
+                diffs = list(payload_diff(ref, new))
+                failures += bool(diffs)
+                for path, a, b in diffs[:5]:
+                    print(f"  MISMATCH {name} dept={dept} {path}: reference={a!r} planned={b!r}")
+                fmt = lambda p: "n/a" if p is None else f"{p:.0f}"
+                label = f"{name}?department_id={dept}" if dept else name
+                print(f"{label:<24}{s0:>8}{s1:>8}{v0:>10}{v1:>10}{fmt(p0):>10}{fmt(p1):>10}")
+
+    print("\nParity OK" if not failures else f"\n{failures} payload(s) differ")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
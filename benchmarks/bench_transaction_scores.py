@@ -0,0 +1,97 @@
+"""Throughput and peak memory of a full transaction scoring rebuild, per worker count.
+
+    python benchmarks/bench_transaction_scores.py [--scale default] [--workers 1,2,4] [--out bench_transaction_scores.json]
+
+Builds (or reuses, see bench_endpoints.py) the database for --scale, copies it
+to a temporary directory and migrates the copy to the star schema. Each
+--workers value then runs transaction_scores.rebuild_scores in a fresh
+process, so the numbers of one run do not leak into the next. Per run it reports
+
+  seconds         wall time of the rebuild (fit + score + swap)
+  rows_per_s      fact rows scored per second
+  peak_rss_mb     max resident set of the rebuilding process
+  worker_rss_mb   max resident set of any scoring worker (0 when in-process)
+  flagged         rows with score > 0
+
+Speed-ups need as many free cores as workers; os.cpu_count() is in the report.
+"""
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_endpoints import SCALES, build_database, git_commit  # noqa: E402
+
+
+def rebuild(db_path, workers, chunk_rows):
+    """Child process: one rebuild, the result as JSON on stdout."""
+    sys.path[:0] = [str(ROOT / "backend"), str(ROOT)]
+    with contextlib.redirect_stdout(sys.stderr):
+        import transaction_scores
+        started = time.perf_counter()
+        rows = transaction_scores.rebuild_scores(db_path, workers, chunk_rows)
+        seconds = time.perf_counter() - started
+    with sqlite3.connect(db_path) as conn:
+        flagged = transaction_scores.flagged_count(conn)
+    kb = lambda who: resource.getrusage(who).ru_maxrss
+    print(json.dumps({"rows": rows, "seconds": round(seconds, 3), "rows_per_s": round(rows / seconds),
+                      "peak_rss_mb": round(kb(resource.RUSAGE_SELF) / 1024, 1),
+                      "worker_rss_mb": round(kb(resource.RUSAGE_CHILDREN) / 1024, 1), "flagged": flagged}))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="default", choices=list(SCALES))
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--chunk-rows", type=int, default=100_000)
+    parser.add_argument("--out", default="bench_transaction_scores.json")
+    parser.add_argument("--data-dir", default=str(ROOT / "database" / "bench"))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        return rebuild(args.child, int(args.workers), args.chunk_rows)
+
+    Path(args.data_dir).mkdir(parents=True, exist_ok=True)
+    path, build_seconds = build_database(args.scale, args.data_dir, False, None)
+    print(f"[{args.scale}] {path}" + (f" built in {build_seconds}s" if build_seconds else " (reused)"),
+          file=sys.stderr)
+    work = tempfile.mkdtemp(prefix="txn-scores-")
+    results = {}
+    try:
+        db_path = os.path.join(work, "bench.db")
+        shutil.copy(path, db_path)
+        env = dict(os.environ, GPG_DB_PATH=db_path, GPG_MODEL_DIR=os.path.join(work, "models"))
+        subprocess.run([sys.executable, "-c", f"import migrations; migrations.ensure_migrations({db_path!r})"],
+                       cwd=ROOT / "backend", env=env, stdout=sys.stderr, check=True)
+        for workers in (int(w) for w in args.workers.split(",")):
+            out = subprocess.run([sys.executable, __file__, "--child", db_path, "--workers", str(workers),
+                                  "--chunk-rows", str(args.chunk_rows)],
+                                 env=env, stdout=subprocess.PIPE, check=True, text=True).stdout
+            results[workers] = json.loads(out.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    report = {"meta": {"commit": git_commit(), "scale": args.scale, "cpus": os.cpu_count(),
+                       "chunk_rows": args.chunk_rows, "started": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "workers": results}
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"{'workers':<9}{'rows':>10}{'seconds':>10}{'rows/s':>10}{'peak rss':>12}{'worker rss':>12}{'flagged':>9}")
+    for workers, r in results.items():
+        print(f"{workers:<9}{r['rows']:>10,}{r['seconds']:>9.2f}s{r['rows_per_s']:>10,}"
+              f"{r['peak_rss_mb']:>10.1f}MB{r['worker_rss_mb']:>10.1f}MB{r['flagged']:>9,}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+"""Concurrent load test replaying dashboard page sessions against a live server.
+
+    python benchmarks/load_test.py --spawn [--workers 2] --users 1,10,50 --duration 30
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 25 --out load.json
+
+Each simulated user logs in, then browses pages the way frontend/src/pages/*
+fetch them: Contracts fetches contracts and expiring contracts in parallel,
+Overview drills down into a top supplier's transactions, the search box fires
+after each typing pause (300 ms debounce, as in Dashboard.jsx), and switching
+the department re-fetches the current page with department_id. Users keep up to
+six keep-alive connections (like a browser) and revalidate with If-None-Match,
+so 304s count as successes.
+
+For every step of --users, it reports throughput, latency percentiles and error
+rates per endpoint (503s from reader admission control are counted separately),
+and the step at which throughput stopped growing. The HTTP client is a small
+HTTP/1.1 implementation on asyncio streams, so nothing beyond the backend's own
+requirements is needed.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MAX_CONNECTIONS = 6             # per user, like a browser per host
+DEBOUNCE = 0.3                  # Dashboard.jsx search debounce, seconds
+SEARCH_TERMS = ["Ngwenya", "Theron", "Medical", "CT-06", "PO-00012", "DOC-0001", "Cleaning", "Holdings"]
+
+# page: relative weight of visits
+PAGES = {"overview": 5, "maverick": 2, "suppliers": 2, "contracts": 2, "anomalies": 1, "search": 3}
+
+
+# ─── HTTP/1.1 client ─────────────────────────────────────────────────────────
+class Connection:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=(), body=b""):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        head += [f"{k}: {v}" for k, v in headers]
+        if body:
+            head.append(f"Content-Length: {len(body)}")
+        self.writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            response_headers[key.strip().lower()] = value.strip()
+        if "content-length" in response_headers:
+            payload = await self.reader.readexactly(int(response_headers["content-length"]))
+        elif response_headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                chunks.append(chunk[:-2])
+            payload = b"".join(chunks)
+        else:
+            payload = b""
+        if response_headers.get("connection") == "close":
+            self.close()
+        return status, response_headers, payload
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+# ─── Simulated users ─────────────────────────────────────────────────────────
+def endpoint_of(path):
+    """Group URLs by route: ids become {id}, query values are dropped."""
+    route, _, query = path.partition("?")
+    route = re.sub(r"/\d+(?=/|$)", "/{id}", route)
+    keys = sorted(k.split("=")[0] for k in query.split("&") if k)
+    return route + ("?" + "&".join(keys) if keys else "")
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+
+    def report(self, elapsed):
+        endpoints = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies[endpoint])
+            statuses = self.statuses[endpoint]
+            total = len(samples) + self.errors[endpoint]
+            failed = self.errors[endpoint] + sum(n for s, n in statuses.items() if s >= 400 and s != 503)
+            pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 2) if samples else None
+            endpoints[endpoint] = {
+                "requests": total, "rps": round(total / elapsed, 2),
+                "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99),
+                "max_ms": round(samples[-1], 2) if samples else None,
+                "error_rate": round(failed / total, 4) if total else 0.0,
+                "rejected_503": statuses.get(503, 0), "not_modified": statuses.get(304, 0),
+            }
+        all_samples = sorted(x for v in self.latencies.values() for x in v)
+        requests = sum(v["requests"] for v in endpoints.values())
+        return {
+            "requests": requests, "rps": round(requests / elapsed, 2),
+            "p50_ms": round(statistics.median(all_samples), 2) if all_samples else None,
+            "p95_ms": round(all_samples[int(0.95 * (len(all_samples) - 1))], 2) if all_samples else None,
+            "p99_ms": round(all_samples[int(0.99 * (len(all_samples) - 1))], 2) if all_samples else None,
+            "error_rate": round(sum(v["error_rate"] * v["requests"] for v in endpoints.values())
+                                / requests, 4) if requests else 0.0,
+            "rejected_503": sum(v["rejected_503"] for v in endpoints.values()),
+            "endpoints": endpoints,
+        }
+
+
+class User:
+    def __init__(self, host, port, stats, rng, departments, think, etags=True):
+        self.host, self.port = host, port
+        self.stats, self.rng = stats, rng
+        self.departments = departments
+        self.think = think
+        self.etags = {} if etags else None
+        self.idle = []
+        self.slots = asyncio.Semaphore(MAX_CONNECTIONS)
+        self.dept = None
+
+    async def fetch(self, path, method="GET", body=b""):
+        """One request on a pooled connection; returns parsed JSON or None."""
+        async with self.slots:
+            conn = self.idle.pop() if self.idle else Connection(self.host, self.port)
+            headers = [("Accept", "application/json")]
+            if body:
+                headers.append(("Content-Type", "application/json"))
+            cached = self.etags.get(path) if self.etags is not None and method == "GET" else None
+            if cached:
+                headers.append(("If-None-Match", cached[0]))
+            endpoint = endpoint_of(path)
+            start = time.perf_counter()
+            try:
+                status, response_headers, payload = await conn.request(method, path, headers, body)
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+                conn.close()
+                self.stats.errors[endpoint] += 1
+                return None
+            self.stats.latencies[endpoint].append((time.perf_counter() - start) * 1000)
+            self.stats.statuses[endpoint][status] += 1
+            self.idle.append(conn)
+        if status == 304 and cached:
+            return cached[1]
+        if status != 200:
+            return None
+        data = json.loads(payload)
+        if self.etags is not None and "etag" in response_headers:
+            self.etags[path] = (response_headers["etag"], data)
+        return data
+
+    def _with_dept(self, path):
+        return f"{path}?department_id={self.dept}" if self.dept else path
+
+    # Page scripts, after frontend/src/pages/*.jsx
+    async def overview(self):
+        data = await self.fetch(self._with_dept("/api/overview"))
+        suppliers = (data or {}).get("supplier_concentration") or []
+        if suppliers and self.rng.random() < 0.5:           # click a supplier bar
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+            await self.fetch(f"/api/suppliers/{self.rng.choice(suppliers)['id']}/transactions")
+
+    async def maverick(self):
+        await self.fetch(self._with_dept("/api/maverick"))
+
+    async def suppliers(self):
+        await self.fetch(self._with_dept("/api/suppliers"))
+
+    async def contracts(self):
+        await asyncio.gather(self.fetch(self._with_dept("/api/contracts")),
+                             self.fetch("/api/contracts/expiring"))
+
+    async def anomalies(self):
+        await self.fetch("/api/anomalies")
+
+    async def search(self):
+        """Type a term; a request goes out whenever typing pauses for the debounce."""
+        term, pending = self.rng.choice(SEARCH_TERMS), None
+        for i in range(1, len(term) + 1):
+            pause = self.rng.uniform(0.08, 0.45)
+            if i > 1 and (pause >= DEBOUNCE or i == len(term)):
+                pending = asyncio.ensure_future(self.fetch(f"/api/search?q={quote(term[:i])}"))
+            await asyncio.sleep(pause)
+        if pending:
+            await pending
+
+    async def session(self, stop_at):
+        await self.fetch("/api/login", "POST", b'{"username": "loadtest", "password": "x"}')
+        await self.fetch("/api/departments")
+        page = "overview"
+        while time.monotonic() < stop_at:
+            await getattr(self, page)()
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+            if self.rng.random() < 0.2:                       # switch the department filter
+                self.dept = self.rng.choice([None] + self.departments)
+                continue                                      # the current page re-fetches
+            page = self.rng.choices(list(PAGES), weights=list(PAGES.values()))[0]
+
+    def close(self):
+        for conn in self.idle:
+            conn.close()
+
+
+async def run_step(host, port, users, duration, think, seed, departments, etags):
+    stats = Stats()
+    rng = random.Random(seed)
+    stop_at = time.monotonic() + duration
+    crowd = [User(host, port, stats, random.Random(rng.random()), departments, think, etags)
+             for _ in range(users)]
+
+    async def start(user, delay):
+        await asyncio.sleep(delay)                # spread logins over the first second
+        await user.session(stop_at)
+
+    start_time = time.monotonic()
+    await asyncio.gather(*(start(u, rng.random()) for u in crowd))
+    elapsed = time.monotonic() - start_time
+    for user in crowd:
+        user.close()
+    return stats.report(elapsed)
+
+
+# ─── Server management ───────────────────────────────────────────────────────
+async def wait_ready(host, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        conn = Connection(host, port)
+        try:
+            status, _, _ = await conn.request("GET", "/api/ready")
+            if status == 200:
+                return
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        finally:
+            conn.close()
+        await asyncio.sleep(0.5)
+    raise SystemExit(f"server on {host}:{port} not ready after {timeout}s")
+
+
+def spawn_server(port, workers):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                            cwd=ROOT, env=env)
+
+
+async def fetch_departments(host, port):
+    conn = Connection(host, port)
+    try:
+        _, _, payload = await conn.request("GET", "/api/departments")
+        return [d["id"] for d in json.loads(payload)]
+    finally:
+        conn.close()
+
+
+def print_step(users, report):
+    print(f"\n{users} users: {report['requests']} requests, {report['rps']} req/s, "
+          f"p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms, "
+          f"errors {report['error_rate']:.2%}, 503s {report['rejected_503']}")
+    print(f"  {'endpoint':<44}{'req':>7}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'err':>7}{'503':>6}")
+    for endpoint, e in report["endpoints"].items():
+        fmt = lambda v: "-" if v is None else f"{v:.1f}"
+        print(f"  {endpoint:<44}{e['requests']:>7}{e['rps']:>8.1f}{fmt(e['p50_ms']):>9}{fmt(e['p95_ms']):>9}"
+              f"{fmt(e['p99_ms']):>9}{fmt(e['max_ms']):>9}{e['error_rate']:>7.1%}{e['rejected_503']:>6}")
+
+
+def saturation_point(steps, gain=0.05):
+    """First user count whose throughput grew less than `gain` over the previous step."""
+    for (_, prev), (users, cur) in zip(steps, steps[1:]):
+        if cur["rps"] < prev["rps"] * (1 + gain):
+            return users
+    return None
+
+
+async def main_async(args):
+    target = urlsplit(args.url)
+    host, port = target.hostname, target.port or 80
+    server = spawn_server(port, args.workers) if args.spawn else None
+    try:
+        await wait_ready(host, port, args.startup_timeout)
+        departments = await fetch_departments(host, port)
+        steps = []
+        for users in [int(u) for u in args.users.split(",")]:
+            report = await run_step(host, port, users, args.duration, args.think, args.seed,
+                                    departments, not args.no_etag)
+            steps.append((users, report))
+            print_step(users, report)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    knee = saturation_point(steps)
+    if len(steps) > 1:
+        print(f"\nThroughput stopped growing at {knee} users." if knee
+              else "\nThroughput still growing at the last step.")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"url": args.url, "workers": args.workers if args.spawn else None,
+                       "duration": args.duration, "think": args.think, "saturated_at": knee,
+                       "steps": {str(users): report for users, report in steps}}, f, indent=1)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="server to load")
+    parser.add_argument("--spawn", action="store_true", help="start uvicorn on --url's port for the run")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers with --spawn")
+    parser.add_argument("--users", default="1,5,10,25,50", help="comma-separated concurrent user steps")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per step")
+    parser.add_argument("--think", type=float, default=1.0, help="mean seconds between page actions")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--no-etag", action="store_true", help="don't revalidate with If-None-Match")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--out", help="write the per-step reports as JSON")
+    return asyncio.run(main_async(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,12 @@
 """GPG Analytics Dashboard - Synthetic Data Generator
 Generates realistic government financial data for prototype demonstration.
 """
-import sqlite3, os, random, math
+import sqlite3, os, random, math, argparse, tempfile
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
+from types import SimpleNamespace
 
 random.seed(42)
 np.random.seed(42)
@@ -281,10 +283,12 @@ def gen_personnel(conn, dept_data):
         for _ in range(cnt):
             employees.append((eid, d[0], random.choice(JOB_TITLES)))
             eid += 1
-    rows = []
+    # one month of rows at a time (same draws, same order as building them all first)
+    n_rows = 0
     for mo in range(MONTHS):
         dt = START_DATE + timedelta(days=mo*30)
         period = dt.strftime('%Y-%m-%d')
+        rows = []
         for emp_id, dept_id, (title, level, base) in employees:
             sal = round(base * random.uniform(0.9, 1.15), 2)
             ot = round(sal * random.uniform(0, 0.25), 2) if random.random() < 0.3 else 0
@@ -294,20 +298,148 @@ def gen_personnel(conn, dept_data):
             total = sal + ot + housing + transport + med
             rows.append((period, dept_id, f"EMP-{emp_id:05d}", title, level,
                 sal, ot, housing, transport, med, round(total, 2)))
-    BS = 20000
-    for s in range(0, len(rows), BS):
-        e = min(s+BS, len(rows))
         conn.executemany('''INSERT INTO personnel_costs (period_date,department_id,
             employee_number,job_title,salary_level,basic_salary,overtime,
             housing_allowance,transport_allowance,medical_aid,total_cost)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?)''', rows[s:e])
-        print(f"    {e:,} / {len(rows):,}")
+            VALUES (?,?,?,?,?,?,?,?,?,?,?)''', rows)
+        n_rows += len(rows)
+        print(f"    {n_rows:,} / {MONTHS * len(employees):,}")
     conn.commit()
-    return len(rows)
+    return n_rows
+
+# ─── Vectorized, sharded generators ─────────────────────────────────────────
+# Fact rows are drawn as whole NumPy column batches from one Generator per
+# (seed, table, shard) and written by worker processes into per-shard SQLite
+# files, which the parent appends in shard order. Output depends only on the
+# seed and shard layout, never on the number of workers.
+SHARD_ROWS = 1_000_000     # default rows per shard
+BATCH_ROWS = 100_000       # rows per column batch inside a shard
+
+_DAYS = [START_DATE + timedelta(days=d) for d in range(TOTAL_DAYS + 91)]  # + max delivery lag
+DAY_STR = np.array([d.strftime('%Y-%m-%d') for d in _DAYS], dtype=object)
+DAY_FY = np.array([f"{d.year if d.month >= 4 else d.year-1}/{(d.year if d.month >= 4 else d.year-1)+1}"
+                   for d in _DAYS], dtype=object)
+DAY_FP = np.array([((d.month-4) % 12)+1 for d in _DAYS])
+DAY_MONTH = np.array([d.month for d in _DAYS])
+DAY_YEAR = np.array([d.year for d in _DAYS])
+DEPT_IDS = np.array([d[0] for d in DEPARTMENTS])
+DEPT_P = np.array([d[3] for d in DEPARTMENTS], dtype=float) / sum(d[3] for d in DEPARTMENTS)
+DOC_TYPES = np.array(['Payment Voucher', 'Journal Entry', 'Receipt'], dtype=object)
+PO_STATUSES = np.array(['Completed', 'In Progress', 'Cancelled'], dtype=object)
+SCOA_CODE_ARR = np.array([c for c, _ in SCOA_CODES], dtype=object)
+SCOA_DESC_ARR = np.array([d for _, d in SCOA_CODES], dtype=object)
+SCOA_PAYMENT_ARR = np.array([f"Payment: {d}" for _, d in SCOA_CODES], dtype=object)
+UNSPSC_CODE_ARR = np.array([c for c, _ in UNSPSC_CODES], dtype=object)
+UNSPSC_DESC_ARR = np.array([d for _, d in UNSPSC_CODES], dtype=object)
+
+FACT_COLUMNS = {
+    "transactions": ("transaction_date", "posting_date", "document_type", "document_number",
+                     "department_id", "supplier_id", "scoa_code", "scoa_description", "amount",
+                     "description", "fiscal_year", "fiscal_period"),
+    "purchase_orders": ("po_number", "po_date", "department_id", "supplier_id", "commodity_code",
+                        "commodity_description", "quantity", "unit_price", "total_value",
+                        "contract_id", "delivery_date", "status"),
+}
+TABLE_STREAMS = {"transactions": 1, "purchase_orders": 2}
+
+def _nullable(values, null_mask):
+    out = values.astype(object)
+    out[null_mask] = None
+    return out
+
+def txn_batch(rng, start, count, ctx):
+    """Column batch of transactions numbered start+1 .. start+count."""
+    days = rng.integers(0, TOTAL_DAYS+1, count)
+    depts = rng.choice(DEPT_IDS, size=count, p=DEPT_P)
+    supps = rng.choice(ctx.n_supp, size=count, p=ctx.supplier_p) + 1
+    amts = np.clip(np.round(np.abs(rng.lognormal(8.5, 1.8, count)), 2), 50, 50_000_000)
+    dtype_idx = rng.choice(3, size=count, p=[.6, .25, .15])
+    scoa = rng.integers(0, len(SCOA_CODES), count)
+    dates = DAY_STR[days]
+    return [dates, dates, DOC_TYPES[dtype_idx],
+            np.char.mod("DOC-%07d", np.arange(start+1, start+count+1)).astype(object),
+            depts, _nullable(supps, dtype_idx == 1),   # journal entries have no supplier
+            SCOA_CODE_ARR[scoa], SCOA_DESC_ARR[scoa], amts, SCOA_PAYMENT_ARR[scoa],
+            DAY_FY[days], DAY_FP[days]]
+
+def po_batch(rng, start, count, ctx):
+    """Column batch of purchase orders numbered start+1 .. start+count."""
+    days = rng.integers(0, TOTAL_DAYS+1, count)
+    depts = rng.choice(DEPT_IDS, size=count, p=DEPT_P)
+    supps = rng.integers(1, ctx.n_supp+1, count)
+    amts = np.clip(np.round(np.abs(rng.lognormal(9.0, 1.5, count)), 2), 500, 10_000_000)
+    unspsc = rng.integers(0, len(UNSPSC_CODES), count)
+    qtys = rng.integers(1, 500, count)
+    # Maverick logic with 6-month downward trend
+    base = np.where(np.isin(depts, list(HIGH_MAVERICK_DEPTS)), 0.30, 0.12)
+    month = DAY_MONTH[days]
+    late = (DAY_YEAR[days] == 2025) & (month >= 7)
+    base = np.where(late, np.maximum(base - (month-7)*0.025, 0.04), base)
+    is_mav = rng.random(count) < base
+    cids = _nullable(rng.integers(1, ctx.n_contracts+1, count), is_mav)
+    deliv = DAY_STR[days + rng.integers(7, 91, count)]
+    status = PO_STATUSES[rng.choice(3, size=count, p=[.75, .20, .05])]
+    return [np.char.mod("PO-%07d", np.arange(start+1, start+count+1)).astype(object),
+            DAY_STR[days], depts, supps, UNSPSC_CODE_ARR[unspsc], UNSPSC_DESC_ARR[unspsc],
+            qtys, np.round(amts / qtys, 2), np.round(amts, 2), cids, deliv, status]
+
+BATCH_BUILDERS = {"transactions": txn_batch, "purchase_orders": po_batch}
+
+def build_shard(table, path, seed, shard, start, count, ctx):
+    """Write rows start+1 .. start+count of table into a standalone shard DB at path."""
+    rng = np.random.default_rng([seed, TABLE_STREAMS[table], shard])
+    cols = FACT_COLUMNS[table]
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute(f"CREATE TABLE rows ({','.join(cols)})")
+    sql = f"INSERT INTO rows VALUES ({','.join('?' * len(cols))})"
+    for s in range(start, start + count, BATCH_ROWS):
+        n = min(BATCH_ROWS, start + count - s)
+        batch = BATCH_BUILDERS[table](rng, s, n, ctx)
+        conn.executemany(sql, zip(*(c.tolist() for c in batch)))
+    conn.commit()
+    conn.close()
+    return path
+
+def gen_facts_sharded(conn, table, n, ctx, seed, shards=None, workers=None, tmp_dir=None):
+    """Generate n rows of table over `shards` shards built by `workers` processes."""
+    shards = shards or max(1, math.ceil(n / SHARD_ROWS))
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    print(f"  {table.replace('_', ' ').capitalize()} ({n:,}, {shards} shards, {workers} workers)...")
+    bounds = [n * i // shards for i in range(shards + 1)]
+    cols = ','.join(FACT_COLUMNS[table])
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        jobs = [(table, os.path.join(tmp, f"{table}-{i}.db"), seed, i, bounds[i], bounds[i+1] - bounds[i], ctx)
+                for i in range(shards)]
+        if workers > 1 and shards > 1:
+            pool = ProcessPoolExecutor(max_workers=min(workers, shards))
+            paths = pool.map(build_shard, *zip(*jobs))
+        else:
+            pool = None
+            paths = (build_shard(*job) for job in jobs)
+        try:
+            for i, path in enumerate(paths):   # shard order, so ids are deterministic
+                conn.execute("ATTACH DATABASE ? AS shard", (path,))
+                conn.execute(f"INSERT INTO {table} ({cols}) SELECT {cols} FROM shard.rows ORDER BY rowid")
+                conn.commit()
+                conn.execute("DETACH DATABASE shard")
+                os.remove(path)
+                print(f"    {bounds[i+1]:,} / {n:,}")
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
 
 # ─── Main ────────────────────────────────────────────────────────────────────
 # ─── Main Generator Function ────────────────────────────────────────────────
-def generate_all_data(db_path=None, transactions_n=510000, po_n=82000, supplier_n=2100):
+def generate_all_data(db_path=None, transactions_n=510000, po_n=82000, supplier_n=2100,
+                      vectorized=False, seed=42, shards=None, workers=None):
+    """Build the full synthetic database at db_path.
+
+    vectorized=True draws fact tables as NumPy column batches across a process
+    pool (see gen_facts_sharded); its output is fixed by seed and shard count.
+    The default row-by-row mode reproduces the original dataset.
+    """
     target_path = Path(db_path) if db_path else DB_PATH
     target_path.parent.mkdir(parents=True, exist_ok=True)
     
@@ -320,12 +452,32 @@ def generate_all_data(db_path=None, transactions_n=510000, po_n=82000, supplier_
     conn.execute("PRAGMA synchronous=OFF")
     
     create_tables(conn)
+    if vectorized:
+        random.seed(seed)
+        np.random.seed(seed)
     gen_departments(conn)
     n_supp, hf = gen_suppliers(conn, supplier_n)
     dept_ids = [d[0] for d in DEPARTMENTS]
     n_con = gen_contracts(conn, n_supp, dept_ids, 320)
-    gen_transactions(conn, DEPARTMENTS, n_supp, hf, transactions_n)
-    gen_purchase_orders(conn, DEPARTMENTS, n_supp, n_con, po_n)
+    if vectorized:
+        sw = np.ones(n_supp)
+        sw[np.array(hf) - 1] = 12.0
+        ctx = SimpleNamespace(n_supp=n_supp, n_contracts=n_con, supplier_p=sw / sw.sum())
+        # bulk-load without the fact-table indexes, then build them once
+        indexes = [r[0] for r in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL "
+            "AND tbl_name IN ('transactions','purchase_orders')")]
+        for sql in indexes:
+            conn.execute(f"DROP INDEX {sql.split()[2]}")
+        gen_facts_sharded(conn, "transactions", transactions_n, ctx, seed, shards, workers, target_path.parent)
+        gen_facts_sharded(conn, "purchase_orders", po_n, ctx, seed, shards, workers, target_path.parent)
+        print("  Indexes...")
+        for sql in indexes:
+            conn.execute(sql)
+        conn.commit()
+    else:
+        gen_transactions(conn, DEPARTMENTS, n_supp, hf, transactions_n)
+        gen_purchase_orders(conn, DEPARTMENTS, n_supp, n_con, po_n)
     gen_personnel(conn, DEPARTMENTS)
 
     print("\n═══ Summary ═══")
@@ -336,8 +488,20 @@ def generate_all_data(db_path=None, transactions_n=510000, po_n=82000, supplier_
     conn.close()
     print(f"\nDone! DB at {target_path}")
 
-def main():
-    generate_all_data()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the synthetic GPG database.")
+    parser.add_argument("--db", help=f"output path (default {DB_PATH})")
+    parser.add_argument("--transactions", type=int, default=510000)
+    parser.add_argument("--pos", type=int, default=82000)
+    parser.add_argument("--suppliers", type=int, default=2100)
+    parser.add_argument("--vectorized", action="store_true",
+                        help="sharded NumPy generator (fast, for large datasets)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--shards", type=int, help=f"default: one per {SHARD_ROWS:,} rows")
+    parser.add_argument("--workers", type=int, help="processes (default: CPU count)")
+    args = parser.parse_args(argv)
+    generate_all_data(args.db, args.transactions, args.pos, args.suppliers,
+                      vectorized=args.vectorized, seed=args.seed, shards=args.shards, workers=args.workers)
 
 if __name__ == "__main__":
     main()
@@ -56,7 +56,7 @@ export default function Dashboard({ onLogout, theme, toggleTheme, user }) {
     useEffect(() => {
         if (search.length > 1) {
             const timer = setTimeout(() => {
-                fetch(`/api/search?q=${search}`).then(r => r.json()).then(setSearchResults)
+                fetch(`/api/search?q=${encodeURIComponent(search)}`).then(r => r.json()).then(setSearchResults)
                 setShowResults(true)
             }, 300)
             return () => clearTimeout(timer)
@@ -73,6 +73,18 @@ export default function Dashboard({ onLogout, theme, toggleTheme, user }) {
         if (res.type === 'Contract') navigate('/contracts') // In real app, filter to contract
     }
 
+    // Bold the matched spans the search API reports for a field
+    const highlighted = (text, spans = []) => {
+        const parts = []
+        let at = 0
+        spans.forEach(([start, end]) => {
+            parts.push(text.slice(at, start), <mark key={start} className="bg-transparent text-gpg-gold font-semibold">{text.slice(start, end)}</mark>)
+            at = end
+        })
+        parts.push(text.slice(at))
+        return parts
+    }
+
     const pageTitle = NAV.find(n => n.to === location.pathname)?.label || 'Dashboard'
 
     return (
@@ -178,9 +190,9 @@ export default function Dashboard({ onLogout, theme, toggleTheme, user }) {
                                 <div className="absolute top-full left-0 right-0 mt-2 bg-gpg-navy border border-gpg-border rounded-lg shadow-2xl overflow-hidden animate-fade-in z-50">
                                     <div className="px-3 py-2 text-[10px] uppercase font-bold text-gpg-text-secondary/30 bg-black/20">Search Results</div>
                                     {searchResults.map((r) => (
-                                        <button key={r.label} onClick={() => handleSearchClick(r)}
+                                        <button key={`${r.type}-${r.id}`} onClick={() => handleSearchClick(r)}
                                             className="w-full text-left px-4 py-3 text-sm hover:bg-gpg-surface flex items-center justify-between group border-b border-gpg-border last:border-0">
-                                            <span className="text-gpg-text-primary group-hover:text-gpg-gold transition-colors">{r.label}</span>
+                                            <span className="text-gpg-text-primary group-hover:text-gpg-gold transition-colors">{highlighted(r.label, r.highlights?.label)}</span>
                                             <span className="text-[10px] px-1.5 py-0.5 rounded bg-gpg-surface text-gpg-text-secondary">{r.type}</span>
                                         </button>
                                     ))}
@@ -0,0 +1,46 @@
+"""Shared fixtures: one small generated database and the API app over it.
+
+settings.py reads the environment at import, so the database, model and
+column cache paths are set before main is first imported.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT / "backend"), str(ROOT / "benchmarks"), str(ROOT)]
+
+# transactions, purchase orders, suppliers: a few seconds to build and bootstrap
+SCALE = (3000, 600, 80)
+
+
+@pytest.fixture(scope="session")
+def db_path(tmp_path_factory):
+    from data.generate_data import generate_all_data
+    work = tmp_path_factory.mktemp("gpg")
+    path = work / "gpg_analytics.db"
+    transactions_n, po_n, supplier_n = SCALE
+    generate_all_data(db_path=path, transactions_n=transactions_n, po_n=po_n, supplier_n=supplier_n,
+                      vectorized=True)
+    os.environ.update(GPG_DB_PATH=str(path), GPG_MODEL_DIR=str(work / "models"),
+                      GPG_COLUMN_CACHE_DIR=str(work / "column-cache"))
+    return path
+
+
+@pytest.fixture(scope="session")
+def api(db_path):
+    """The main module, migrated and bootstrapped over db_path."""
+    import main
+    assert Path(main.DB_PATH) == db_path
+    main.bootstrap.start()
+    assert main.bootstrap.wait(), main.bootstrap.error
+    return main
+
+
+@pytest.fixture(scope="session")
+def client(api):
+    from fastapi.testclient import TestClient
+    with TestClient(api.app) as client:
+        yield client
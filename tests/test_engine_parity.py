@@ -0,0 +1,44 @@
+"""The columnar engine serves the same payloads as the SQLite one."""
+import pytest
+
+from bench_engines import payload_diff
+
+# path, whether it takes department_id
+ENDPOINTS = [
+    ("/api/departments", False),
+    ("/api/overview", True),
+    ("/api/maverick", True),
+    ("/api/maverick?limit=20", True),
+    ("/api/suppliers", True),
+    ("/api/suppliers?limit=20", True),
+    ("/api/suppliers/17/transactions", False),
+    ("/api/contracts", True),
+    ("/api/contracts?limit=20", True),
+    ("/api/contracts/expiring", False),
+    ("/api/personnel", False),
+    ("/api/anomalies", False),
+    ("/api/search?q=Gro", False),
+]
+URLS = [path for path, _ in ENDPOINTS] + [
+    path + ("&" if "?" in path else "?") + f"department_id={dept}"
+    for path, scoped in ENDPOINTS if scoped for dept in (1, 4)]
+
+
+@pytest.fixture
+def engine(api, monkeypatch):
+    def use(name):
+        monkeypatch.setattr(api.settings, "ANALYTICS_ENGINE", name)
+    return use
+
+
+@pytest.mark.parametrize("url", URLS)
+def test_engines_agree(client, engine, url):
+    payloads = {}
+    for name in ("sqlite", "columnar"):
+        engine(name)
+        # a per-engine dummy parameter keeps the response cache from answering for the other engine
+        response = client.get(url + ("&" if "?" in url else "?") + f"engine={name}")
+        assert response.status_code == 200, response.text
+        payloads[name] = response.json()
+    diffs = list(payload_diff(payloads["sqlite"], payloads["columnar"]))
+    assert not diffs, diffs[:5]
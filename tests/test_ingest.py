@@ -0,0 +1,126 @@
+"""Bulk ingest: validation errors are a 422 naming the field, and accepted rows
+land together with the rollups, search index and invoice index."""
+import asyncio
+import csv
+import io
+import json
+import sqlite3
+
+import pytest
+
+ROW = {"transaction_date": "2025-06-02", "posting_date": "2025-06-02", "document_type": "Invoice",
+       "document_number": "DOC-INGEST", "department_id": 1, "supplier_id": 7, "scoa_code": "4201",
+       "scoa_description": "Travel", "amount": 100.0, "description": "Ingest test"}
+
+
+@pytest.fixture
+def ingest_db(api, db_path, tmp_path, monkeypatch):
+    """The ingest endpoint writing to a copy of the test database; yields a connection to it."""
+    path = tmp_path / "ingest.db"
+    with sqlite3.connect(db_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    monkeypatch.setattr(api, "DB_PATH", path)
+    conn = sqlite3.connect(path)
+    yield conn
+    conn.close()
+
+
+def rows(document_number):
+    """Three rows of one new document, two of them identical (a duplicate invoice)."""
+    row = {**ROW, "document_number": document_number}
+    return [row, row, {**row, "amount": 250.0}]
+
+
+def as_ndjson(records):
+    return "".join(json.dumps(r) + "\n" for r in records)
+
+
+def as_csv(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    return out.getvalue()
+
+
+def state(conn):
+    return {"transactions": conn.execute("SELECT COUNT(*), MAX(id) FROM transactions").fetchone(),
+            "rollups": conn.execute("SELECT row_count, max_id FROM rollup_state WHERE source = 'transactions'"
+                                    ).fetchone(),
+            "search": conn.execute("SELECT row_count, max_id FROM search_index_state WHERE source = 'transactions'"
+                                   ).fetchone(),
+            "invoices": conn.execute("SELECT row_count, max_id FROM invoice_index_state").fetchone()}
+
+
+@pytest.mark.parametrize("body, content_type", [(as_ndjson, "application/x-ndjson"), (as_csv, "text/csv")])
+def test_ingest_updates_derived_structures(client, ingest_db, body, content_type):
+    import invoice_index
+    import rollups
+    import search_index
+    document = f"DOC-{content_type.split('/')[1].upper()}"
+    response = client.post("/api/ingest/transactions", content=body(rows(document)),
+                           headers={"content-type": content_type})
+    assert response.status_code == 200, response.text
+    assert response.json()["rows_inserted"] == 3
+
+    after = state(ingest_db)
+    assert after["rollups"] == after["search"] == after["invoices"] == after["transactions"]
+    assert rollups.check_rollups(ingest_db) == []
+    assert invoice_index.check_index(ingest_db) == []
+    assert [r["label"] for r in search_index.search(ingest_db, document)] == [document] * 3
+    duplicates = invoice_index.flagged_duplicates(ingest_db)
+    assert duplicates[duplicates.description == ROW["description"]].occurrence_count.tolist() == [2]
+
+
+def test_failed_batch_leaves_no_rows(client, ingest_db, monkeypatch):
+    import invoice_index
+
+    def locked(*args):
+        raise sqlite3.OperationalError("database is locked")
+    before = state(ingest_db)
+    monkeypatch.setattr(invoice_index, "apply_rows", locked)
+    response = client.post("/api/ingest/transactions", content=as_ndjson(rows("DOC-LOCKED")))
+    assert response.status_code == 503 and "locked" in response.json()["detail"]
+    assert state(ingest_db) == before
+
+
+def test_client_disconnect_releases_the_worker(api, ingest_db):
+    """A body cut off mid-stream ends the ingest instead of leaving its worker blocked."""
+    before = state(ingest_db)
+    messages = iter([{"type": "http.request", "body": as_ndjson(rows("DOC-CUT")).encode(), "more_body": True},
+                     {"type": "http.disconnect"}])
+    sent = []
+
+    async def receive():
+        return next(messages, {"type": "http.disconnect"})
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+             "scheme": "http", "path": "/api/ingest/transactions", "raw_path": b"/api/ingest/transactions",
+             "query_string": b"", "root_path": "", "headers": [(b"host", b"test")],
+             "client": ("test", 1), "server": ("test", 80)}
+
+    async def call():
+        try:
+            await api.app(scope, receive, send)
+        except Exception:
+            pass                # nobody is left to answer; the point is that the call returns
+    loop = asyncio.new_event_loop()
+    try:
+        # a worker stuck on the body queue would also block asyncio.run's executor shutdown
+        loop.run_until_complete(asyncio.wait_for(call(), timeout=30))
+    finally:
+        loop.close()
+    assert state(ingest_db) == before
+
+
+@pytest.mark.parametrize("column, value", [("fiscal_year", "2025/2026"), ("fiscal_period", 3), ("month", "2025-06")])
+def test_generated_columns_are_rejected(client, ingest_db, column, value):
+    before = state(ingest_db)
+    response = client.post("/api/ingest/transactions", content=json.dumps({**ROW, column: value}))
+    assert response.status_code == 422
+    report = response.json()
+    assert report["rows_inserted"] == 0 and column in report["errors"][0]
+    assert state(ingest_db) == before
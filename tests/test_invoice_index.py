@@ -0,0 +1,109 @@
+"""Duplicate and split flags from the invoice index match the full GROUP BY
+scans detect_invoice_anomalies ran before the index existed."""
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from bench_engines import payload_diff
+
+COLUMNS = "transaction_date, posting_date, document_type, document_number, department_id, supplier_id, " \
+          "scoa_code, scoa_description, amount, description"
+
+
+def previous_invoice_anomalies(conn):
+    """detect_invoice_anomalies as it was: two GROUP BY scans over transactions."""
+    duplicates = pd.read_sql("""
+        SELECT supplier_id, transaction_date, amount, description, COUNT(*) as occurrence_count
+        FROM transactions
+        GROUP BY supplier_id, transaction_date, amount, description
+        HAVING occurrence_count > 1
+    """, conn)
+    splits = pd.read_sql("""
+        SELECT supplier_id, transaction_date, SUM(amount) as total_daily_amount, COUNT(*) as txn_count
+        FROM transactions
+        GROUP BY supplier_id, transaction_date
+        HAVING txn_count > 1 AND total_daily_amount BETWEEN 450000 AND 500000
+    """, conn)
+    names = pd.read_sql("SELECT id as supplier_id, supplier_name FROM suppliers", conn)
+    duplicates = duplicates.merge(names, on='supplier_id', how='left')
+    duplicates['type'], duplicates['severity'] = 'Duplicate Invoice', 'High'
+    duplicates['reason'] = duplicates['occurrence_count'].apply(lambda x: f"Found {x} identical transactions")
+    splits = splits.merge(names, on='supplier_id', how='left')
+    splits['type'], splits['severity'] = 'Potential Split', 'Critical'
+    splits['reason'] = splits.apply(lambda r: f"Total R{r['total_daily_amount']:,.0f} across {r['txn_count']} "
+                                              f"transactions (Near R500k threshold)", axis=1)
+    columns = ['supplier_name', 'transaction_date', 'amount', 'type', 'severity', 'reason']
+    combined = pd.concat([duplicates[columns],
+                          splits.rename(columns={'total_daily_amount': 'amount'})[columns]])
+    return combined.fillna({'supplier_name': 'Unknown Supplier', 'amount': 0}).to_dict('records')
+
+
+@pytest.fixture
+def planted(api, db_path, tmp_path, monkeypatch):
+    """A copy of the test database with duplicates and splits appended through
+    the transactions view, merged into the invoice index; the anomaly
+    detection reads from it."""
+    import anomaly_detection
+    import invoice_index
+    path = tmp_path / "planted.db"
+    with sqlite3.connect(db_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    conn = sqlite3.connect(path)
+    with conn:
+        for _ in range(2):      # transaction 1 three times, transaction 2 twice
+            conn.execute(f"INSERT INTO transactions ({COLUMNS}) SELECT {COLUMNS} FROM transactions WHERE id IN (1, 2)")
+        for supplier_id, amounts in ((7, (240000, 235000.5)), (9, (150000, 150000, 160000)), (11, (300000, 250000))):
+            for amount in amounts:
+                conn.execute(f"""INSERT INTO transactions ({COLUMNS}) VALUES
+                    ('2025-06-02', '2025-06-02', 'Invoice', 'DOC-SPLIT', 1, ?, '4201', 'Travel', ?, 'Split')""",
+                             (supplier_id, amount))
+    assert invoice_index.refresh_index(conn) == "appended"
+    conn.commit()
+    monkeypatch.setattr(anomaly_detection, "DB_PATH", path)
+    yield conn
+    conn.close()
+
+
+def detected():
+    import anomaly_detection
+    return anomaly_detection.detect_invoice_anomalies()
+
+
+def test_flags_match_previous_detection(planted):
+    expected = previous_invoice_anomalies(planted)
+    assert {r['type'] for r in expected} == {'Duplicate Invoice', 'Potential Split'}
+    diffs = list(payload_diff(expected, detected()))
+    assert not diffs, diffs[:5]
+
+
+def test_in_place_update_rebuilds(planted):
+    import invoice_index
+    # move the R475k split out of the band and make a new one on another day
+    planted.execute("UPDATE transactions SET amount = 10 WHERE document_number = 'DOC-SPLIT' AND supplier_id = 7")
+    planted.execute("UPDATE transactions SET amount = 230000 WHERE document_number = 'DOC-SPLIT' AND supplier_id = 11")
+    planted.commit()
+    assert invoice_index.refresh_index(planted) == "rebuilt"
+    planted.commit()
+    assert invoice_index.check_index(planted) == []
+    diffs = list(payload_diff(previous_invoice_anomalies(planted), detected()))
+    assert not diffs, diffs[:5]
+
+
+def test_custom_band_is_bound(planted):
+    import invoice_index
+    expected = pd.read_sql("""
+        SELECT supplier_id, transaction_date, SUM(amount) as total_daily_amount, COUNT(*) as txn_count
+        FROM transactions GROUP BY supplier_id, transaction_date
+        HAVING txn_count >= 3 AND total_daily_amount BETWEEN 400000.5 AND 600000
+    """, planted)
+    flagged = invoice_index.flagged_splits(planted, 400000.5, 600000, 3)
+    assert len(expected)            # the planted R460k over three transactions at least
+    pd.testing.assert_frame_equal(flagged[expected.columns], expected)
+
+
+@pytest.mark.parametrize("query", ["split_high=inf", "split_low=-inf", "split_low=nan", "split_high=nan",
+                                   "split_low=500000&split_high=450000", "split_min_count=1"])
+def test_bad_split_band_is_400(client, query):
+    response = client.get(f"/api/anomalies?{query}")
+    assert response.status_code == 400, response.text
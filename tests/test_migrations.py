@@ -0,0 +1,28 @@
+"""Several processes upgrading one database apply each migration once."""
+import ast
+import sqlite3
+import subprocess
+import sys
+
+from conftest import ROOT, SCALE
+
+
+def test_concurrent_upgrades_apply_each_migration_once(tmp_path):
+    from data.generate_data import generate_all_data
+    import migrations
+    path = tmp_path / "fresh.db"
+    transactions_n, po_n, supplier_n = SCALE
+    generate_all_data(db_path=path, transactions_n=transactions_n, po_n=po_n, supplier_n=supplier_n,
+                      vectorized=True)
+    script = f"import migrations; print(migrations.upgrade(__import__('sqlite3').connect({str(path)!r}, timeout=60)))"
+    workers = [subprocess.Popen([sys.executable, "-c", script], cwd=ROOT / "backend",
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) for _ in range(3)]
+    applied = []
+    for worker in workers:
+        out, err = worker.communicate(timeout=300)
+        assert worker.returncode == 0, err
+        applied += ast.literal_eval(out.strip().splitlines()[-1])
+    assert sorted(applied) == [version for version, _, _ in migrations.MIGRATIONS]
+    with sqlite3.connect(path) as conn:
+        assert migrations.current_version(conn) == migrations.LATEST
+        assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == transactions_n
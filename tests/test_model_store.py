@@ -0,0 +1,13 @@
+"""The model store's data version moves on appends and in-place updates alike."""
+import sqlite3
+
+
+def test_data_version_tracks_updates(api, db_path, tmp_path):
+    from model_store import data_version
+    path = tmp_path / "models.db"
+    with sqlite3.connect(db_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    before = data_version(path)
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE transactions SET amount = amount * 10 WHERE id = 1")
+    assert data_version(path) != before
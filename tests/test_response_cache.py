@@ -0,0 +1,11 @@
+"""Cached responses carry the CORS headers of the request they answer."""
+
+
+def test_cors_headers_follow_each_origin(client):
+    url = "/api/departments?cors=1"
+    first = client.get(url)
+    assert first.headers["x-cache"] == "MISS" and "access-control-allow-origin" not in first.headers
+    for origin in ("https://a.example", "https://b.example"):
+        response = client.get(url, headers={"Origin": origin})
+        assert response.headers["x-cache"] == "HIT"
+        assert response.headers["access-control-allow-origin"] == origin
@@ -0,0 +1,16 @@
+"""The supplier index is reused while fresh and rebuilt after supplier updates."""
+import sqlite3
+
+
+def test_rebuilt_on_supplier_update(api, db_path, tmp_path):
+    from supplier_index import get_supplier_index
+    path = tmp_path / "suppliers.db"
+    with sqlite3.connect(db_path) as source, sqlite3.connect(path) as target:
+        source.backup(target)
+    index = get_supplier_index(path)
+    assert get_supplier_index(path) is index
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE suppliers SET province = 'Nowhere' WHERE id = 1")
+    rebuilt = get_supplier_index(path)
+    assert rebuilt is not index and "Nowhere" in rebuilt.provinces
+    assert get_supplier_index(path) is rebuilt